@@ -0,0 +1,166 @@
+# benchmarks/gateway_modes.py
+# Compare le gateway en mode Flask synchrone (nombre de workers borné, comme
+# gunicorn -w N) et en mode asynchrone (asgi.py servi par uvicorn) devant un
+# service match simulé qui répond avec une latence fixe.
+#
+# Usage : python benchmarks/gateway_modes.py [--requetes 2000] [--concurrence 500]
+#                                             [--latence 0.05] [--workers 8]
+import argparse
+import asyncio
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+GATEWAY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'gateway')
+PORT_UPSTREAM = 5901
+PORT_SYNC = 5902
+PORT_ASYNC = 5903
+
+
+def lancer_upstream(latence):
+    import logging
+    from flask import Flask, jsonify
+    from werkzeug.serving import ThreadedWSGIServer
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    upstream = Flask('service_match_simule')
+
+    @upstream.route('/matches')
+    def liste_matches():
+        time.sleep(latence)
+        return jsonify([{'id': i, 'statut': 'à_venir'} for i in range(20)])
+
+    ThreadedWSGIServer.request_queue_size = 4096
+    ThreadedWSGIServer('127.0.0.1', PORT_UPSTREAM, upstream).serve_forever()
+
+
+def preparer_gateway():
+    os.environ['MATCH_SERVICE_URL'] = f'http://127.0.0.1:{PORT_UPSTREAM}'
+    os.environ.setdefault('MATCH_POOL_SIZE', '64')
+    sys.path.insert(0, GATEWAY_DIR)
+
+
+def lancer_sync(workers):
+    import logging
+    preparer_gateway()
+    from werkzeug.serving import BaseWSGIServer
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    from app import app
+
+    class WorkerPoolServer(BaseWSGIServer):
+        request_queue_size = 4096
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.pool = ThreadPoolExecutor(workers)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self.traiter, request, client_address)
+
+        def traiter(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    WorkerPoolServer('127.0.0.1', PORT_SYNC, app).serve_forever()
+
+
+def lancer_async():
+    preparer_gateway()
+    import uvicorn
+    sys.argv = sys.argv[:1]
+    uvicorn.run('asgi:application', host='127.0.0.1', port=PORT_ASYNC,
+                log_level='error', backlog=4096)
+
+
+async def une_requete(port):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b'GET /matches HTTP/1.1\r\nHost: gateway\r\nConnection: close\r\n\r\n')
+    await writer.drain()
+    reponse = await reader.read()
+    writer.close()
+    return int(reponse.split(b' ', 2)[1])
+
+
+async def charger(port, requetes, concurrence):
+    # Client minimal sur sockets brutes : le générateur de charge ne doit pas
+    # être le goulot d'étranglement
+    latences = []
+    erreurs = 0
+    semaphore = asyncio.Semaphore(concurrence)
+
+    async def mesurer():
+        nonlocal erreurs
+        async with semaphore:
+            debut = time.perf_counter()
+            try:
+                if await une_requete(port) != 200:
+                    erreurs += 1
+            except (OSError, IndexError, ValueError):
+                erreurs += 1
+            latences.append(time.perf_counter() - debut)
+
+    debut = time.perf_counter()
+    await asyncio.gather(*(mesurer() for _ in range(requetes)))
+    duree = time.perf_counter() - debut
+
+    latences.sort()
+    return {
+        'req/s': round(requetes / duree, 1),
+        'p50 (ms)': round(statistics.median(latences) * 1000, 1),
+        'p99 (ms)': round(latences[int(len(latences) * 0.99) - 1] * 1000, 1),
+        'erreurs': erreurs
+    }
+
+
+def attendre_port(port, delai=10):
+    import socket
+    fin = time.time() + delai
+    while time.time() < fin:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Port {port} indisponible')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requetes', type=int, default=2000)
+    parser.add_argument('--concurrence', type=int, default=500)
+    parser.add_argument('--latence', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    processus = [
+        multiprocessing.Process(target=lancer_upstream, args=(args.latence,), daemon=True),
+        multiprocessing.Process(target=lancer_sync, args=(args.workers,), daemon=True),
+        multiprocessing.Process(target=lancer_async, daemon=True)
+    ]
+    for p in processus:
+        p.start()
+    try:
+        for port in (PORT_UPSTREAM, PORT_SYNC, PORT_ASYNC):
+            attendre_port(port)
+
+        print(f"{args.requetes} requêtes GET /matches, concurrence {args.concurrence}, "
+              f"latence upstream {args.latence * 1000:.0f} ms")
+        for mode, port in ((f'sync ({args.workers} workers)', PORT_SYNC), ('async (1 processus)', PORT_ASYNC)):
+            asyncio.run(charger(port, 50, 10))
+            print(f"{mode:22} {asyncio.run(charger(port, args.requetes, args.concurrence))}")
+    finally:
+        for p in processus:
+            p.terminate()
+
+
+if __name__ == '__main__':
+    main()
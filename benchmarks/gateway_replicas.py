@@ -0,0 +1,102 @@
+# benchmarks/gateway_replicas.py
+# Répartition de charge du gateway entre plusieurs réplicas simulés de
+# service_match (processus Flask locaux) : un rapide, un lent et un qui
+# tombe en panne puis revient.
+#
+# Usage : python benchmarks/gateway_replicas.py [--strategie least_outstanding|round_robin]
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+GATEWAY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'gateway')
+REPLICAS = [(5911, 0.01), (5912, 0.05), (5913, 0.01)]
+
+
+def lancer_replica(port, latence):
+    import logging
+    from flask import Flask, jsonify
+    from werkzeug.serving import ThreadedWSGIServer
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    replica = Flask(f'service_match_{port}')
+
+    @replica.route('/matches')
+    def liste_matches():
+        time.sleep(latence)
+        return jsonify({'replica': port})
+
+    ThreadedWSGIServer.request_queue_size = 1024
+    ThreadedWSGIServer('127.0.0.1', port, replica).serve_forever()
+
+
+def demarrer(port, latence):
+    processus = multiprocessing.Process(target=lancer_replica, args=(port, latence), daemon=True)
+    processus.start()
+    return processus
+
+
+def envoyer(client, requetes, concurrence):
+    # Requêtes toutes différentes : ni cache ni fusion des GET identiques
+    with ThreadPoolExecutor(concurrence) as executor:
+        reponses = list(executor.map(lambda i: client.get(f'/matches?n={i}'), range(requetes)))
+    repartition = {}
+    for reponse in reponses:
+        cle = reponse.get_json().get('replica', reponse.status_code) if reponse.is_json else reponse.status_code
+        repartition[cle] = repartition.get(cle, 0) + 1
+    return repartition
+
+
+def afficher(upstream):
+    for replica in upstream.stats()['replicas']:
+        print(f"    {replica['url']:24} disponible={replica['disponible']!s:5} requetes={replica['requetes']:4} "
+              f"erreurs={replica['erreurs']:3} p50={replica['latence_p50_ms']} ms p99={replica['latence_p99_ms']} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--strategie', default='least_outstanding')
+    parser.add_argument('--requetes', type=int, default=300)
+    parser.add_argument('--concurrence', type=int, default=16)
+    args = parser.parse_args()
+
+    os.environ['MATCH_SERVICE_URL'] = ','.join(f'http://127.0.0.1:{port}' for port, _ in REPLICAS)
+    os.environ['MATCH_LB'] = args.strategie
+    os.environ['UPSTREAM_EJECTION_ECHECS'] = '3'
+    os.environ['UPSTREAM_EJECTION_DUREE'] = '2'
+    os.environ['CACHE_TTL'] = '0'
+    sys.path.insert(0, GATEWAY_DIR)
+    from app import app
+    from upstream import get_upstream
+
+    processus = {port: demarrer(port, latence) for port, latence in REPLICAS}
+    time.sleep(1.5)
+    client = app.test_client()
+    upstream = get_upstream('match')
+
+    try:
+        print(f"Stratégie {args.strategie}, 3 réplicas")
+        print(f"  répartition : {envoyer(client, args.requetes, args.concurrence)}")
+        afficher(upstream)
+
+        panne, latence_panne = REPLICAS[2]
+        processus[panne].terminate()
+        processus[panne].join()
+        print(f"\nRéplica {panne} arrêté")
+        print(f"  répartition : {envoyer(client, args.requetes, args.concurrence)}")
+        afficher(upstream)
+
+        processus[panne] = demarrer(panne, latence_panne)
+        time.sleep(2.5)
+        print(f"\nRéplica {panne} redémarré, fin de l'éjection")
+        print(f"  répartition : {envoyer(client, args.requetes, args.concurrence)}")
+        afficher(upstream)
+    finally:
+        for p in processus.values():
+            p.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+# benchmarks/gateway_streaming.py
+# Réponses volumineuses (GET /matches de plusieurs Mo) à travers le gateway :
+# corps chargé en mémoire (STREAMING_SEUIL très grand, comportement précédent)
+# ou relayé par blocs, en mode synchrone et asynchrone. Mesure la mémoire
+# résidente maximale du processus gateway (VmHWM), le temps jusqu'au premier
+# octet, la latence totale et la taille transférée avec compression négociée.
+#
+# Usage : python benchmarks/gateway_streaming.py [--taille-mo 8] [--requetes 40]
+#                                                 [--concurrence 10] [--encodage gzip]
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+
+GATEWAY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'gateway')
+PORT_UPSTREAM = 5921
+SANS_STREAMING = str(10 ** 12)
+
+
+def lancer_upstream(taille_mo):
+    import logging
+    from flask import Flask, Response
+    from werkzeug.serving import ThreadedWSGIServer
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    match = {'statut': 'à_venir', 'equipe_domicile': {'nom': 'Equipe A'}, 'equipe_exterieur': {'nom': 'Equipe B'},
+             'cotes': [{'cote_domicile': 2.1, 'cote_nul': 3.2, 'cote_exterieur': 3.5}]}
+    ligne = len(json.dumps(match)) + 12
+    corps = json.dumps([dict(match, id=i) for i in range(taille_mo * 1024 * 1024 // ligne)]).encode('utf-8')
+
+    upstream = Flask('service_match_simule')
+
+    @upstream.route('/matches')
+    def liste_matches():
+        return Response(corps, mimetype='application/json')
+
+    ThreadedWSGIServer.request_queue_size = 1024
+    ThreadedWSGIServer('127.0.0.1', PORT_UPSTREAM, upstream).serve_forever()
+
+
+def preparer_gateway(seuil):
+    os.environ['MATCH_SERVICE_URL'] = f'http://127.0.0.1:{PORT_UPSTREAM}'
+    os.environ['STREAMING_SEUIL'] = seuil
+    # Requêtes toutes différentes et cache désactivé : chaque réponse traverse le gateway
+    os.environ['CACHE_MAX_ENTRIES'] = '0'
+    os.environ['UPSTREAM_HEDGE'] = '0'
+    sys.path.insert(0, GATEWAY_DIR)
+
+
+def lancer_sync(port, seuil):
+    import logging
+    preparer_gateway(seuil)
+    from werkzeug.serving import ThreadedWSGIServer
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    from app import app
+    ThreadedWSGIServer.request_queue_size = 1024
+    ThreadedWSGIServer('127.0.0.1', port, app).serve_forever()
+
+
+def lancer_async(port, seuil):
+    preparer_gateway(seuil)
+    import uvicorn
+    sys.argv = sys.argv[:1]
+    uvicorn.run('asgi:application', host='127.0.0.1', port=port, log_level='error')
+
+
+def rss_max_mo(pid):
+    with open(f'/proc/{pid}/status') as status:
+        for ligne in status:
+            if ligne.startswith('VmHWM:'):
+                return round(int(ligne.split()[1]) / 1024, 1)
+    return None
+
+
+async def une_requete(port, n, encodage):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    entetes = f'GET /matches?n={n} HTTP/1.1\r\nHost: gateway\r\nConnection: close\r\n'
+    if encodage:
+        entetes += f'Accept-Encoding: {encodage}\r\n'
+    writer.write(f'{entetes}\r\n'.encode('latin-1'))
+    await writer.drain()
+    debut = time.perf_counter()
+    premier = await reader.read(65536)
+    ttfb = time.perf_counter() - debut
+    taille = len(premier)
+    while True:
+        bloc = await reader.read(65536)
+        if not bloc:
+            break
+        taille += len(bloc)
+    writer.close()
+    return int(premier.split(b' ', 2)[1]), ttfb, taille
+
+
+async def charger(port, requetes, concurrence, encodage):
+    semaphore = asyncio.Semaphore(concurrence)
+    resultats = []
+
+    async def mesurer(n):
+        async with semaphore:
+            debut = time.perf_counter()
+            status, ttfb, taille = await une_requete(port, n, encodage)
+            resultats.append((status, ttfb, time.perf_counter() - debut, taille))
+
+    await asyncio.gather(*(mesurer(n) for n in range(requetes)))
+    return {
+        'ttfb p50 (ms)': round(statistics.median(r[1] for r in resultats) * 1000, 1),
+        'total p50 (ms)': round(statistics.median(r[2] for r in resultats) * 1000, 1),
+        'Mo transférés/réponse': round(statistics.median(r[3] for r in resultats) / 1024 / 1024, 2),
+        'erreurs': sum(1 for r in resultats if r[0] != 200)
+    }
+
+
+def attendre_port(port, delai=30):
+    import socket
+    fin = time.time() + delai
+    while time.time() < fin:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Port {port} indisponible')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--taille-mo', type=int, default=8)
+    parser.add_argument('--requetes', type=int, default=40)
+    parser.add_argument('--concurrence', type=int, default=10)
+    parser.add_argument('--encodage', default='gzip', help="Accept-Encoding envoyé ('' pour aucun)")
+    args = parser.parse_args()
+
+    upstream = multiprocessing.Process(target=lancer_upstream, args=(args.taille_mo,), daemon=True)
+    upstream.start()
+    try:
+        attendre_port(PORT_UPSTREAM)
+        print(f"{args.requetes} requêtes GET /matches (~{args.taille_mo} Mo), concurrence {args.concurrence}, "
+              f"Accept-Encoding: {args.encodage or '-'}")
+        modes = (
+            ('sync bufferisé', lancer_sync, SANS_STREAMING),
+            ('sync streaming', lancer_sync, str(256 * 1024)),
+            ('async bufferisé', lancer_async, SANS_STREAMING),
+            ('async streaming', lancer_async, str(256 * 1024))
+        )
+        for index, (mode, lancer, seuil) in enumerate(modes):
+            port = PORT_UPSTREAM + 1 + index
+            gateway = multiprocessing.Process(target=lancer, args=(port, seuil), daemon=True)
+            gateway.start()
+            try:
+                attendre_port(port)
+                rss_repos = rss_max_mo(gateway.pid)
+                resultat = asyncio.run(charger(port, args.requetes, args.concurrence, args.encodage))
+                resultat['RSS max (Mo)'] = rss_max_mo(gateway.pid)
+                resultat['RSS au repos (Mo)'] = rss_repos
+                print(f"{mode:16} {resultat}")
+            finally:
+                gateway.terminate()
+    finally:
+        upstream.terminate()
+
+
+if __name__ == '__main__':
+    main()
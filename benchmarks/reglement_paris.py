@@ -0,0 +1,112 @@
+# benchmarks/reglement_paris.py
+# Règlement des paris d'un match terminé : boucle objet par objet (un
+# message par gagnant, un commit par sélection de combiné) comparée au
+# moteur de règlement par lots de service_pari, sur la même base générée.
+#
+# Usage : python benchmarks/reglement_paris.py [--paris 20000] [--groupes 2000]
+#                                              [--lot 5000] [--db sqlite:///reglement.db]
+#                                              [--sans-ancien]  (200k paris : ancienne boucle trop lente)
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+PARI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'service_pari')
+ISSUES = ('domicile', 'nul', 'exterieur')
+MATCH_ID = 1
+
+
+def generer(db, Pari, PariGroupe, paris, groupes):
+    from sqlalchemy import insert
+
+    db.drop_all()
+    db.create_all()
+    hasard = random.Random(42)
+    db.session.execute(insert(PariGroupe), [
+        {'id': i + 1, 'utilisateur_id': hasard.randint(1, 5000), 'montant': 10, 'gain_potentiel': 80,
+         'statut': 'en_attente', 'selections_en_attente': 1, 'selections_gagnees': 1}
+        for i in range(groupes)
+    ])
+    lignes = []
+    for i in range(paris):
+        groupe_id = i + 1 if i < groupes else None
+        lignes.append({
+            'utilisateur_id': hasard.randint(1, 50000), 'match_id': MATCH_ID,
+            'type_pari': hasard.choice(ISSUES), 'montant': 10, 'cote': 2.5, 'gain_potentiel': 25,
+            'statut': 'en_attente', 'groupe_id': groupe_id
+        })
+        # Deuxième sélection des combinés, déjà gagnée sur un autre match
+        if groupe_id:
+            lignes.append({
+                'utilisateur_id': 1, 'match_id': MATCH_ID + 1, 'type_pari': 'nul', 'montant': 10,
+                'cote': 3.2, 'gain_potentiel': 32, 'statut': 'gagné', 'groupe_id': groupe_id
+            })
+    db.session.execute(insert(Pari), lignes)
+    db.session.commit()
+
+
+def regler_un_par_un(db, Pari, resultat):
+    # Ancien traiter_resultat
+    messages = 0
+    paris = Pari.query.filter_by(match_id=MATCH_ID, statut='en_attente').all()
+    for pari in paris:
+        pari.statut = 'gagné' if pari.type_pari == resultat else 'perdu'
+        if pari.statut == 'gagné':
+            messages += 1
+        if pari.groupe_id:
+            groupe = pari.groupe
+            if any(p.statut == 'perdu' for p in groupe.paris):
+                groupe.statut = 'perdu'
+            elif all(p.statut == 'gagné' for p in groupe.paris):
+                groupe.statut = 'gagné'
+                messages += 1
+            db.session.commit()
+    db.session.commit()
+    return len(paris), messages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--paris', type=int, default=20000)
+    parser.add_argument('--groupes', type=int, default=2000)
+    parser.add_argument('--lot', type=int, default=5000)
+    parser.add_argument('--db', default=None)
+    parser.add_argument('--sans-ancien', action='store_true')
+    args = parser.parse_args()
+
+    os.environ['REGLEMENT_LOT'] = str(args.lot)
+    sys.path.insert(0, PARI_DIR)
+    from flask import Flask
+    from models import db, Pari, PariGroupe
+    from repository import PariRepository
+    from reglement import MoteurReglement
+
+    app = Flask('reglement')
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.db or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'reglement.db')}"
+    db.init_app(app)
+
+    messages = []
+    moteur = MoteurReglement(app, PariRepository(), lambda message: messages.append(message) or True)
+
+    with app.app_context():
+        print(f"{args.paris} paris dont {args.groupes} sélections de combinés")
+        if not args.sans_ancien:
+            generer(db, Pari, PariGroupe, args.paris, args.groupes)
+            debut = time.perf_counter()
+            regles, gains = regler_un_par_un(db, Pari, 'domicile')
+            duree = time.perf_counter() - debut
+            print(f"  un par un : {regles} paris en {duree:.2f}s ({regles / duree:.0f} paris/s), {gains} messages")
+
+        generer(db, Pari, PariGroupe, args.paris, args.groupes)
+        db.session.remove()
+
+    dernier = moteur.regler(MATCH_ID, 'domicile')
+    print(f"  par lots de {args.lot} : {dernier['paris']} paris en {dernier['duree']:.2f}s "
+          f"({dernier['paris_par_seconde']:.0f} paris/s), {dernier['gains']} gains, "
+          f"{dernier['paiements']} paiements en {len(messages)} messages")
+
+
+if __name__ == '__main__':
+    main()
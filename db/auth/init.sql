@@ -27,4 +27,12 @@ CREATE TABLE IF NOT EXISTS bookmakers (
         FOREIGN KEY(utilisateur_id)
         REFERENCES utilisateurs(id)
         ON DELETE CASCADE
-);
\ No newline at end of file
+);
+
+CREATE TABLE IF NOT EXISTS gains_credites (
+    match_id INTEGER NOT NULL,
+    utilisateur_id INTEGER NOT NULL,
+    montant DECIMAL(15,2) NOT NULL,
+    date_credit TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (match_id, utilisateur_id)
+);
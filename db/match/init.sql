@@ -4,13 +4,15 @@ CREATE TABLE IF NOT EXISTS competitions (
     nom VARCHAR(100) UNIQUE NOT NULL,
     slug VARCHAR(100) UNIQUE NOT NULL,
     actif BOOLEAN DEFAULT true,
-    date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    date_modification TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 CREATE TABLE IF NOT EXISTS equipes (
     id SERIAL PRIMARY KEY,
     nom VARCHAR(100) UNIQUE NOT NULL,
-    date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    date_modification TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 CREATE TABLE IF NOT EXISTS matches (
@@ -22,7 +24,8 @@ CREATE TABLE IF NOT EXISTS matches (
     statut VARCHAR(20) NOT NULL DEFAULT 'à_venir' CHECK (statut IN ('à_venir', 'en_cours', 'terminé')),
     score_domicile INTEGER,
     score_exterieur INTEGER,
-    date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    date_modification TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 CREATE TABLE IF NOT EXISTS cotes (
@@ -33,3 +36,42 @@ CREATE TABLE IF NOT EXISTS cotes (
     cote_exterieur DECIMAL(6,2) NOT NULL,
     date_modification TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
+
+-- Pagination par curseur de GET /matches (ORDER BY date_match, id) et filtres
+CREATE INDEX IF NOT EXISTS idx_matches_date_match ON matches (date_match, id);
+CREATE INDEX IF NOT EXISTS idx_matches_statut_date_match ON matches (statut, date_match, id);
+CREATE INDEX IF NOT EXISTS idx_matches_competition_date_match ON matches (competition_id, date_match, id);
+CREATE INDEX IF NOT EXISTS idx_matches_equipe_domicile ON matches (equipe_domicile_id);
+CREATE INDEX IF NOT EXISTS idx_matches_equipe_exterieur ON matches (equipe_exterieur_id);
+-- Une ligne par match dans cotes : la cote actuelle
+CREATE UNIQUE INDEX IF NOT EXISTS idx_cotes_match_id ON cotes (match_id);
+
+-- Historique des cotes, uniquement en insertion
+CREATE TABLE IF NOT EXISTS cotes_historique (
+    id BIGSERIAL PRIMARY KEY,
+    match_id INTEGER NOT NULL REFERENCES matches(id) ON DELETE CASCADE,
+    cote_domicile DECIMAL(6,2) NOT NULL,
+    cote_nul DECIMAL(6,2) NOT NULL,
+    cote_exterieur DECIMAL(6,2) NOT NULL,
+    date_modification TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_cotes_historique_match_date ON cotes_historique (match_id, date_modification);
+
+-- Mises et gains à payer par issue, suivis par le moteur de cotes
+CREATE TABLE IF NOT EXISTS expositions_cotes (
+    match_id INTEGER PRIMARY KEY REFERENCES matches(id) ON DELETE CASCADE,
+    mise_domicile DECIMAL(15,2) NOT NULL DEFAULT 0,
+    mise_nul DECIMAL(15,2) NOT NULL DEFAULT 0,
+    mise_exterieur DECIMAL(15,2) NOT NULL DEFAULT 0,
+    engagement_domicile DECIMAL(15,2) NOT NULL DEFAULT 0,
+    engagement_nul DECIMAL(15,2) NOT NULL DEFAULT 0,
+    engagement_exterieur DECIMAL(15,2) NOT NULL DEFAULT 0,
+    cote_reference_domicile DECIMAL(6,2),
+    cote_reference_nul DECIMAL(6,2),
+    cote_reference_exterieur DECIMAL(6,2),
+    cote_moteur_domicile DECIMAL(6,2),
+    cote_moteur_nul DECIMAL(6,2),
+    cote_moteur_exterieur DECIMAL(6,2),
+    date_modification TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,76 @@
+-- db/match/migration_versions_catalogue.sql
+-- Bases créées avant les ETag du catalogue et l'historique des cotes (init.sql
+-- ne s'exécute qu'à la création du volume) : colonnes date_modification
+-- ajoutées et renseignées, cotes en double ramenées à une ligne par match
+-- (les plus anciennes passent dans cotes_historique), puis index et tables
+-- d'init.sql. Réexécutable sans effet.
+ALTER TABLE competitions ADD COLUMN IF NOT EXISTS date_modification TIMESTAMP;
+ALTER TABLE equipes ADD COLUMN IF NOT EXISTS date_modification TIMESTAMP;
+ALTER TABLE matches ADD COLUMN IF NOT EXISTS date_modification TIMESTAMP;
+ALTER TABLE cotes ADD COLUMN IF NOT EXISTS date_modification TIMESTAMP;
+
+UPDATE competitions SET date_modification = COALESCE(date_creation, CURRENT_TIMESTAMP) WHERE date_modification IS NULL;
+UPDATE equipes SET date_modification = COALESCE(date_creation, CURRENT_TIMESTAMP) WHERE date_modification IS NULL;
+UPDATE matches SET date_modification = COALESCE(date_creation, CURRENT_TIMESTAMP) WHERE date_modification IS NULL;
+UPDATE cotes SET date_modification = CURRENT_TIMESTAMP WHERE date_modification IS NULL;
+
+ALTER TABLE competitions ALTER COLUMN date_modification SET DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE equipes ALTER COLUMN date_modification SET DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE matches ALTER COLUMN date_modification SET DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE cotes ALTER COLUMN date_modification SET DEFAULT CURRENT_TIMESTAMP;
+
+-- Historique des cotes, uniquement en insertion
+CREATE TABLE IF NOT EXISTS cotes_historique (
+    id BIGSERIAL PRIMARY KEY,
+    match_id INTEGER NOT NULL REFERENCES matches(id) ON DELETE CASCADE,
+    cote_domicile DECIMAL(6,2) NOT NULL,
+    cote_nul DECIMAL(6,2) NOT NULL,
+    cote_exterieur DECIMAL(6,2) NOT NULL,
+    date_modification TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_cotes_historique_match_date ON cotes_historique (match_id, date_modification);
+
+-- Une ligne par match dans cotes : la plus récente reste la cote actuelle
+BEGIN;
+CREATE TEMPORARY TABLE cotes_anciennes ON COMMIT DROP AS
+SELECT id FROM (
+    SELECT id, ROW_NUMBER() OVER (PARTITION BY match_id ORDER BY date_modification DESC, id DESC) AS rang
+    FROM cotes
+) c
+WHERE c.rang > 1;
+
+INSERT INTO cotes_historique (match_id, cote_domicile, cote_nul, cote_exterieur, date_modification)
+SELECT match_id, cote_domicile, cote_nul, cote_exterieur, date_modification
+FROM cotes
+WHERE id IN (SELECT id FROM cotes_anciennes);
+
+DELETE FROM cotes WHERE id IN (SELECT id FROM cotes_anciennes);
+COMMIT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_cotes_match_id ON cotes (match_id);
+
+-- Pagination par curseur de GET /matches (ORDER BY date_match, id) et filtres
+CREATE INDEX IF NOT EXISTS idx_matches_date_match ON matches (date_match, id);
+CREATE INDEX IF NOT EXISTS idx_matches_statut_date_match ON matches (statut, date_match, id);
+CREATE INDEX IF NOT EXISTS idx_matches_competition_date_match ON matches (competition_id, date_match, id);
+CREATE INDEX IF NOT EXISTS idx_matches_equipe_domicile ON matches (equipe_domicile_id);
+CREATE INDEX IF NOT EXISTS idx_matches_equipe_exterieur ON matches (equipe_exterieur_id);
+
+-- Mises et gains à payer par issue, suivis par le moteur de cotes
+CREATE TABLE IF NOT EXISTS expositions_cotes (
+    match_id INTEGER PRIMARY KEY REFERENCES matches(id) ON DELETE CASCADE,
+    mise_domicile DECIMAL(15,2) NOT NULL DEFAULT 0,
+    mise_nul DECIMAL(15,2) NOT NULL DEFAULT 0,
+    mise_exterieur DECIMAL(15,2) NOT NULL DEFAULT 0,
+    engagement_domicile DECIMAL(15,2) NOT NULL DEFAULT 0,
+    engagement_nul DECIMAL(15,2) NOT NULL DEFAULT 0,
+    engagement_exterieur DECIMAL(15,2) NOT NULL DEFAULT 0,
+    cote_reference_domicile DECIMAL(6,2),
+    cote_reference_nul DECIMAL(6,2),
+    cote_reference_exterieur DECIMAL(6,2),
+    cote_moteur_domicile DECIMAL(6,2),
+    cote_moteur_nul DECIMAL(6,2),
+    cote_moteur_exterieur DECIMAL(6,2),
+    date_modification TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -5,6 +5,9 @@ CREATE TABLE IF NOT EXISTS paris_groupes (
     montant DECIMAL(15,2) NOT NULL,
     gain_potentiel DECIMAL(15,2) NOT NULL,
     statut VARCHAR(20) NOT NULL DEFAULT 'en_attente' CHECK (statut IN ('en_attente', 'gagné', 'perdu', 'annulé')),
+    selections_en_attente INTEGER NOT NULL DEFAULT 0 CHECK (selections_en_attente >= 0),
+    selections_gagnees INTEGER NOT NULL DEFAULT 0,
+    selections_perdues INTEGER NOT NULL DEFAULT 0,
     date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -21,4 +24,20 @@ CREATE TABLE IF NOT EXISTS paris (
     groupe_id INTEGER REFERENCES paris_groupes(id),
     annule BOOLEAN DEFAULT FALSE,
     motif_annulation VARCHAR(200)
-);
\ No newline at end of file
+);
+
+CREATE TABLE IF NOT EXISTS paiements_gains (
+    id SERIAL PRIMARY KEY,
+    match_id INTEGER NOT NULL,
+    utilisateur_id INTEGER NOT NULL,
+    montant DECIMAL(15,2) NOT NULL,
+    pari_ids JSONB NOT NULL DEFAULT '[]',
+    groupe_ids JSONB NOT NULL DEFAULT '[]',
+    publie BOOLEAN NOT NULL DEFAULT FALSE,
+    date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_paiements_gains_match_utilisateur UNIQUE (match_id, utilisateur_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_paris_match_statut ON paris (match_id, statut, id);
+CREATE INDEX IF NOT EXISTS idx_paris_groupe_id ON paris (groupe_id);
+CREATE INDEX IF NOT EXISTS idx_paiements_gains_publie ON paiements_gains (publie, match_id);
@@ -0,0 +1,25 @@
+-- db/pari/migration_compteurs_groupes.sql
+-- Bases créées avant les compteurs de sélections des combinés (init.sql ne
+-- s'exécute qu'à la création du volume) : colonnes ajoutées puis renseignées
+-- à partir des sélections, sans changer le statut des combinés.
+ALTER TABLE paris_groupes ADD COLUMN IF NOT EXISTS selections_en_attente INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE paris_groupes ADD COLUMN IF NOT EXISTS selections_gagnees INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE paris_groupes ADD COLUMN IF NOT EXISTS selections_perdues INTEGER NOT NULL DEFAULT 0;
+
+UPDATE paris_groupes g SET
+    selections_en_attente = c.en_attente,
+    selections_gagnees = c.gagnees,
+    selections_perdues = c.perdues
+FROM (
+    SELECT groupe_id,
+           COUNT(*) FILTER (WHERE statut = 'en_attente') AS en_attente,
+           COUNT(*) FILTER (WHERE statut = 'gagné') AS gagnees,
+           COUNT(*) FILTER (WHERE statut = 'perdu') AS perdues
+    FROM paris
+    WHERE groupe_id IS NOT NULL
+    GROUP BY groupe_id
+) c
+WHERE g.id = c.groupe_id;
+
+ALTER TABLE paris_groupes DROP CONSTRAINT IF EXISTS paris_groupes_selections_en_attente_check;
+ALTER TABLE paris_groupes ADD CONSTRAINT paris_groupes_selections_en_attente_check CHECK (selections_en_attente >= 0);
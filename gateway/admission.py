@@ -0,0 +1,148 @@
+# gateway/admission.py
+import os
+import math
+import time
+import threading
+from functools import wraps
+from collections import OrderedDict
+from flask import request, jsonify, g
+
+# Requêtes simultanées maximum par groupe de routes (blueprint), 0 = illimité.
+# Surchargeable par ADMISSION_LIMITES="matches=400,paris=50,..."
+LIMITES_DEFAUT = {
+    'auth': 100,
+    'matches': 200,
+    'paris': 100,
+    'panier': 50,
+    'paiement': 50,
+    'batch': 20,
+    # Flux SSE /matches/live : en mode asynchrone, le créneau est gardé pendant
+    # toute la connexion (même ordre de grandeur que LIVE_MAX_ABONNES)
+    'live': 10000
+}
+RETRY_AFTER_SATURATION = int(os.getenv('ADMISSION_RETRY_AFTER', 1))
+
+# Token bucket par utilisateur sur les routes d'écriture
+ECRITURES_PAR_SECONDE = float(os.getenv('RATE_LIMIT_ECRITURES_PAR_SECONDE', 1))
+ECRITURES_RAFALE = float(os.getenv('RATE_LIMIT_ECRITURES_RAFALE', 5))
+BUCKETS_MAX = int(os.getenv('RATE_LIMIT_BUCKETS_MAX', 100000))
+
+
+def lire_limites():
+    limites = dict(LIMITES_DEFAUT)
+    for item in os.getenv('ADMISSION_LIMITES', '').split(','):
+        if '=' in item:
+            groupe, limite = item.split('=', 1)
+            limites[groupe.strip()] = int(limite)
+    return limites
+
+
+class ConcurrencyLimiter:
+    def __init__(self, limites):
+        self.limites = limites
+        self._lock = threading.Lock()
+        self.en_cours = {}
+        self.rejets = {}
+
+    def acquerir(self, groupe):
+        limite = self.limites.get(groupe, 0)
+        with self._lock:
+            en_cours = self.en_cours.get(groupe, 0)
+            if limite and en_cours >= limite:
+                self.rejets[groupe] = self.rejets.get(groupe, 0) + 1
+                return False
+            self.en_cours[groupe] = en_cours + 1
+            return True
+
+    def liberer(self, groupe):
+        with self._lock:
+            self.en_cours[groupe] -= 1
+
+    def stats(self):
+        with self._lock:
+            groupes = set(self.limites) | set(self.en_cours)
+            return {
+                groupe: {
+                    'limite': self.limites.get(groupe, 0),
+                    'en_cours': self.en_cours.get(groupe, 0),
+                    'rejets': self.rejets.get(groupe, 0)
+                } for groupe in sorted(groupes)
+            }
+
+
+class TokenBuckets:
+    def __init__(self, debit, rafale, max_buckets=BUCKETS_MAX):
+        self.debit = debit
+        self.rafale = rafale
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.rejets = 0
+
+    def consommer(self, cle):
+        # Renvoie 0 si la requête est admise, sinon le délai d'attente en secondes
+        maintenant = time.monotonic()
+        with self._lock:
+            jetons, dernier = self._buckets.pop(cle, (self.rafale, maintenant))
+            jetons = min(self.rafale, jetons + (maintenant - dernier) * self.debit)
+            attente = 0
+            if jetons >= 1:
+                jetons -= 1
+            else:
+                self.rejets += 1
+                attente = (1 - jetons) / self.debit
+            self._buckets[cle] = (jetons, maintenant)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+            return attente
+
+    def stats(self):
+        with self._lock:
+            return {
+                'debit_par_seconde': self.debit,
+                'rafale': self.rafale,
+                'utilisateurs_suivis': len(self._buckets),
+                'rejets': self.rejets
+            }
+
+
+limiteur = ConcurrencyLimiter(lire_limites())
+buckets_ecriture = TokenBuckets(ECRITURES_PAR_SECONDE, ECRITURES_RAFALE)
+
+
+def admettre():
+    # before_request : rejet immédiat quand le groupe de routes est saturé
+    groupe = request.blueprint
+    if groupe is None:
+        return None
+    if not limiteur.acquerir(groupe):
+        response = jsonify({'message': 'Service saturé, réessayez plus tard'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(RETRY_AFTER_SATURATION)
+        return response
+    g.admission = groupe
+    return None
+
+
+def liberer(exception=None):
+    # teardown_request ; en mode asynchrone, asgi.py reprend le créneau avant
+    # la fin du contexte et le libère après l'appel upstream
+    groupe = g.pop('admission', None)
+    if groupe is not None:
+        limiteur.liberer(groupe)
+
+
+def rate_limit(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        claims = g.get('claims') or {}
+        cle = claims.get('user_id') or request.remote_addr
+        attente = buckets_ecriture.consommer(cle)
+        if attente:
+            response = jsonify({'message': 'Trop de requêtes, réessayez plus tard'})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(math.ceil(attente))
+            return response
+        return f(*args, **kwargs)
+
+    return decorated
@@ -1,18 +1,72 @@
 # gateway/app.py
+import os
+import json
+import time
+import threading
 from flask import Flask
 from blueprints.auth import auth_bp
 from blueprints.match import matches_bp
 from blueprints.pari import pari_bp
 from blueprints.panier import panier_bp
 from blueprints.paiement import paiement_bp
+from blueprints.admin import admin_bp
+from blueprints.batch import batch_bp
+from blueprints.metrics import metrics_bp
+from blueprints.live import live_bp
+from cache import catalogue_cache, traiter_evenement_match
+from admission import admettre, liberer
+from compression import compresser_reponse
+from rabbitmq import get_rabbitmq_exchange
 
 app = Flask(__name__)
+app.before_request(admettre)
+app.teardown_request(liberer)
+app.after_request(compresser_reponse)
 
 app.register_blueprint(auth_bp)
 app.register_blueprint(matches_bp)
 app.register_blueprint(pari_bp)
 app.register_blueprint(panier_bp)
 app.register_blueprint(paiement_bp)
+app.register_blueprint(admin_bp)
+app.register_blueprint(batch_bp)
+app.register_blueprint(metrics_bp)
+app.register_blueprint(live_bp)
+
+
+def traiter_match_events(ch, method, properties, body):
+    try:
+        traiter_evenement_match(json.loads(body))
+    except Exception as e:
+        print(f"Erreur traitement match_events : {e}")
+
+
+def consume_match_events():
+    while True:
+        try:
+            channel, connection, queue_name = get_rabbitmq_exchange('match_events', subscribe=True)
+            # Des événements ont pu être manqués pendant la déconnexion
+            catalogue_cache.clear()
+            channel.basic_consume(
+                queue=queue_name,
+                on_message_callback=traiter_match_events,
+                auto_ack=True
+            )
+            print("Démarrage consommation RabbitMQ match_events")
+            while True:
+                connection.process_data_events(time_limit=1)
+        except Exception as e:
+            print(f"Erreur consommation match_events : {e}")
+
+        print("Reconnexion RabbitMQ match_events dans 5s...")
+        time.sleep(5)
+
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
+    threading.Thread(target=consume_match_events, daemon=True).start()
+
+    if os.getenv('GATEWAY_MODE') == 'async':
+        import uvicorn
+        uvicorn.run('asgi:application', host='0.0.0.0', port=5000, log_level='warning')
+    else:
+        app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,445 @@
+# gateway/asgi.py
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import httpx
+import requests
+from flask import g, request
+from werkzeug.exceptions import HTTPException
+from app import app
+from utils import UpstreamCall, HOP_BY_HOP_HEADERS, INTERNAL_HEADERS, STREAMING_BLOC, BODY_METHODS, volumineux
+from blueprints.batch import BatchCall, BATCH_FAN_OUT
+from singleflight import single_flight
+import metrics
+from upstream import STATUTS_ECHEC, HEDGE
+from admission import limiteur
+from compression import Compresseur, choisir_encodage, compressible, compresser, COMPRESSION_TAILLE_MIN
+from live import relais_live, AbonnementLive, HEADERS_LIVE
+from cache import mettre_en_cache
+
+# Mode asynchrone du gateway : même table de routes (app.url_map) et mêmes
+# contrôles d'authentification que le mode Flask, mais les appels aux services
+# sont faits avec un client HTTP non bloquant.
+MAX_CONNECTIONS = int(os.getenv('ASYNC_MAX_CONNECTIONS', 1000))
+# Corps lus en entier par le gateway (batch) : taille maximale acceptée
+CORPS_MAX = int(os.getenv('ASYNC_CORPS_MAX', 1024 * 1024))
+# Vues qui lisent elles-mêmes le corps de la requête
+ENDPOINTS_CORPS = {'batch.batch'}
+
+_clients = {}
+_en_arriere_plan = set()
+
+
+def get_client(service):
+    client = _clients.get(service.name)
+    if client is None:
+        connect_timeout, read_timeout = service.timeout
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=service.pool_size
+            ),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout, pool=read_timeout)
+        )
+        _clients[service.name] = client
+    return client
+
+
+def build_timeout(timeout):
+    if timeout is None:
+        return httpx.USE_CLIENT_DEFAULT
+    if isinstance(timeout, tuple):
+        return httpx.Timeout(timeout[1], connect=timeout[0])
+    return httpx.Timeout(timeout)
+
+
+def build_environ(scope, body=b''):
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1')
+        value = value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'content-length':
+            # Corps relayé sans être lu : longueur annoncée par le client
+            if not body:
+                environ['CONTENT_LENGTH'] = value
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def resoudre(environ):
+    # Exécute la vue Flask en mode différé : soit elle renvoie l'appel
+    # upstream à effectuer, soit une réponse directe (401, 404, admin...)
+    with app.request_context(environ):
+        g.upstream_differe = True
+        try:
+            if request.routing_exception is not None:
+                raise request.routing_exception
+            rule = request.url_rule
+            # Hooks before_request (admission) comme dans full_dispatch_request
+            rv = app.preprocess_request()
+            if rv is None:
+                if getattr(rule, 'provide_automatic_options', False) and request.method == 'OPTIONS':
+                    rv = app.make_default_options_response()
+                else:
+                    rv = app.view_functions[rule.endpoint](**request.view_args)
+        except HTTPException as e:
+            rv = e
+
+        if isinstance(rv, (UpstreamCall, BatchCall, AbonnementLive)):
+            # Le créneau d'admission est gardé jusqu'à la fin de l'appel upstream
+            return rv, None, g.pop('admission', None)
+        return None, app.make_response(rv), None
+
+
+def liberer_admission(groupe):
+    if groupe is not None:
+        limiteur.liberer(groupe)
+
+
+class CorpsAsgi:
+    # Corps de la requête entrante relayé au service bloc par bloc, au fil des
+    # messages receive() (itérateur asynchrone pour httpx), comme CorpsRequete
+    # en mode synchrone ; len() donne les octets déjà relayés (métriques)
+    def __init__(self, receive, taille_declaree=None):
+        self.receive = receive
+        self.taille_declaree = taille_declaree
+        self.taille = 0
+        self.termine = False
+
+    def __len__(self):
+        return self.taille
+
+    async def __aiter__(self):
+        while not self.termine:
+            message = await self.receive()
+            # Client déconnecté : corps incomplet, l'appel au service échoue
+            self.termine = message['type'] != 'http.request' or not message.get('more_body')
+            bloc = message.get('body', b'')
+            self.taille += len(bloc)
+            if bloc:
+                yield bloc
+
+
+def lit_le_corps(environ):
+    try:
+        endpoint, _ = app.url_map.bind_to_environ(environ).match()
+    except HTTPException:
+        return False
+    return endpoint in ENDPOINTS_CORPS
+
+
+async def lire_body(receive):
+    # Corps lu en entier, borné par CORPS_MAX : None s'il le dépasse
+    blocs = []
+    taille = 0
+    while True:
+        message = await receive()
+        bloc = message.get('body', b'')
+        taille += len(bloc)
+        if taille > CORPS_MAX:
+            return None
+        blocs.append(bloc)
+        if message['type'] != 'http.request' or not message.get('more_body'):
+            return b''.join(blocs)
+
+
+def entete(scope, nom):
+    for name, value in scope['headers']:
+        if name.decode('latin-1').lower() == nom:
+            return value.decode('latin-1')
+    return None
+
+
+async def envoyer(send, status, headers, body, accept_encoding=None):
+    # body : bytes, ou itérateur asynchrone de blocs pour une réponse relayée
+    entetes = dict((k.lower(), v) for k, v in headers)
+    encodage = None
+    if compressible(status, entetes.get('content-type'), entetes.get('content-encoding')):
+        headers = headers + [('Vary', 'Accept-Encoding')]
+        if not isinstance(body, bytes) or len(body) >= COMPRESSION_TAILLE_MIN:
+            encodage = choisir_encodage(accept_encoding)
+    if encodage:
+        headers = [
+            (k, f"W/{v}" if k.lower() == 'etag' and not v.startswith('W/') else v)
+            for k, v in headers if k.lower() != 'content-length'
+        ]
+        headers.append(('Content-Encoding', encodage))
+        if isinstance(body, bytes):
+            body = compresser(body, encodage)
+            headers.append(('Content-Length', str(len(body))))
+
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(k.lower().encode('latin-1'), str(v).encode('latin-1')) for k, v in headers]
+    })
+    if isinstance(body, bytes):
+        await send({'type': 'http.response.body', 'body': body})
+        return
+
+    compresseur = Compresseur(encodage) if encodage else None
+    async for bloc in body:
+        if compresseur is not None:
+            bloc = compresseur.compresser(bloc)
+        if bloc:
+            await send({'type': 'http.response.body', 'body': bloc, 'more_body': True})
+    await send({'type': 'http.response.body', 'body': compresseur.terminer() if compresseur else b''})
+
+
+def abandonner(task):
+    _en_arriere_plan.discard(task)
+    if not task.cancelled() and task.exception() is None:
+        # Réponse relayée non lue : sa connexion retourne au pool
+        _en_arriere_plan.add(asyncio.ensure_future(task.result().aclose()))
+
+
+async def proxy(call, scope, body, flux=False):
+    # Mêmes métriques par route que forward_request en mode synchrone
+    metrics.debut_requete(call.route)
+    debut = time.perf_counter()
+    status, taille = 500, None
+    try:
+        status, headers, content = await relayer(call, scope, body, flux)
+        # Réponse relayée par blocs (volumineuse) : jamais mise en cache
+        mettre_en_cache(call, status, headers, content)
+        if isinstance(content, bytes):
+            taille = len(content)
+        else:
+            taille = next((int(v) for k, v in headers if k.lower() == 'content-length'), None)
+        return status, headers, content
+    finally:
+        metrics.fin_requete(call.route, call.method, status, time.perf_counter() - debut, len(body), taille)
+
+
+async def relayer(call, scope, body, flux=False):
+    # flux=True : une réponse volumineuse est renvoyée comme itérateur de blocs
+    headers = [
+        (k.decode('latin-1'), v.decode('latin-1')) for k, v in scope['headers']
+        if k.decode('latin-1').lower() not in HOP_BY_HOP_HEADERS
+        and k.decode('latin-1').lower() not in INTERNAL_HEADERS
+        and k.decode('latin-1').lower() != 'accept-encoding'
+    ]
+    headers.extend(call.headers.items())
+    headers.append(('Accept-Encoding', 'identity'))
+    content = body if call.method in BODY_METHODS else None
+    if isinstance(content, CorpsAsgi) and content.taille_declaree is not None:
+        # Longueur connue : pas d'envoi en chunked
+        headers.append(('Content-Length', content.taille_declaree))
+    url = call.path
+    if scope['query_string']:
+        url = f"{url}?{scope['query_string'].decode('latin-1')}"
+
+    async def tentative(replica, sonde=False):
+        # Même répartition entre réplicas que le mode synchrone (upstream.py)
+        debut = time.perf_counter()
+        succes = False
+        status = None
+        try:
+            client = get_client(call.service)
+            response = await client.send(client.build_request(
+                call.method,
+                f"{replica.url}{url}",
+                headers=headers,
+                content=content,
+                timeout=build_timeout(call.timeout)
+            ), stream=True)
+            status = response.status_code
+            succes = status not in STATUTS_ECHEC
+            if not volumineux(response):
+                await response.aread()
+            return response
+        finally:
+            call.service.terminer(replica, time.perf_counter() - debut, succes, sonde, status)
+
+    async def appel():
+        sonde = call.service.circuit.autoriser()
+        delai = call.service.delai_hedge() if call.method == 'GET' and HEDGE and not sonde else None
+        replica = call.service.choisir()
+        if delai is None:
+            return await tentative(replica, sonde)
+
+        premier = asyncio.ensure_future(tentative(replica))
+        termines, _ = await asyncio.wait({premier}, timeout=delai)
+        if termines or not call.service.autoriser_hedge():
+            return await premier
+
+        second = asyncio.ensure_future(tentative(call.service.choisir(exclure=replica)))
+        en_attente = {premier, second}
+        dernier = None
+        while en_attente:
+            termines, en_attente = await asyncio.wait(en_attente, return_when=asyncio.FIRST_COMPLETED)
+            for task in termines:
+                dernier = task
+                if task.exception() is None and task.result().status_code not in STATUTS_ECHEC:
+                    # La tentative perdante se termine en arrière-plan
+                    for perdante in en_attente:
+                        _en_arriere_plan.add(perdante)
+                        perdante.add_done_callback(abandonner)
+                    if task is second:
+                        call.service.hedge_gagnant()
+                    return task.result()
+        return dernier.result()
+
+    async def appel_partage(partage):
+        response = await appel()
+        if volumineux(response):
+            # Trop volumineux pour être partagé : le leader relaie son propre flux,
+            # les requêtes fusionnées refont leur appel
+            partage['response'] = response
+            return None
+        return response
+
+    try:
+        if call.cle is None:
+            response = await appel()
+        else:
+            partage = {}
+            response = await single_flight.do_async(call.cle, lambda: appel_partage(partage))
+            if response is None:
+                response = partage.pop('response', None) or await appel()
+    except (httpx.HTTPError, requests.exceptions.RequestException) as e:
+        return 503, [('Content-Type', 'application/json')], json.dumps(
+            {'message': f'Erreur de service: {str(e)}'}
+        ).encode('utf-8')
+
+    headers = [(k, v) for k, v in response.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS]
+    if volumineux(response):
+        if 'content-length' in response.headers:
+            headers.append(('Content-Length', response.headers['content-length']))
+        if flux:
+            # Octets du service relayés tels quels, sans décodage
+            return response.status_code, headers, response.aiter_raw(STREAMING_BLOC)
+        await response.aread()
+
+    # httpx décode le contenu lu : Content-Encoding et Content-Length sont recalculés
+    headers = [(k, v) for k, v in headers if k.lower() not in ('content-encoding', 'content-length')]
+    headers.append(('Content-Length', str(len(response.content))))
+    return response.status_code, headers, response.content
+
+
+async def executer_batch(batch):
+    semaphore = asyncio.Semaphore(BATCH_FAN_OUT)
+
+    async def executer(identifiant, environ):
+        async with semaphore:
+            body = environ['wsgi.input'].getvalue()
+            call, response, groupe = resoudre(environ)
+            if response is not None:
+                status, content_type, content = response.status_code, response.mimetype, response.get_data()
+            else:
+                headers = [
+                    (key[5:].replace('_', '-').lower().encode('latin-1'), value.encode('latin-1'))
+                    for key, value in environ.items() if key.startswith('HTTP_')
+                ]
+                if environ.get('CONTENT_TYPE'):
+                    headers.append((b'content-type', environ['CONTENT_TYPE'].encode('latin-1')))
+                scope = {'headers': headers, 'query_string': environ['QUERY_STRING'].encode('latin-1')}
+                try:
+                    status, headers, content = await proxy(call, scope, body)
+                finally:
+                    liberer_admission(groupe)
+                content_type = dict((k.lower(), v) for k, v in headers).get('content-type', '')
+
+            if 'json' in content_type:
+                try:
+                    return {'id': identifiant, 'status': status, 'body': json.loads(content)}
+                except ValueError:
+                    pass
+            return {'id': identifiant, 'status': status, 'body': content.decode('utf-8', 'replace')}
+
+    reponses = await asyncio.gather(*(executer(i, environ) for i, environ in batch.sous_requetes))
+    return 200, [('Content-Type', 'application/json')], json.dumps({'reponses': reponses}).encode('utf-8')
+
+
+async def attendre_deconnexion(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def diffuser_live(abonnement, receive, send):
+    # Client inactif : une tâche en attente, réveillée par le relais live
+    abonne = relais_live.abonner(abonnement.match_ids, abonnement.competition_ids, asyncio.get_running_loop())
+    if abonne is None:
+        await envoyer(send, 503, [('Content-Type', 'application/json'), ('Retry-After', '5')], json.dumps(
+            {'message': 'Trop de connexions live, réessayez plus tard'}).encode('utf-8'))
+        return
+    deconnexion = asyncio.ensure_future(attendre_deconnexion(receive))
+    try:
+        headers = [('Content-Type', 'text/event-stream; charset=utf-8')] + list(HEADERS_LIVE.items())
+        await envoyer(send, 200, headers, relais_live.flux_async(abonne, deconnexion))
+    finally:
+        deconnexion.cancel()
+        relais_live.desabonner(abonne)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            for client in _clients.values():
+                await client.aclose()
+            _clients.clear()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    accept_encoding = entete(scope, 'accept-encoding')
+    environ = build_environ(scope)
+    if lit_le_corps(environ):
+        body = await lire_body(receive)
+        if body is None:
+            await envoyer(send, 413, [('Content-Type', 'application/json')], json.dumps(
+                {'message': f'Corps de requête limité à {CORPS_MAX} octets'}).encode('utf-8'))
+            return
+        environ = build_environ(scope, body)
+    else:
+        body = CorpsAsgi(receive, entete(scope, 'content-length'))
+    call, response, groupe = resoudre(environ)
+    if response is not None:
+        await envoyer(send, response.status_code, response.headers.to_wsgi_list(), response.get_data(), accept_encoding)
+        return
+
+    try:
+        if isinstance(call, AbonnementLive):
+            await diffuser_live(call, receive, send)
+            return
+        if isinstance(call, BatchCall):
+            status, headers, content = await executer_batch(call)
+        else:
+            status, headers, content = await proxy(call, scope, body, flux=True)
+        await envoyer(send, status, headers, content, accept_encoding)
+    finally:
+        liberer_admission(groupe)
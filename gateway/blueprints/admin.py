@@ -0,0 +1,44 @@
+# gateway/blueprints/admin.py
+from flask import Blueprint, jsonify, g
+from utils import require_auth
+from upstream import get_upstreams
+from cache import catalogue_cache
+from tokens import token_cache
+from singleflight import single_flight
+from admission import limiteur, buckets_ecriture
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+# Toutes les routes d'administration : réservées aux bookmakers
+@admin_bp.before_request
+@require_auth
+def verifier_bookmaker():
+    if g.claims.get('role') != 'bookmaker':
+        return jsonify({'message': 'Accès non autorisé'}), 403
+
+@admin_bp.route('/upstreams', methods=['GET'])
+def stats_upstreams():
+    return jsonify({name: upstream.stats() for name, upstream in get_upstreams().items()}), 200
+
+@admin_bp.route('/circuits', methods=['GET'])
+def stats_circuits():
+    return jsonify({name: upstream.circuit.stats() for name, upstream in get_upstreams().items()}), 200
+
+@admin_bp.route('/cache', methods=['GET'])
+def stats_cache():
+    return jsonify(catalogue_cache.stats()), 200
+
+@admin_bp.route('/tokens', methods=['GET'])
+def stats_tokens():
+    return jsonify(token_cache.stats()), 200
+
+@admin_bp.route('/coalescing', methods=['GET'])
+def stats_coalescing():
+    return jsonify(single_flight.stats()), 200
+
+@admin_bp.route('/admission', methods=['GET'])
+def stats_admission():
+    return jsonify({
+        'concurrence': limiteur.stats(),
+        'ecritures': buckets_ecriture.stats()
+    }), 200
@@ -0,0 +1,84 @@
+# gateway/blueprints/batch.py
+from flask import Blueprint, request, jsonify, g, current_app
+from werkzeug.test import EnvironBuilder
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple
+from utils import HOP_BY_HOP_HEADERS
+import os
+
+batch_bp = Blueprint('batch', __name__)
+
+BATCH_MAX_REQUETES = int(os.getenv('BATCH_MAX_REQUETES', 20))
+BATCH_FAN_OUT = int(os.getenv('BATCH_FAN_OUT', 8))
+METHODES = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+
+# En mode asynchrone, la vue renvoie les sous-requêtes à exécuter (asgi.py)
+BatchCall = namedtuple('BatchCall', ['sous_requetes'])
+
+
+def construire_environ(sous_requete):
+    # Chaque sous-requête hérite des en-têtes du batch (Authorization...) et
+    # repasse par la table de routes : mêmes contrôles que les routes unitaires.
+    # Seule la réponse du batch est compressée, pas chaque sous-réponse
+    headers = [
+        (key, value) for key, value in request.headers
+        if key.lower() not in HOP_BY_HOP_HEADERS and key.lower() not in ('content-type', 'accept-encoding')
+    ]
+    return EnvironBuilder(
+        path=sous_requete['path'],
+        method=sous_requete.get('method', 'GET').upper(),
+        headers=headers,
+        json=sous_requete.get('body'),
+        environ_base={'REMOTE_ADDR': request.remote_addr}
+    ).get_environ()
+
+
+def valider(sous_requetes):
+    if not isinstance(sous_requetes, list) or not sous_requetes:
+        return 'Liste de requêtes requise'
+    if len(sous_requetes) > BATCH_MAX_REQUETES:
+        return f'Maximum {BATCH_MAX_REQUETES} requêtes par batch'
+    for sous_requete in sous_requetes:
+        if not isinstance(sous_requete, dict) or not str(sous_requete.get('path', '')).startswith('/'):
+            return 'Chaque requête doit avoir un chemin absolu'
+        if sous_requete['path'].split('?')[0].rstrip('/') == '/batch':
+            return 'Batch imbriqué interdit'
+        if sous_requete['path'].split('?')[0].rstrip('/') == '/matches/live':
+            return 'Flux live interdit dans un batch'
+        if sous_requete.get('method', 'GET').upper() not in METHODES:
+            return f"Méthode non supportée : {sous_requete.get('method')}"
+    return None
+
+
+def formater(identifiant, response):
+    body = response.get_json(silent=True) if response.is_json else response.get_data(as_text=True)
+    return {'id': identifiant, 'status': response.status_code, 'body': body}
+
+
+def executer(app, environ):
+    with app.request_context(environ):
+        return app.full_dispatch_request()
+
+
+@batch_bp.route('/batch', methods=['POST'])
+def batch():
+    data = request.get_json(silent=True) or {}
+    sous_requetes = data.get('requetes')
+    erreur = valider(sous_requetes)
+    if erreur:
+        return jsonify({'message': erreur}), 400
+
+    environs = [
+        (sous_requete.get('id', index), construire_environ(sous_requete))
+        for index, sous_requete in enumerate(sous_requetes)
+    ]
+    if g.get('upstream_differe'):
+        return BatchCall(environs)
+
+    app = current_app._get_current_object()
+    with ThreadPoolExecutor(max_workers=min(BATCH_FAN_OUT, len(environs))) as executor:
+        responses = list(executor.map(lambda item: executer(app, item[1]), environs))
+
+    return jsonify({'reponses': [
+        formater(identifiant, response) for (identifiant, _), response in zip(environs, responses)
+    ]}), 200
@@ -0,0 +1,24 @@
+# gateway/blueprints/live.py
+from flask import Blueprint, Response, request, jsonify, g
+from live import relais_live, lire_ids, AbonnementLive, HEADERS_LIVE
+
+# Groupe d'admission distinct : les connexions longues ne consomment pas
+# les créneaux des autres routes /matches
+live_bp = Blueprint('live', __name__)
+
+
+@live_bp.route('/matches/live', methods=['GET'])
+def flux_live():
+    try:
+        match_ids = lire_ids(request.args.getlist('match_id'))
+        competition_ids = lire_ids(request.args.getlist('competition_id'))
+    except ValueError:
+        return jsonify({'message': 'match_id et competition_id doivent être des entiers'}), 400
+
+    if g.get('upstream_differe'):
+        return AbonnementLive(match_ids, competition_ids)
+
+    abonne = relais_live.abonner(match_ids, competition_ids)
+    if abonne is None:
+        return jsonify({'message': 'Trop de connexions live, réessayez plus tard'}), 503, {'Retry-After': '5'}
+    return Response(relais_live.flux(abonne), mimetype='text/event-stream', headers=HEADERS_LIVE)
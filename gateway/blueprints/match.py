@@ -1,78 +1,104 @@
 # gateway/blueprints/match.py
 from flask import Blueprint, request
 from utils import forward_request, require_auth
-import os
+from upstream import get_upstream
+from cache import forward_cached
 
 matches_bp = Blueprint('matches', __name__, url_prefix='/matches')
-SERVICE_URL = os.getenv('MATCH_SERVICE_URL')
+SERVICE = get_upstream('match')
+
+# Import d'une saison complète ou cotes de centaines de matches en une transaction
+TIMEOUT_IMPORT = (2, 60)
 
 
 # Matches
 @matches_bp.route('', methods=['GET'])
 def liste_matches():
-    return forward_request(SERVICE_URL, '/matches', 'GET')
+    return forward_cached(SERVICE, '/matches', ('liste_matches',))
 
 @matches_bp.route('', methods=['POST'])
 @require_auth
 def creer_match():
-    return forward_request(SERVICE_URL, '/matches', 'POST')
+    return forward_request(SERVICE, '/matches', 'POST')
 
 @matches_bp.route('/<int:match_id>', methods=['DELETE'])
 @require_auth
 def delete_match(match_id):
-    return forward_request(SERVICE_URL, f'/matches/{match_id}', 'DELETE')
+    return forward_request(SERVICE, f'/matches/{match_id}', 'DELETE')
+
+@matches_bp.route('/import', methods=['POST'])
+@require_auth
+def importer_matches():
+    return forward_request(SERVICE, '/matches/import', 'POST', timeout=TIMEOUT_IMPORT)
 
 @matches_bp.route('/<int:match_id>', methods=['GET'])
 def get_match(match_id):
-    return forward_request(SERVICE_URL, f'/matches/{match_id}', 'GET')
+    return forward_cached(SERVICE, f'/matches/{match_id}', ('match', f'match:{match_id}'))
 
 @matches_bp.route('/<int:match_id>/score', methods=['PUT'])
 @require_auth
 def update_score(match_id):
-    return forward_request(SERVICE_URL, f'/matches/{match_id}/score', 'PUT')
+    return forward_request(SERVICE, f'/matches/{match_id}/score', 'PUT')
+
+@matches_bp.route('/cotes', methods=['PUT'])
+@require_auth
+def update_cotes_lot():
+    return forward_request(SERVICE, '/matches/cotes', 'PUT', timeout=TIMEOUT_IMPORT)
+
+@matches_bp.route('/<int:match_id>/cotes/historique', methods=['GET'])
+def historique_cotes(match_id):
+    return forward_cached(SERVICE, f'/matches/{match_id}/cotes/historique', ('match', f'match:{match_id}'))
 
 @matches_bp.route('/<int:match_id>/cotes', methods=['PUT'])
 @require_auth
 def update_cotes(match_id):
-    return forward_request(SERVICE_URL, f'/matches/{match_id}/cotes', 'PUT')
+    return forward_request(SERVICE, f'/matches/{match_id}/cotes', 'PUT')
 
 # Compétitions
 @matches_bp.route('/competitions', methods=['GET'])
 def liste_competitions():
-    return forward_request(SERVICE_URL, '/matches/competitions', 'GET')
+    return forward_cached(SERVICE, '/matches/competitions', ('competitions',))
+
+@matches_bp.route('/competitions/<int:competition_id>', methods=['GET'])
+def get_competition(competition_id):
+    return forward_cached(SERVICE, f'/matches/competitions/{competition_id}', ('competitions',))
 
 @matches_bp.route('/competitions', methods=['POST'])
 @require_auth
 def creer_competition():
-    return forward_request(SERVICE_URL, '/matches/competitions', 'POST')
+    return forward_request(SERVICE, '/matches/competitions', 'POST')
 
 @matches_bp.route('/competitions/<int:competition_id>', methods=['PUT'])
 @require_auth
 def update_competition(competition_id):
-    return forward_request(SERVICE_URL, f'/matches/competitions/{competition_id}', 'PUT')
+    return forward_request(SERVICE, f'/matches/competitions/{competition_id}', 'PUT')
 
 @matches_bp.route('/competitions/<int:competition_id>', methods=['DELETE'])
 @require_auth
 def delete_competition(competition_id):
-    return forward_request(SERVICE_URL, f'/matches/competitions/{competition_id}', 'DELETE')
+    return forward_request(SERVICE, f'/matches/competitions/{competition_id}', 'DELETE')
 
 
 # Équipes
 @matches_bp.route('/equipes', methods=['GET'])
 def liste_equipes():
-    return forward_request(SERVICE_URL, '/matches/equipes', 'GET')
+    return forward_cached(SERVICE, '/matches/equipes', ('equipes',))
+
+@matches_bp.route('/equipes/<int:equipe_id>', methods=['GET'])
+def get_equipe(equipe_id):
+    return forward_cached(SERVICE, f'/matches/equipes/{equipe_id}', ('equipes',))
 
 @matches_bp.route('/equipes', methods=['POST'])
 @require_auth
 def creer_equipe():
-    return forward_request(SERVICE_URL, '/matches/equipes', 'POST')
+    return forward_request(SERVICE, '/matches/equipes', 'POST')
 
 @matches_bp.route('/equipes/<int:equipe_id>', methods=['PUT'])
 @require_auth
 def update_equipe(equipe_id):
-    return forward_request(SERVICE_URL, f'/matches/equipes/{equipe_id}', 'PUT')
+    return forward_request(SERVICE, f'/matches/equipes/{equipe_id}', 'PUT')
 
 @matches_bp.route('/equipes/<int:equipe_id>', methods=['DELETE'])
 @require_auth
 def delete_equipe(equipe_id):
-    return forward_request(SERVICE_URL, f'/matches/equipes/{equipe_id}', 'DELETE')
+    return forward_request(SERVICE, f'/matches/equipes/{equipe_id}', 'DELETE')
@@ -0,0 +1,81 @@
+# gateway/blueprints/metrics.py
+from flask import Blueprint, Response, request, jsonify
+from upstream import get_upstreams
+from cache import catalogue_cache
+from singleflight import single_flight
+from admission import limiteur
+from live import relais_live
+from metrics import registre, formater_labels
+import hmac
+import os
+
+metrics_bp = Blueprint('metrics', __name__)
+
+# Jeton attendu par /metrics (Authorization: Bearer <METRICS_TOKEN>) : sans
+# lui, la route est fermée (réplicas internes, disjoncteurs, admission)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def serie(nom, type_metrique, aide, valeurs, labels=()):
+    lignes = [f'# HELP {nom} {aide}', f'# TYPE {nom} {type_metrique}']
+    lignes.extend(f'{nom}{formater_labels(labels, cle)} {valeur}' for cle, valeur in valeurs)
+    return lignes
+
+
+@registre.collecteur
+def collecter_upstreams():
+    upstreams = get_upstreams()
+    return (
+        serie('gateway_upstream_en_cours', 'gauge', 'Appels en cours par réplica',
+              [((nom, r.url), r.en_cours) for nom, u in upstreams.items() for r in u.replicas],
+              ('service', 'replica'))
+        + serie('gateway_upstream_circuit_ouvert', 'gauge', 'Disjoncteur ouvert (1) ou semi-ouvert (0.5)',
+                [((nom,), {'ouvert': 1, 'semi_ouvert': 0.5}.get(u.circuit.etat, 0)) for nom, u in upstreams.items()],
+                ('service',))
+        + serie('gateway_upstream_hedges_total', 'counter', 'Requêtes de secours envoyées',
+                [((nom,), u.hedges) for nom, u in upstreams.items()], ('service',))
+    )
+
+
+@registre.collecteur
+def collecter_gateway():
+    cache = catalogue_cache.stats()
+    coalescing = single_flight.stats()
+    admission = limiteur.stats()
+    return (
+        serie('gateway_cache_requetes_total', 'counter', 'Lectures du cache catalogue',
+              [(('hit',), cache['hits']), (('miss',), cache['misses'])], ('resultat',))
+        + serie('gateway_cache_entrees', 'gauge', 'Entrées du cache catalogue', [((), cache['entrees'])])
+        + serie('gateway_requetes_fusionnees_total', 'counter', 'GET identiques fusionnés (single-flight)',
+                [((), coalescing['requetes_fusionnees'])])
+        + serie('gateway_admission_en_cours', 'gauge', 'Requêtes admises en cours par groupe de routes',
+                [((groupe,), stats['en_cours']) for groupe, stats in admission.items()], ('groupe',))
+        + serie('gateway_admission_rejets_total', 'counter', 'Requêtes rejetées (503) par groupe de routes',
+                [((groupe,), stats['rejets']) for groupe, stats in admission.items()], ('groupe',))
+    )
+
+
+@registre.collecteur
+def collecter_live():
+    live = relais_live.stats()
+    return (
+        serie('gateway_live_abonnes', 'gauge', 'Clients connectés au flux live', [((), live['abonnes'])])
+        + serie('gateway_live_connecte', 'gauge', 'Connexion au flux live de service_match ouverte',
+                [((), int(live['connecte']))])
+        + serie('gateway_live_evenements_total', 'counter', 'États de match reçus de service_match',
+                [((), live['evenements'])])
+        + serie('gateway_live_rejets_total', 'counter', 'Connexions live refusées (LIVE_MAX_ABONNES)',
+                [((), live['rejets'])])
+        + serie('gateway_live_reconnexions_total', 'counter', 'Reconnexions au flux live de service_match',
+                [((), live['reconnexions'])])
+    )
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def exposer_metrics():
+    if not METRICS_TOKEN:
+        return jsonify({'message': 'Métriques désactivées (METRICS_TOKEN non défini)'}), 403
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {METRICS_TOKEN}'):
+        return jsonify({'message': 'Token invalide'}), 401
+    return Response(registre.exposer(), content_type=CONTENT_TYPE)
@@ -1,33 +1,39 @@
 # gateway/blueprints/paiement.py
 from flask import Blueprint
 from utils import forward_request, require_auth
-import os
+from upstream import get_upstream
+from admission import rate_limit
 
 paiement_bp = Blueprint('paiement', __name__, url_prefix='/transactions')
-SERVICE_URL = os.getenv('PAIEMENT_SERVICE_URL')
+SERVICE = get_upstream('paiement')
+
+# Les mouvements financiers mettent à jour la cagnotte via le service auth
+TIMEOUT_CAGNOTTE = (2, 20)
 
 @paiement_bp.route('/depot', methods=['POST'])
 @require_auth
+@rate_limit
 def effectuer_depot():
-   return forward_request(SERVICE_URL, '/transactions/depot', 'POST')
+   return forward_request(SERVICE, '/transactions/depot', 'POST', timeout=TIMEOUT_CAGNOTTE)
 
 @paiement_bp.route('/gain', methods=['POST'])
 @require_auth
 def traiter_gain():
-    return forward_request(SERVICE_URL, '/transactions/gain', 'POST')
+    return forward_request(SERVICE, '/transactions/gain', 'POST', timeout=TIMEOUT_CAGNOTTE)
 
 @paiement_bp.route('/remboursement', methods=['POST'])
 @require_auth
 def traiter_remboursement():
-    return forward_request(SERVICE_URL, '/transactions/remboursement', 'POST')
+    return forward_request(SERVICE, '/transactions/remboursement', 'POST', timeout=TIMEOUT_CAGNOTTE)
 
 
 @paiement_bp.route('/retrait', methods=['POST'])
 @require_auth
+@rate_limit
 def effectuer_retrait():
-    return forward_request(SERVICE_URL, '/transactions/retrait', 'POST')
+    return forward_request(SERVICE, '/transactions/retrait', 'POST', timeout=TIMEOUT_CAGNOTTE)
 
 @paiement_bp.route('/utilisateur/<int:utilisateur_id>', methods=['GET'])
 @require_auth
 def liste_transactions(utilisateur_id):
-   return forward_request(SERVICE_URL, f'/transactions/utilisateur/{utilisateur_id}', 'GET')
+   return forward_request(SERVICE, f'/transactions/utilisateur/{utilisateur_id}', 'GET')
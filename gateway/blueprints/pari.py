@@ -1,28 +1,35 @@
 # gateway/blueprints/pari.py
 from flask import Blueprint
 from utils import forward_request, require_auth
-import os
+from upstream import get_upstream
+from admission import rate_limit
 
 pari_bp = Blueprint('paris', __name__, url_prefix='/paris')
-SERVICE_URL = os.getenv('PARI_SERVICE_URL')
+SERVICE = get_upstream('pari')
+
+# Le placement d'un pari enchaîne des appels vers match, auth et paiement
+TIMEOUT_PLACEMENT = (2, 30)
 
 @pari_bp.route('/', methods=['POST'])
 @require_auth
+@rate_limit
 def placer_pari():
-   return forward_request(SERVICE_URL, '/paris', 'POST')
+   return forward_request(SERVICE, '/paris', 'POST', timeout=TIMEOUT_PLACEMENT)
 
 @pari_bp.route('/utilisateur/<int:utilisateur_id>', methods=['GET'])
 @require_auth
 def liste_paris_utilisateur(utilisateur_id):
-   return forward_request(SERVICE_URL, f'/paris/utilisateur/{utilisateur_id}', 'GET')
+   return forward_request(SERVICE, f'/paris/utilisateur/{utilisateur_id}', 'GET')
 
 @pari_bp.route('/groupe', methods=['POST'])
 @require_auth
+@rate_limit
 def placer_pari_combine():
-    return forward_request(SERVICE_URL, '/paris/groupe', 'POST')
+    return forward_request(SERVICE, '/paris/groupe', 'POST', timeout=TIMEOUT_PLACEMENT)
 
 @pari_bp.route('/<int:pari_id>/annulation', methods=['POST'])
 @require_auth
+@rate_limit
 def annuler_pari(pari_id):
-    return forward_request(SERVICE_URL, f'/paris/{pari_id}/annulation', 'POST')
+    return forward_request(SERVICE, f'/paris/{pari_id}/annulation', 'POST', timeout=TIMEOUT_PLACEMENT)
 
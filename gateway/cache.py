@@ -0,0 +1,167 @@
+# gateway/cache.py
+import os
+import time
+import threading
+from collections import OrderedDict
+from flask import request
+from werkzeug.http import unquote_etag
+from utils import forward_request, UpstreamCall
+
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 1000))
+CACHE_TTL = float(os.getenv('CACHE_TTL', 30))
+
+
+class ResponseCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._tags = {}
+        # Générations par tag (et globale pour clear) : une réponse lue avant
+        # une invalidation de l'un de ses tags n'est pas mise en cache après
+        self._generations = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.ecritures_perimees = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._supprimer(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def generation(self, tags):
+        # À relever avant l'appel upstream, puis à passer à set
+        with self._lock:
+            return self._generation, tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def set(self, key, value, tags, generation=None):
+        with self._lock:
+            if generation is not None and generation != (
+                    self._generation, tuple(self._generations.get(tag, 0) for tag in tags)):
+                # Invalidation reçue pendant l'appel : réponse peut-être antérieure
+                self.ecritures_perimees += 1
+                return
+            if key in self._entries:
+                self._supprimer(key)
+            self._entries[key] = (time.monotonic() + self.ttl, tags, value)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._supprimer(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, *tags):
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+                keys |= self._tags.get(tag, set())
+            for key in keys:
+                self._supprimer(key)
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._generation += 1
+            self._generations.clear()
+            self._entries.clear()
+            self._tags.clear()
+
+    def _supprimer(self, key):
+        _, tags, _ = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entrees': len(self._entries),
+                'max_entrees': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 3) if total else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'ecritures_perimees': self.ecritures_perimees
+            }
+
+
+catalogue_cache = ResponseCache()
+
+
+def cache_key():
+    return f"{request.path}?{'&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))}"
+
+
+def forward_cached(service, path, tags, cache=catalogue_cache):
+    key = cache_key()
+    cached = cache.get(key)
+    if cached is not None:
+        content, status, headers = cached
+        etag = next((v for k, v in headers if k.lower() == 'etag'), None)
+        if etag and request.if_none_match.contains_weak(unquote_etag(etag)[0]):
+            # Le client a déjà cette version : 304 sans appel au service
+            return b'', 304, [('ETag', etag), ('X-Cache', 'HIT')]
+        return content, status, headers + [('X-Cache', 'HIT')]
+
+    # If-None-Match est transmis tel quel : un 304 du service est renvoyé au
+    # client sans être mis en cache
+    generation = cache.generation(tags)
+    response = forward_request(service, path, 'GET')
+    if isinstance(response, UpstreamCall):
+        # Mode asynchrone : la réponse est mise en cache par asgi.py une fois
+        # l'appel effectué (mettre_en_cache)
+        return response._replace(cache=(cache, key, tags, generation))
+    if isinstance(response, tuple) and response[1] == 200:
+        cache.set(key, response, tags, generation)
+    return response
+
+
+def mettre_en_cache(call, status, headers, content):
+    # Même entrée qu'en mode synchrone : (contenu, statut, en-têtes sans Content-Length)
+    if call.cache is None or status != 200 or not isinstance(content, bytes):
+        return
+    cache, key, tags, generation = call.cache
+    cache.set(key, (content, status, [(k, v) for k, v in headers if k.lower() != 'content-length']), tags, generation)
+
+
+# Tags invalidés pour chaque type d'événement publié par service_match
+# sur l'exchange match_events
+INVALIDATIONS = {
+    'match_cree': lambda e: ('liste_matches',),
+    'matches_importes': lambda e: ('liste_matches',),
+    'match_modifie': lambda e: ('liste_matches', f"match:{e['match_id']}"),
+    'match_supprime': lambda e: ('liste_matches', f"match:{e['match_id']}"),
+    'score_modifie': lambda e: ('liste_matches', f"match:{e['match_id']}"),
+    'cotes_modifiees': lambda e: ('liste_matches', f"match:{e['match_id']}"),
+    'cotes_modifiees_lot': lambda e: ('liste_matches', *(f"match:{i}" for i in e['match_ids'])),
+    'equipe_modifiee': lambda e: ('equipes', 'liste_matches', 'match'),
+    'competition_modifiee': lambda e: ('competitions', 'liste_matches', 'match')
+}
+
+
+def traiter_evenement_match(event, cache=catalogue_cache):
+    invalidation = INVALIDATIONS.get(event.get('type'))
+    if invalidation is None:
+        # Événement inconnu : on préfère vider le cache que servir une donnée périmée
+        cache.clear()
+        return
+    cache.invalidate(*invalidation(event))
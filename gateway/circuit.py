@@ -0,0 +1,96 @@
+# gateway/circuit.py
+import os
+import time
+import threading
+from collections import deque
+import requests
+
+FENETRE = int(os.getenv('CIRCUIT_FENETRE', 50))
+APPELS_MIN = int(os.getenv('CIRCUIT_APPELS_MIN', 20))
+SEUIL_ERREURS = float(os.getenv('CIRCUIT_SEUIL_ERREURS', 0.5))
+SEUIL_LENTEUR = float(os.getenv('CIRCUIT_SEUIL_LENTEUR', 0.8))
+APPEL_LENT = float(os.getenv('CIRCUIT_APPEL_LENT', 2))
+DUREE_OUVERTURE = float(os.getenv('CIRCUIT_DUREE_OUVERTURE', 10))
+SONDES = int(os.getenv('CIRCUIT_SONDES', 1))
+
+FERME = 'fermé'
+OUVERT = 'ouvert'
+SEMI_OUVERT = 'semi_ouvert'
+
+
+class CircuitOuvert(requests.exceptions.RequestException):
+    pass
+
+
+class CircuitBreaker:
+    # Fenêtre glissante des derniers appels : le circuit s'ouvre quand le taux
+    # d'erreurs ou d'appels lents dépasse son seuil, puis laisse passer une
+    # sonde (semi-ouvert) après DUREE_OUVERTURE secondes
+    def __init__(self, name):
+        self.name = name
+        self.etat = FERME
+        self._fenetre = deque(maxlen=FENETRE)
+        self._lock = threading.Lock()
+        self._ouvert_jusqua = 0.0
+        self._sondes_en_cours = 0
+        self.ouvertures = 0
+        self.rejets = 0
+
+    def autoriser(self):
+        # Renvoie True si l'appel est une sonde du mode semi-ouvert
+        with self._lock:
+            if self.etat == OUVERT:
+                if time.monotonic() < self._ouvert_jusqua:
+                    self.rejets += 1
+                    raise CircuitOuvert(f"Circuit ouvert pour le service {self.name}")
+                self.etat = SEMI_OUVERT
+                self._sondes_en_cours = 0
+
+            if self.etat == SEMI_OUVERT:
+                if self._sondes_en_cours >= SONDES:
+                    self.rejets += 1
+                    raise CircuitOuvert(f"Circuit semi-ouvert pour le service {self.name}")
+                self._sondes_en_cours += 1
+                return True
+            return False
+
+    def enregistrer(self, succes, duree, sonde=False):
+        with self._lock:
+            if sonde:
+                self._sondes_en_cours -= 1
+                if succes and duree < APPEL_LENT:
+                    self.etat = FERME
+                    self._fenetre.clear()
+                else:
+                    self._ouvrir()
+                return
+
+            if self.etat != FERME:
+                return
+            self._fenetre.append((not succes, duree >= APPEL_LENT))
+            if len(self._fenetre) < APPELS_MIN:
+                return
+            erreurs = sum(1 for echec, _ in self._fenetre if echec) / len(self._fenetre)
+            lenteur = sum(1 for _, lent in self._fenetre if lent) / len(self._fenetre)
+            if erreurs >= SEUIL_ERREURS or lenteur >= SEUIL_LENTEUR:
+                self._ouvrir()
+
+    def _ouvrir(self):
+        self.etat = OUVERT
+        self.ouvertures += 1
+        self._ouvert_jusqua = time.monotonic() + DUREE_OUVERTURE
+        self._fenetre.clear()
+
+    def stats(self):
+        with self._lock:
+            appels = len(self._fenetre)
+            return {
+                'etat': self.etat,
+                'reouverture_dans': round(max(self._ouvert_jusqua - time.monotonic(), 0), 1)
+                if self.etat == OUVERT else 0,
+                'fenetre': appels,
+                'taux_erreurs': round(sum(1 for e, _ in self._fenetre if e) / appels, 3) if appels else 0.0,
+                'taux_lenteur': round(sum(1 for _, l in self._fenetre if l) / appels, 3) if appels else 0.0,
+                'ouvertures': self.ouvertures,
+                'rejets': self.rejets
+            }
@@ -0,0 +1,93 @@
+# gateway/compression.py
+import os
+import zlib
+from flask import request
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Compression négociée avec le client (Accept-Encoding) : les services
+# répondent en clair au gateway, qui compresse une seule fois en sortie
+COMPRESSION_TAILLE_MIN = int(os.getenv('COMPRESSION_TAILLE_MIN', 1024))
+NIVEAU_GZIP = int(os.getenv('COMPRESSION_NIVEAU_GZIP', 6))
+QUALITE_BROTLI = int(os.getenv('COMPRESSION_QUALITE_BROTLI', 4))
+TYPES_COMPRESSIBLES = ('application/json', 'text/', 'application/javascript')
+
+
+def choisir_encodage(accept_encoding):
+    acceptes = parse_accept_header(accept_encoding or '')
+    for encodage in (('br',) if brotli else ()) + ('gzip',):
+        if acceptes.quality(encodage) > 0:
+            return encodage
+    return None
+
+
+def compressible(status, content_type, content_encoding=None):
+    if status < 200 or status in (204, 304) or content_encoding:
+        return False
+    # Un flux SSE doit partir sans attendre de remplir un bloc compressé
+    if (content_type or '').startswith('text/event-stream'):
+        return False
+    return (content_type or '').startswith(TYPES_COMPRESSIBLES)
+
+
+class Compresseur:
+    def __init__(self, encodage):
+        self.encodage = encodage
+        if encodage == 'br':
+            self._brotli = brotli.Compressor(quality=QUALITE_BROTLI)
+        else:
+            self._zlib = zlib.compressobj(NIVEAU_GZIP, zlib.DEFLATED, 31)
+
+    def compresser(self, bloc):
+        if self.encodage == 'br':
+            return self._brotli.process(bloc)
+        return self._zlib.compress(bloc)
+
+    def terminer(self):
+        if self.encodage == 'br':
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+def compresser(corps, encodage):
+    compresseur = Compresseur(encodage)
+    return compresseur.compresser(corps) + compresseur.terminer()
+
+
+def compresser_flux(blocs, encodage):
+    compresseur = Compresseur(encodage)
+    for bloc in blocs:
+        sortie = compresseur.compresser(bloc)
+        if sortie:
+            yield sortie
+    yield compresseur.terminer()
+
+
+def compresser_reponse(response):
+    # after_request du mode synchrone ; asgi.py applique la même négociation
+    if not compressible(response.status_code, response.mimetype, response.headers.get('Content-Encoding')):
+        return response
+    response.vary.add('Accept-Encoding')
+    encodage = choisir_encodage(request.headers.get('Accept-Encoding'))
+    if encodage is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compresser_flux(response.response, encodage)
+        response.headers.pop('Content-Length', None)
+    else:
+        corps = response.get_data()
+        if len(corps) < COMPRESSION_TAILLE_MIN:
+            return response
+        response.set_data(compresser(corps, encodage))
+
+    response.headers['Content-Encoding'] = encodage
+    # Le corps envoyé n'est plus celui du service : l'ETag devient faible
+    etag, faible = response.get_etag()
+    if etag and not faible:
+        response.set_etag(etag, weak=True)
+    return response
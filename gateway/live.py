@@ -0,0 +1,206 @@
+# gateway/live.py
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import namedtuple
+import requests
+from upstream import get_upstream
+
+# Flux live (SSE) des matches : une seule connexion vers service_match par
+# processus gateway, redistribuée aux clients selon leurs filtres. Les
+# clients inactifs ne coûtent qu'un abonné en mémoire (une tâche en mode
+# asynchrone), pas une connexion ni un thread côté service_match.
+LIVE_HEARTBEAT = float(os.getenv('LIVE_HEARTBEAT', 15))
+LIVE_MAX_ABONNES = int(os.getenv('LIVE_MAX_ABONNES', 10000))
+LIVE_RECONNEXION_MAX = float(os.getenv('LIVE_RECONNEXION_MAX', 30))
+LIVE_RETRY_MS = 3000
+CHEMIN_LIVE = '/matches/live'
+# Envoyé aux clients quand des événements ont pu être manqués (reconnexion
+# au service) : l'état courant est à relire avec GET /matches/<id>
+MESSAGE_RESYNC = 'event: resync\ndata: {}\n\n'
+HEADERS_LIVE = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+# Décrit l'abonnement en mode asynchrone (asgi.py), comme UpstreamCall
+AbonnementLive = namedtuple('AbonnementLive', ['match_ids', 'competition_ids'])
+
+
+def lire_ids(valeurs):
+    # ?match_id=1,2&match_id=3
+    return {int(i) for valeur in valeurs for i in valeur.split(',') if i.strip()}
+
+
+class Abonne:
+    def __init__(self, match_ids, competition_ids, boucle=None):
+        self.match_ids = match_ids
+        self.competition_ids = competition_ids
+        # boucle asyncio du client en mode asynchrone, None en mode synchrone
+        self._boucle = boucle
+        self._reveil = asyncio.Event() if boucle is not None else threading.Event()
+        self._lock = threading.Lock()
+        self._en_attente = {}
+
+    def accepte(self, match_id, competition_id):
+        if not self.match_ids and not self.competition_ids:
+            return True
+        return match_id in self.match_ids or competition_id in self.competition_ids
+
+    def pousser(self, cle, message):
+        # Un client lent ne garde que le dernier état de chaque match
+        with self._lock:
+            self._en_attente[cle] = message
+        if self._boucle is not None:
+            self._boucle.call_soon_threadsafe(self._reveil.set)
+        else:
+            self._reveil.set()
+
+    def prendre(self):
+        with self._lock:
+            messages, self._en_attente = list(self._en_attente.values()), {}
+            self._reveil.clear()
+        return messages
+
+    def attendre(self, timeout):
+        self._reveil.wait(timeout)
+        return self.prendre()
+
+    async def attendre_async(self, timeout, arret):
+        reveil = asyncio.ensure_future(self._reveil.wait())
+        try:
+            await asyncio.wait({reveil, arret}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            reveil.cancel()
+        return self.prendre()
+
+
+class RelaisLive:
+    def __init__(self, service, heartbeat=LIVE_HEARTBEAT, max_abonnes=LIVE_MAX_ABONNES):
+        self.service = service
+        self.heartbeat = heartbeat
+        self.max_abonnes = max_abonnes
+        # Session dédiée : la connexion longue n'occupe pas le pool des appels courts
+        self.session = requests.Session()
+        self._lock = threading.Lock()
+        self._abonnes = set()
+        self._thread = None
+        self.connecte = False
+        self.reconnexions = 0
+        self.evenements = 0
+        self.rejets = 0
+
+    def demarrer(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.boucle, daemon=True)
+                self._thread.start()
+
+    def abonner(self, match_ids=(), competition_ids=(), boucle=None):
+        with self._lock:
+            if len(self._abonnes) >= self.max_abonnes:
+                self.rejets += 1
+                return None
+            abonne = Abonne(set(match_ids), set(competition_ids), boucle)
+            self._abonnes.add(abonne)
+        self.demarrer()
+        return abonne
+
+    def desabonner(self, abonne):
+        with self._lock:
+            self._abonnes.discard(abonne)
+
+    def boucle(self):
+        attente = 1
+        tour = 0
+        deja_connecte = False
+        while True:
+            if self.service.replicas:
+                replica = self.service.replicas[tour % len(self.service.replicas)]
+                tour += 1
+                try:
+                    # Sans données pendant plusieurs heartbeats, la connexion est considérée perdue
+                    with self.session.get(
+                        f'{replica.url}{CHEMIN_LIVE}',
+                        stream=True,
+                        timeout=(self.service.timeout[0], self.heartbeat * 3),
+                        headers={'Accept': 'text/event-stream', 'Accept-Encoding': 'identity'}
+                    ) as response:
+                        response.raise_for_status()
+                        self.connecte = True
+                        attente = 1
+                        if deja_connecte:
+                            self.diffuser(None, None, MESSAGE_RESYNC)
+                        deja_connecte = True
+                        self.lire(response)
+                except Exception as e:
+                    print(f"Erreur flux live {replica.url} : {e}")
+                self.connecte = False
+                self.reconnexions += 1
+            time.sleep(attente)
+            attente = min(attente * 2, LIVE_RECONNEXION_MAX)
+
+    def lire(self, response):
+        # Découpage sur les octets : un caractère UTF-8 peut être coupé entre deux blocs
+        tampon = b''
+        for bloc in response.iter_content(chunk_size=None):
+            tampon += bloc
+            *messages, tampon = tampon.split(b'\n\n')
+            for message in messages:
+                self.traiter(message.decode('utf-8'))
+
+    def traiter(self, message):
+        champs = {}
+        for ligne in message.split('\n'):
+            if ligne and not ligne.startswith(':'):
+                nom, _, valeur = ligne.partition(':')
+                champs[nom] = valeur[1:] if valeur.startswith(' ') else valeur
+        if champs.get('event') != 'match' or 'data' not in champs:
+            return
+        # Décodé une fois pour le filtrage, relayé tel quel à chaque client
+        etat = json.loads(champs['data'])
+        self.evenements += 1
+        self.diffuser(etat['match_id'], etat['competition_id'], message + '\n\n')
+
+    def diffuser(self, match_id, competition_id, message):
+        with self._lock:
+            abonnes = list(self._abonnes)
+        for abonne in abonnes:
+            if match_id is None:
+                abonne.pousser('resync', message)
+            elif abonne.accepte(match_id, competition_id):
+                abonne.pousser(match_id, message)
+
+    def flux(self, abonne):
+        try:
+            yield f'retry: {LIVE_RETRY_MS}\n\n'
+            while True:
+                messages = abonne.attendre(self.heartbeat)
+                yield ''.join(messages) if messages else ': ping\n\n'
+        finally:
+            self.desabonner(abonne)
+
+    async def flux_async(self, abonne, arret):
+        # arret : tâche terminée à la déconnexion du client
+        try:
+            yield f'retry: {LIVE_RETRY_MS}\n\n'.encode('utf-8')
+            while not arret.done():
+                messages = await abonne.attendre_async(self.heartbeat, arret)
+                if not arret.done():
+                    yield (''.join(messages) if messages else ': ping\n\n').encode('utf-8')
+        finally:
+            self.desabonner(abonne)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'connecte': self.connecte,
+                'abonnes': len(self._abonnes),
+                'max_abonnes': self.max_abonnes,
+                'rejets': self.rejets,
+                'evenements': self.evenements,
+                'reconnexions': self.reconnexions
+            }
+
+
+
+relais_live = RelaisLive(get_upstream('match'))
@@ -0,0 +1,173 @@
+# gateway/metrics.py
+import os
+import threading
+from bisect import bisect_left
+
+# Bornes des histogrammes de latence (secondes)
+BUCKETS_LATENCE = tuple(
+    float(b) for b in os.getenv(
+        'METRICS_BUCKETS', '0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10'
+    ).split(',')
+)
+
+
+def echapper(valeur):
+    return str(valeur).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def formater_labels(noms, valeurs, extra=''):
+    labels = [f'{nom}="{echapper(valeur)}"' for nom, valeur in zip(noms, valeurs)]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+class Metrique:
+    type = None
+
+    def __init__(self, nom, aide, labels=()):
+        self.nom = nom
+        self.aide = aide
+        self.labels = labels
+        self._valeurs = {}
+        self._lock = threading.Lock()
+
+    def entete(self):
+        return [f'# HELP {self.nom} {self.aide}', f'# TYPE {self.nom} {self.type}']
+
+
+class Compteur(Metrique):
+    type = 'counter'
+
+    def inc(self, *labels, valeur=1):
+        with self._lock:
+            self._valeurs[labels] = self._valeurs.get(labels, 0) + valeur
+
+    def exposer(self):
+        with self._lock:
+            valeurs = list(self._valeurs.items())
+        return self.entete() + [
+            f'{self.nom}{formater_labels(self.labels, labels)} {valeur}' for labels, valeur in valeurs
+        ]
+
+
+class Jauge(Compteur):
+    type = 'gauge'
+
+    def dec(self, *labels):
+        self.inc(*labels, valeur=-1)
+
+
+class Resume(Metrique):
+    # Somme et nombre d'observations (tailles des corps), sans quantiles
+    type = 'summary'
+
+    def observer(self, *labels, valeur):
+        with self._lock:
+            somme, nombre = self._valeurs.get(labels, (0, 0))
+            self._valeurs[labels] = (somme + valeur, nombre + 1)
+
+    def exposer(self):
+        with self._lock:
+            valeurs = list(self._valeurs.items())
+        lignes = self.entete()
+        for labels, (somme, nombre) in valeurs:
+            lignes.append(f'{self.nom}_sum{formater_labels(self.labels, labels)} {somme}')
+            lignes.append(f'{self.nom}_count{formater_labels(self.labels, labels)} {nombre}')
+        return lignes
+
+
+class Histogramme(Metrique):
+    type = 'histogram'
+
+    def __init__(self, nom, aide, labels=(), buckets=BUCKETS_LATENCE):
+        super().__init__(nom, aide, labels)
+        self.buckets = buckets
+
+    def observer(self, *labels, valeur):
+        # Un seul compteur incrémenté par observation ; le cumul est fait à l'exposition
+        index = bisect_left(self.buckets, valeur)
+        with self._lock:
+            serie = self._valeurs.get(labels)
+            if serie is None:
+                serie = self._valeurs[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][index] += 1
+            serie[1] += valeur
+
+    def exposer(self):
+        with self._lock:
+            valeurs = [(labels, list(compteurs), somme) for labels, (compteurs, somme) in self._valeurs.items()]
+        lignes = self.entete()
+        for labels, compteurs, somme in valeurs:
+            cumul = 0
+            for borne, compteur in zip(self.buckets + (float('inf'),), compteurs):
+                cumul += compteur
+                le = '+Inf' if borne == float('inf') else repr(borne)
+                extra = f'le="{le}"'
+                lignes.append(f'{self.nom}_bucket{formater_labels(self.labels, labels, extra)} {cumul}')
+            lignes.append(f'{self.nom}_sum{formater_labels(self.labels, labels)} {somme}')
+            lignes.append(f'{self.nom}_count{formater_labels(self.labels, labels)} {cumul}')
+        return lignes
+
+
+class Registre:
+    def __init__(self):
+        self.metriques = []
+        self.collecteurs = []
+
+    def ajouter(self, metrique):
+        self.metriques.append(metrique)
+        return metrique
+
+    def collecteur(self, fn):
+        # Valeurs lues au moment du scrape (aucun coût sur le chemin des requêtes)
+        self.collecteurs.append(fn)
+        return fn
+
+    def exposer(self):
+        lignes = []
+        for metrique in self.metriques:
+            lignes.extend(metrique.exposer())
+        for collecteur in self.collecteurs:
+            lignes.extend(collecteur())
+        return '\n'.join(lignes) + '\n'
+
+
+registre = Registre()
+
+requetes_total = registre.ajouter(Compteur(
+    'gateway_requetes_total', 'Requêtes relayées par route, méthode et code de statut',
+    ('route', 'methode', 'status')))
+requete_duree = registre.ajouter(Histogramme(
+    'gateway_requete_duree_secondes', "Durée des requêtes relayées jusqu'aux en-têtes de réponse",
+    ('route', 'methode')))
+requetes_en_cours = registre.ajouter(Jauge(
+    'gateway_requetes_en_cours', 'Requêtes relayées en cours par route', ('route',)))
+requete_taille = registre.ajouter(Resume(
+    'gateway_requete_taille_octets', 'Taille des corps de requête', ('route',)))
+reponse_taille = registre.ajouter(Resume(
+    'gateway_reponse_taille_octets', 'Taille des corps de réponse (si connue)', ('route',)))
+upstream_duree = registre.ajouter(Histogramme(
+    'gateway_upstream_duree_secondes', 'Durée des appels aux services par réplica', ('service', 'replica')))
+upstream_reponses = registre.ajouter(Compteur(
+    'gateway_upstream_reponses_total', "Réponses des services par code de statut ('erreur' si aucune)",
+    ('service', 'status')))
+
+
+def debut_requete(route):
+    requetes_en_cours.inc(route)
+
+
+def fin_requete(route, methode, status, duree, taille_requete, taille_reponse):
+    requetes_en_cours.dec(route)
+    requetes_total.inc(route, methode, str(status))
+    requete_duree.observer(route, methode, valeur=duree)
+    if taille_requete:
+        requete_taille.observer(route, valeur=taille_requete)
+    if taille_reponse is not None:
+        reponse_taille.observer(route, valeur=taille_reponse)
+
+
+def observer_upstream(service, replica, status, duree):
+    upstream_duree.observer(service, replica, valeur=duree)
+    upstream_reponses.inc(service, str(status) if status else 'erreur')
@@ -0,0 +1,105 @@
+# gateway/singleflight.py
+import asyncio
+import threading
+
+
+class AppelAbandonne(Exception):
+    # Le leader a été annulé (arrêt, timeout englobant) sans résultat
+    pass
+
+
+class _Appel:
+    def __init__(self):
+        self.event = threading.Event()
+        self.resultat = None
+        self.erreur = None
+        self.fusionnees = 0
+
+
+class SingleFlight:
+    # Les requêtes identiques concurrentes partagent un seul appel upstream
+    # et sa réponse
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._appels = {}
+        self._futures = {}
+        self.appels = 0
+        self.fusionnees = 0
+        self.max_fusionnees = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            appel = self._appels.get(key)
+            leader = appel is None
+            if leader:
+                appel = self._appels[key] = _Appel()
+                self.appels += 1
+            else:
+                appel.fusionnees += 1
+                self.fusionnees += 1
+                self.max_fusionnees = max(self.max_fusionnees, appel.fusionnees)
+
+        if not leader:
+            appel.event.wait()
+            if appel.erreur is not None:
+                raise appel.erreur
+            return appel.resultat
+
+        try:
+            appel.resultat = fn()
+            return appel.resultat
+        except Exception as e:
+            appel.erreur = e
+            raise
+        finally:
+            with self._lock:
+                del self._appels[key]
+            appel.event.set()
+
+    async def do_async(self, key, fn):
+        # Variante asyncio (asgi.py) : exécutée dans la boucle d'événements,
+        # les futures n'ont pas besoin de verrou
+        future = self._futures.get(key)
+        if future is not None:
+            with self._lock:
+                self.fusionnees += 1
+            try:
+                return await asyncio.shield(future)
+            except AppelAbandonne:
+                # Leader annulé : la requête refait son appel (éventuellement partagé)
+                return await self.do_async(key, fn)
+
+        future = self._futures[key] = asyncio.get_running_loop().create_future()
+        with self._lock:
+            self.appels += 1
+        try:
+            resultat = await fn()
+            future.set_result(resultat)
+            return resultat
+        except Exception as e:
+            future.set_exception(e)
+            # Évite l'avertissement "exception never retrieved" sans attente
+            future.exception()
+            raise
+        finally:
+            # CancelledError (BaseException) : les requêtes fusionnées ne
+            # doivent pas attendre indéfiniment une future jamais résolue
+            if not future.done():
+                future.set_exception(AppelAbandonne(key))
+                future.exception()
+            if self._futures.get(key) is future:
+                del self._futures[key]
+
+    def stats(self):
+        with self._lock:
+            total = self.appels + self.fusionnees
+            return {
+                'appels_upstream': self.appels,
+                'requetes_fusionnees': self.fusionnees,
+                'taux_fusion': round(self.fusionnees / total, 3) if total else 0.0,
+                'max_fusionnees_par_appel': self.max_fusionnees,
+                'en_vol': len(self._appels) + len(self._futures)
+            }
+
+
+single_flight = SingleFlight()
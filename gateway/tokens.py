@@ -0,0 +1,56 @@
+# gateway/tokens.py
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv('TOKEN_CACHE_MAX_ENTRIES', 10000))
+
+
+class TokenCache:
+    # Tokens déjà vérifiés, indexés par empreinte SHA-256 et valables jusqu'à leur 'exp'
+    def __init__(self, max_entries=TOKEN_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token):
+        key = hashlib.sha256(token.encode('utf-8')).digest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, token, claims):
+        # Sans 'exp', le token n'est pas mis en cache
+        if not claims.get('exp'):
+            return
+        key = hashlib.sha256(token.encode('utf-8')).digest()
+        with self._lock:
+            self._entries[key] = (claims['exp'], claims)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entrees': len(self._entries),
+                'max_entrees': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 3) if total else 0.0
+            }
+
+
+token_cache = TokenCache()
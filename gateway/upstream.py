@@ -0,0 +1,330 @@
+# gateway/upstream.py
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from circuit import CircuitBreaker
+from metrics import observer_upstream
+
+POOL_SIZE = int(os.getenv('UPSTREAM_POOL_SIZE', 20))
+CONNECT_TIMEOUT = float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', 2))
+READ_TIMEOUT = float(os.getenv('UPSTREAM_READ_TIMEOUT', 10))
+LB_STRATEGY = os.getenv('UPSTREAM_LB', 'least_outstanding')
+EJECTION_ECHECS = int(os.getenv('UPSTREAM_EJECTION_ECHECS', 5))
+EJECTION_DUREE = float(os.getenv('UPSTREAM_EJECTION_DUREE', 30))
+EJECTION_DUREE_MAX = float(os.getenv('UPSTREAM_EJECTION_DUREE_MAX', 300))
+LATENCY_WINDOW = 1000
+STATUTS_ECHEC = {502, 503, 504}
+
+# Requêtes de secours (hedging) pour les GET : si la réponse tarde au-delà du
+# p95 récent, une seconde tentative part vers un autre réplica, dans la limite
+# d'un budget de HEDGE_BUDGET requête supplémentaire par requête
+HEDGE = os.getenv('UPSTREAM_HEDGE', '1') == '1'
+HEDGE_PERCENTILE = float(os.getenv('UPSTREAM_HEDGE_PERCENTILE', 0.95))
+HEDGE_DELAI_MIN = float(os.getenv('UPSTREAM_HEDGE_DELAI_MIN', 0.05))
+HEDGE_BUDGET = float(os.getenv('UPSTREAM_HEDGE_BUDGET', 0.1))
+HEDGE_JETONS_MAX = 10
+HEDGE_WORKERS = int(os.getenv('UPSTREAM_HEDGE_WORKERS', 64))
+HEDGE_ECHANTILLONS = 50
+
+_hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix='hedge')
+_hedge_places = threading.BoundedSemaphore(HEDGE_WORKERS)
+
+
+def fermer(future):
+    # Réponse d'une tentative perdante : sa connexion retourne au pool
+    if future.exception() is None:
+        future.result().close()
+
+
+class Replica:
+    def __init__(self, url):
+        self.url = url.strip().rstrip('/')
+        parsed = urlparse(self.url)
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        self.en_cours = 0
+        self.requetes = 0
+        self.erreurs = 0
+        self.echecs_consecutifs = 0
+        self.ejections = 0
+        self.ejections_consecutives = 0
+        self.ejecte_jusqua = 0.0
+        self.latences = deque(maxlen=LATENCY_WINDOW)
+
+    def disponible(self, maintenant):
+        return self.ejecte_jusqua <= maintenant
+
+    def stats(self, maintenant):
+        latences = sorted(self.latences)
+        return {
+            'url': self.url,
+            'disponible': self.disponible(maintenant),
+            'ejecte_pour': round(max(self.ejecte_jusqua - maintenant, 0), 1),
+            'en_cours': self.en_cours,
+            'requetes': self.requetes,
+            'erreurs': self.erreurs,
+            'ejections': self.ejections,
+            'latence_p50_ms': round(latences[len(latences) // 2] * 1000, 1) if latences else None,
+            'latence_p99_ms': round(latences[int(len(latences) * 0.99)] * 1000, 1) if latences else None
+        }
+
+
+class Upstream:
+    def __init__(self, name, url, pool_size=POOL_SIZE,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 strategy=LB_STRATEGY):
+        self.name = name
+        # <NOM>_SERVICE_URL accepte une liste de réplicas séparés par des virgules
+        self.replicas = [Replica(u) for u in (url or '').split(',') if u.strip()]
+        self.url = ','.join(r.url for r in self.replicas) or None
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.strategy = strategy
+
+        # Une session par service : les connexions TCP sont gardées ouvertes
+        # (keep-alive) et réutilisées entre les requêtes, un pool par réplica
+        self.adapter = HTTPAdapter(
+            pool_connections=max(len(self.replicas), 1),
+            pool_maxsize=pool_size,
+            max_retries=0
+        )
+        self.session = requests.Session()
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+
+        self._lock = threading.Lock()
+        self._tour = 0
+        self.erreurs = 0
+        self.timeouts = 0
+
+        self.circuit = CircuitBreaker(name)
+        self._latences = deque(maxlen=LATENCY_WINDOW)
+        self._depuis_calcul = 0
+        self._delai_hedge = None
+        self._jetons_hedge = 0.0
+        self.hedges = 0
+        self.hedges_gagnants = 0
+
+    def choisir(self, exclure=None):
+        if not self.replicas:
+            raise requests.exceptions.InvalidURL(f"Aucune URL configurée pour le service {self.name}")
+
+        maintenant = time.monotonic()
+        with self._lock:
+            self._tour += 1
+            rotation = self.replicas[self._tour % len(self.replicas):] + self.replicas[:self._tour % len(self.replicas)]
+            candidats = [r for r in rotation if r.disponible(maintenant)]
+            if not candidats:
+                # Tous éjectés : on tente celui dont l'éjection se termine en premier
+                candidats = [min(rotation, key=lambda r: r.ejecte_jusqua)]
+            if exclure is not None and len(candidats) > 1:
+                candidats = [r for r in candidats if r is not exclure]
+
+            if self.strategy == 'round_robin':
+                replica = candidats[0]
+            else:
+                replica = min(candidats, key=lambda r: r.en_cours)
+            replica.en_cours += 1
+            return replica
+
+    def terminer(self, replica, duree, succes, sonde=False, status=None):
+        observer_upstream(self.name, replica.url, status, duree)
+        self.circuit.enregistrer(succes, duree, sonde)
+        with self._lock:
+            replica.en_cours -= 1
+            replica.requetes += 1
+            replica.latences.append(duree)
+            if succes:
+                self._latences.append(duree)
+                self._depuis_calcul += 1
+                if self._depuis_calcul >= HEDGE_ECHANTILLONS:
+                    # Délai de hedging recalculé périodiquement plutôt qu'à chaque requête
+                    self._depuis_calcul = 0
+                    latences = sorted(self._latences)
+                    self._delai_hedge = max(latences[int(len(latences) * HEDGE_PERCENTILE)], HEDGE_DELAI_MIN)
+                replica.echecs_consecutifs = 0
+                replica.ejections_consecutives = 0
+                return
+
+            replica.erreurs += 1
+            replica.echecs_consecutifs += 1
+            if replica.echecs_consecutifs >= EJECTION_ECHECS and replica.disponible(time.monotonic()):
+                # Éjection passive, de plus en plus longue si le réplica échoue à son retour
+                replica.ejections += 1
+                replica.ejections_consecutives += 1
+                duree_ejection = min(EJECTION_DUREE * replica.ejections_consecutives, EJECTION_DUREE_MAX)
+                replica.ejecte_jusqua = time.monotonic() + duree_ejection
+                replica.echecs_consecutifs = 0
+
+    def delai_hedge(self):
+        # None tant que la fenêtre de latences n'est pas assez remplie
+        with self._lock:
+            self._jetons_hedge = min(self._jetons_hedge + HEDGE_BUDGET, HEDGE_JETONS_MAX)
+            return self._delai_hedge
+
+    def autoriser_hedge(self):
+        with self._lock:
+            if self._jetons_hedge < 1:
+                return False
+            self._jetons_hedge -= 1
+            self.hedges += 1
+            return True
+
+    def rembourser_hedge(self):
+        # Hedge autorisé mais pas envoyé
+        with self._lock:
+            self._jetons_hedge = min(self._jetons_hedge + 1, HEDGE_JETONS_MAX)
+            self.hedges -= 1
+
+    def hedge_gagnant(self):
+        with self._lock:
+            self.hedges_gagnants += 1
+
+    def _envoyer(self, replica, method, path, timeout, sonde=False, **kwargs):
+        debut = time.perf_counter()
+        succes = False
+        status = None
+        try:
+            response = self.session.request(
+                method=method,
+                url=f"{replica.url}{path}",
+                timeout=timeout or self.timeout,
+                **kwargs
+            )
+            status = response.status_code
+            succes = status not in STATUTS_ECHEC
+            return response
+        except requests.exceptions.Timeout:
+            with self._lock:
+                self.timeouts += 1
+            raise
+        except requests.exceptions.RequestException:
+            with self._lock:
+                self.erreurs += 1
+            raise
+        finally:
+            self.terminer(replica, time.perf_counter() - debut, succes, sonde, status)
+
+    def _soumettre(self, replica, method, path, timeout, **kwargs):
+        def tache():
+            try:
+                return self._envoyer(replica, method, path, timeout, **kwargs)
+            finally:
+                _hedge_places.release()
+        return _hedge_executor.submit(tache)
+
+    def request(self, method, path, timeout=None, hedge=False, **kwargs):
+        # Lève CircuitOuvert (RequestException) sans appeler le service quand le circuit est ouvert
+        sonde = self.circuit.autoriser()
+        delai = self.delai_hedge() if hedge and HEDGE and not sonde else None
+        if delai is None or not _hedge_places.acquire(blocking=False):
+            return self._envoyer(self.choisir(), method, path, timeout, sonde, **kwargs)
+
+        replica = self.choisir()
+        try:
+            premier = self._soumettre(replica, method, path, timeout, **kwargs)
+        except BaseException:
+            _hedge_places.release()
+            self.terminer(replica, 0, False)
+            raise
+        termines, _ = wait([premier], timeout=delai)
+        # Place dans le pool de hedging d'abord : un jeton du budget n'est
+        # consommé que pour un hedge réellement envoyé
+        if termines or not _hedge_places.acquire(blocking=False):
+            return premier.result()
+        if not self.autoriser_hedge():
+            _hedge_places.release()
+            return premier.result()
+
+        replica_hedge = self.choisir(exclure=replica)
+        try:
+            second = self._soumettre(replica_hedge, method, path, timeout, **kwargs)
+        except BaseException:
+            _hedge_places.release()
+            self.rembourser_hedge()
+            self.terminer(replica_hedge, 0, False)
+            return premier.result()
+        en_attente = {premier, second}
+        dernier = None
+        while en_attente:
+            termines, en_attente = wait(en_attente, return_when=FIRST_COMPLETED)
+            for future in termines:
+                dernier = future
+                if future.exception() is None and future.result().status_code not in STATUTS_ECHEC:
+                    # La tentative perdante se termine en arrière-plan
+                    for perdante in en_attente:
+                        perdante.add_done_callback(fermer)
+                    if future is second:
+                        self.hedge_gagnant()
+                    return future.result()
+        return dernier.result()
+
+    def stats(self):
+        pools = self.adapter.poolmanager.pools
+        par_replica = {}
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool:
+                connexions, requetes = par_replica.get((pool.host, pool.port), (0, 0))
+                par_replica[(pool.host, pool.port)] = (
+                    connexions + pool.num_connections,
+                    requetes + pool.num_requests
+                )
+        connexions = sum(c for c, _ in par_replica.values())
+        requetes = sum(r for _, r in par_replica.values())
+
+        maintenant = time.monotonic()
+        replicas = []
+        for replica in self.replicas:
+            stats = replica.stats(maintenant)
+            pool_connexions, pool_requetes = par_replica.get((replica.host, replica.port), (0, 0))
+            stats['connexions_reutilisees'] = max(pool_requetes - pool_connexions, 0)
+            replicas.append(stats)
+
+        return {
+            'url': self.url,
+            'strategie': self.strategy,
+            'pool_size': self.pool_size,
+            'connect_timeout': self.timeout[0],
+            'read_timeout': self.timeout[1],
+            'requetes': requetes,
+            'connexions_ouvertes': connexions,
+            'connexions_reutilisees': max(requetes - connexions, 0),
+            'taux_reutilisation': round((requetes - connexions) / requetes, 3) if requetes else 0.0,
+            'erreurs': self.erreurs,
+            'timeouts': self.timeouts,
+            'hedge_delai_ms': round(self._delai_hedge * 1000, 1) if self._delai_hedge else None,
+            'hedges': self.hedges,
+            'hedges_gagnants': self.hedges_gagnants,
+            'replicas': replicas
+        }
+
+
+_upstreams = {}
+_upstreams_lock = threading.Lock()
+
+
+def get_upstream(name):
+    # Configuration par service : <NOM>_SERVICE_URL, <NOM>_POOL_SIZE,
+    # <NOM>_CONNECT_TIMEOUT, <NOM>_READ_TIMEOUT, <NOM>_LB
+    with _upstreams_lock:
+        if name not in _upstreams:
+            prefix = name.upper()
+            _upstreams[name] = Upstream(
+                name,
+                os.getenv(f'{prefix}_SERVICE_URL'),
+                pool_size=int(os.getenv(f'{prefix}_POOL_SIZE', POOL_SIZE)),
+                connect_timeout=float(os.getenv(f'{prefix}_CONNECT_TIMEOUT', CONNECT_TIMEOUT)),
+                read_timeout=float(os.getenv(f'{prefix}_READ_TIMEOUT', READ_TIMEOUT)),
+                strategy=os.getenv(f'{prefix}_LB', LB_STRATEGY)
+            )
+        return _upstreams[name]
+
+
+def get_upstreams():
+    return dict(_upstreams)
@@ -1,10 +1,18 @@
-from flask import request, jsonify
+from flask import request, jsonify, g, Response
 import requests
 import jwt
 import os
+import time
 from functools import wraps
+from collections import namedtuple
+from tokens import token_cache
+from singleflight import single_flight
+import metrics
 
 JWT_SECRET = os.getenv('JWT_SECRET')
+# Secret partagé avec les services : authentifie les en-têtes X-User-* posés par le gateway
+INTERNAL_SECRET = os.getenv('INTERNAL_SECRET')
+INTERNAL_HEADERS = {'x-gateway-secret', 'x-user-id', 'x-user-role'}
 
 
 def require_auth(f):
@@ -15,29 +23,176 @@ def require_auth(f):
             return jsonify({'message': 'Token manquant'}), 401
         try:
             token = token.split('Bearer ')[1]
-            jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
-        except jwt.InvalidTokenError:
+            claims = token_cache.get(token)
+            if claims is None:
+                claims = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+                token_cache.set(token, claims)
+        except (jwt.InvalidTokenError, IndexError):
             return jsonify({'message': 'Token invalide'}), 401
+        g.claims = claims
         return f(*args, **kwargs)
 
     return decorated
 
 
-def forward_request(service_url, path, method='GET'):
-    url = f"{service_url}{path}"
-    headers = {key: value for key, value in request.headers if key != 'Host'}
-    body = request.get_json() if method in ['POST', 'PUT', 'PATCH'] else None
+HOP_BY_HOP_HEADERS = {'host', 'connection', 'keep-alive', 'content-length', 'transfer-encoding'}
 
+# Au-delà de cette taille (ou si elle est inconnue), la réponse du service est
+# relayée par blocs au lieu d'être chargée en mémoire ; elle n'est alors ni
+# partagée entre requêtes fusionnées ni mise en cache
+STREAMING_SEUIL = int(os.getenv('STREAMING_SEUIL', 256 * 1024))
+STREAMING_BLOC = 64 * 1024
+BODY_METHODS = ('POST', 'PUT', 'PATCH')
+
+# cache : (cache, clé, tags, génération) si la réponse doit être mise en cache une fois
+# l'appel effectué (forward_cached en mode asynchrone)
+UpstreamCall = namedtuple('UpstreamCall', ['service', 'path', 'method', 'timeout', 'headers', 'cle', 'route', 'cache'],
+                          defaults=(None,))
+
+
+def internal_headers():
+    claims = g.get('claims')
+    if not INTERNAL_SECRET or not claims:
+        return {}
+    return {
+        'X-Gateway-Secret': INTERNAL_SECRET,
+        'X-User-Id': str(claims.get('user_id')),
+        'X-User-Role': str(claims.get('role'))
+    }
+
+
+def coalescing_key(service, path, method):
+    # Seuls les GET sont fusionnés. Sur une route authentifiée, la réponse
+    # dépend de l'utilisateur : le token fait partie de la clé. Un GET
+    # conditionnel (If-None-Match) ne partage pas la réponse d'un GET simple
+    if method != 'GET':
+        return None
+    query = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+    auth = request.headers.get('Authorization') if g.get('claims') else None
+    return (service.name, path, query, auth, request.headers.get('If-None-Match'))
+
+
+class CorpsRequete:
+    # Corps de la requête entrante relu par blocs vers le service, sans
+    # décodage JSON ; la longueur connue évite un envoi en chunked
+    def __init__(self, flux, taille):
+        self.flux = flux
+        self.taille = taille
+
+    def __len__(self):
+        return self.taille
+
+    def __iter__(self):
+        return iter(lambda: self.flux.read(STREAMING_BLOC), b'')
+
+    def read(self, taille=-1):
+        return self.flux.read(taille)
+
+
+def volumineux(response):
+    taille = response.headers.get('Content-Length')
+    return taille is None or int(taille) > STREAMING_SEUIL
+
+
+def lire(response):
+    return response.content, response.status_code, [
+        (key, value) for key, value in response.headers.items() if key.lower() not in HOP_BY_HOP_HEADERS
+    ]
+
+
+def transmettre(response):
+    def blocs():
+        try:
+            yield from response.raw.stream(STREAMING_BLOC, decode_content=False)
+        finally:
+            # Connexion rendue au pool une fois le corps relayé
+            response.close()
+
+    headers = [
+        (key, value) for key, value in response.headers.items() if key.lower() not in HOP_BY_HOP_HEADERS
+    ]
+    if 'Content-Length' in response.headers:
+        headers.append(('Content-Length', response.headers['Content-Length']))
+    return Response(blocs(), status=response.status_code, headers=headers)
+
+
+def route_courante():
+    # Modèle de la route (/matches/<int:match_id>) : cardinalité bornée des labels
+    return request.url_rule.rule if request.url_rule is not None else request.path
+
+
+def statut_et_taille(reponse):
+    if isinstance(reponse, Response):
+        return reponse.status_code, reponse.content_length
+    content, status = reponse[0], reponse[1]
+    if isinstance(content, Response):
+        return status, content.content_length
+    return status, len(content)
+
+
+def forward_request(service, path, method='GET', timeout=None):
+    # En mode asynchrone (asgi.py), la vue décrit l'appel sans l'exécuter
+    if g.get('upstream_differe'):
+        return UpstreamCall(service, path, method, timeout, internal_headers(),
+                            coalescing_key(service, path, method), route_courante())
+
+    route = route_courante()
+    metrics.debut_requete(route)
+    debut = time.perf_counter()
+    status, taille = 500, None
     try:
-        response = requests.request(
-            method=method,
-            url=url,
+        reponse = executer_requete(service, path, method, timeout)
+        status, taille = statut_et_taille(reponse)
+        return reponse
+    finally:
+        metrics.fin_requete(route, method, status, time.perf_counter() - debut, request.content_length, taille)
+
+
+def executer_requete(service, path, method, timeout):
+    headers = {
+        key: value for key, value in request.headers
+        if key.lower() not in HOP_BY_HOP_HEADERS and key.lower() not in INTERNAL_HEADERS
+    }
+    headers.update(internal_headers())
+    # La compression est négociée par le gateway avec le client (compression.py)
+    headers['Accept-Encoding'] = 'identity'
+    body = None
+    if method in BODY_METHODS and request.content_length:
+        body = CorpsRequete(request.stream, request.content_length)
+        headers['Content-Length'] = str(request.content_length)
+
+    params = request.args
+
+    def appel(partage=None):
+        response = service.request(
+            method,
+            path,
+            timeout=timeout,
+            hedge=method == 'GET',
             headers=headers,
-            params=request.args,
-            json=body
+            params=params,
+            data=body,
+            stream=True
         )
-        return response.content, response.status_code, response.headers.items()
+        if not volumineux(response):
+            return lire(response)
+        if partage is None:
+            return transmettre(response)
+        # Trop volumineux pour être partagé : le leader relaie son propre flux,
+        # les requêtes fusionnées refont leur appel
+        partage['response'] = response
+        return None
+
+    try:
+        cle = coalescing_key(service, path, method)
+        if cle is None:
+            return appel()
+        partage = {}
+        resultat = single_flight.do(cle, lambda: appel(partage))
+        if resultat is not None:
+            return resultat
+        if 'response' in partage:
+            return transmettre(partage['response'])
+        return appel()
     except requests.exceptions.RequestException as e:
         return jsonify({'message': f'Erreur de service: {str(e)}'}), 503, {}
-
-
@@ -33,13 +33,27 @@ def init_rabbitmq():
        connection_user_updates = None
        channel_user_updates = None
 
+# Attente avant de relivrer un message dont le traitement a échoué (base indisponible...)
+USER_UPDATES_ATTENTE_ERREUR = float(os.getenv('USER_UPDATES_ATTENTE_ERREUR', 5))
+
 def traiter_user_updates(ch, method, properties, body):
    with app.app_context():
        try:
            data = json.loads(body)
+       except ValueError as e:
+           print(f"Message RabbitMQ invalide : {str(e)}")
+           ch.basic_ack(delivery_tag=method.delivery_tag)
+           return
+       try:
            auth_repository.traiter_user_updates(data)
        except Exception as e:
+           db.session.rollback()
            print(f"Erreur lors du traitement du message RabbitMQ : {str(e)}")
+           # Acquitté seulement une fois appliqué : relivré après une pause
+           time.sleep(USER_UPDATES_ATTENTE_ERREUR)
+           ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+           return
+       ch.basic_ack(delivery_tag=method.delivery_tag)
 
 def consume_messages():
    if not channel_user_updates or not connection_user_updates:
@@ -50,7 +64,7 @@ def consume_messages():
        channel_user_updates.basic_consume(
            queue='user_updates',
            on_message_callback=traiter_user_updates,
-           auto_ack=True
+           auto_ack=False
        )
        print("Démarrage de la consommation des messages RabbitMQ...")
        while True:
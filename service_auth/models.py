@@ -29,4 +29,13 @@ class Bookmaker(db.Model):
    utilisateur_id = db.Column(db.Integer, db.ForeignKey('utilisateurs.id'), unique=True)
    numero_employe = db.Column(db.String(50), unique=True, nullable=False)
    statut = db.Column(db.String(20), default='actif')
-   utilisateur = db.relationship('Utilisateur', backref='bookmaker', uselist=False)
\ No newline at end of file
+   utilisateur = db.relationship('Utilisateur', backref='bookmaker', uselist=False)
+
+class GainCredite(db.Model):
+   # Gains d'un match déjà crédités sur la cagnotte : un message gains relivré
+   # n'est pas crédité deux fois
+   __tablename__ = 'gains_credites'
+   match_id = db.Column(db.Integer, primary_key=True)
+   utilisateur_id = db.Column(db.Integer, primary_key=True)
+   montant = db.Column(db.Float, nullable=False)
+   date_credit = db.Column(db.DateTime, default=datetime.utcnow)
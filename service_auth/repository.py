@@ -1,4 +1,6 @@
-from models import db, Utilisateur, Parieur, Bookmaker
+from models import db, Utilisateur, Parieur, Bookmaker, GainCredite
+from sqlalchemy import update, bindparam
+from sqlalchemy.dialects import postgresql, sqlite
 import bcrypt
 import json
 from datetime import datetime
@@ -63,8 +65,39 @@ class AuthRepository:
                 print(f"Cagnotte mise à jour : {parieur.cagnotte} pour utilisateur {data['utilisateur_id']}")
                 return True
             print(f"Parieur introuvable pour utilisateur_id {data['utilisateur_id']}")
+        elif data['type'] == 'gains':
+            return self.crediter_gains(data['match_id'], data['gains'])
         return False
 
+    def crediter_gains(self, match_id: int, gains: list) -> bool:
+        # Gains d'un match déjà cumulés par parieur : une mise à jour par parieur, en un executemany.
+        # Seuls les gains pas encore inscrits dans gains_credites sont crédités (même transaction).
+        # Une erreur est propagée : le message n'est pas acquitté et sera relivré
+        if not gains:
+            return False
+        dialecte = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+        table = Parieur.__table__
+        try:
+            nouveaux = db.session.execute(
+                dialecte.insert(GainCredite).on_conflict_do_nothing().returning(
+                    GainCredite.utilisateur_id, GainCredite.montant
+                ),
+                [{'match_id': match_id, 'utilisateur_id': gain['utilisateur_id'], 'montant': gain['montant']}
+                 for gain in gains]
+            ).all()
+            if nouveaux:
+                db.session.execute(
+                    update(table)
+                    .where(table.c.utilisateur_id == bindparam('b_utilisateur_id'))
+                    .values(cagnotte=table.c.cagnotte + bindparam('b_montant')),
+                    [{'b_utilisateur_id': utilisateur_id, 'b_montant': montant} for utilisateur_id, montant in nouveaux]
+                )
+            db.session.commit()
+            return bool(nouveaux)
+        except Exception:
+            db.session.rollback()
+            raise
+
     def update_cagnotte(self, id: int, montant: float) -> tuple[Parieur, str]:
         parieur = self.get_parieur_by_utilisateur_id(id)
         if not parieur:
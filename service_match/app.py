@@ -1,6 +1,10 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from models import db, Match, Cote, Competition, Equipe
 from repository import MatchRepository
+from live import Diffuseur, lire_ids
+from moteur_cotes import MoteurCotes, MOTEUR_COTES_ACTIF
+from publieur_evenements import PublieurEvenements
+from index_catalogue import RECHERCHE_LIMITE_DEFAUT, RECHERCHE_LIMITE_MAX
 import jwt
 from datetime import datetime, timedelta
 import os
@@ -8,7 +12,14 @@ from dotenv import load_dotenv
 import threading
 import json
 import time
-from utils.rabbitmq import get_rabbitmq_channel
+import hashlib
+import base64
+import binascii
+import csv
+import io
+from urllib.parse import urlencode
+from utils.rabbitmq import get_rabbitmq_channel, get_rabbitmq_exchange
+from utils.auth import get_claims
 from functools import wraps
 from sqlalchemy import or_
 
@@ -18,14 +29,35 @@ app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI_MATCH')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 JWT_SECRET = os.getenv('JWT_SECRET')
+# Taille des pages de GET /matches (paramètre limit)
+MATCHES_PAGE_DEFAUT = int(os.getenv('MATCHES_PAGE_DEFAUT', 50))
+MATCHES_PAGE_MAX = int(os.getenv('MATCHES_PAGE_MAX', 200))
+# Intervalle par défaut (secondes) de l'historique des cotes sous-échantillonné
+HISTORIQUE_PAS_DEFAUT = int(os.getenv('HISTORIQUE_PAS_DEFAUT', 60))
+# Nombre maximum de points renvoyés par l'historique des cotes
+HISTORIQUE_POINTS_MAX = int(os.getenv('HISTORIQUE_POINTS_MAX', 1000))
+# Nombre maximum de matches par import
+IMPORT_MAX_LIGNES = int(os.getenv('IMPORT_MAX_LIGNES', 5000))
+# Nombre maximum de matches par mise à jour groupée des cotes
+COTES_LOT_MAX = int(os.getenv('COTES_LOT_MAX', 1000))
+# Nombre maximum d'identifiants par GET /matches?ids=
+MATCHES_IDS_MAX = int(os.getenv('MATCHES_IDS_MAX', 100))
 
 db.init_app(app)
 match_repository = MatchRepository()
 
+def charger_etats_live(match_ids):
+   with app.app_context():
+       return match_repository.get_etats_matches(match_ids)
+
+diffuseur = Diffuseur(charger_etats_live)
+
 channel_match_updates = None
 connection_match_updates = None
 channel_match_resultats = None
 connection_match_resultats = None
+# Sans RabbitMQ (ou après un échec de publication), le flux live de ce processus reste alimenté
+publieur_evenements = PublieurEvenements('match_events', secours=diffuseur.traiter_evenement)
 
 def init_rabbitmq():
    global channel_match_updates, connection_match_updates
@@ -37,31 +69,112 @@ def init_rabbitmq():
        print(f"Échec de la connexion à RabbitMQ : {e}")
        connection_match_updates = connection_match_resultats = None
        channel_match_updates = channel_match_resultats = None
+   publieur_evenements.demarrer()
+
+def publier_evenement(type_evenement, **data):
+   # Diffusé à tous les abonnés (cache du gateway, flux live, ...) à chaque modification du catalogue
+   # horodatage : permet aux abonnés de mesurer leur retard
+   return publieur_evenements.publier({'type': type_evenement, 'horodatage': time.time(), **data})
+
+moteur_cotes = MoteurCotes(app, match_repository, publier_evenement)
 
 def require_bookmaker(f):
    @wraps(f)
    def decorated(*args, **kwargs):
-       token = request.headers.get('Authorization')
-       if not token:
-           return jsonify({'message': 'Token manquant'}), 401
        try:
-           token = token.split('Bearer ')[1]
-           payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
-           if payload.get('role') != 'bookmaker':
-               return jsonify({'message': 'Accès non autorisé'}), 403
-       except (jwt.InvalidTokenError, IndexError):
+           payload = get_claims()
+       except (jwt.InvalidTokenError, KeyError, ValueError):
            return jsonify({'message': 'Token invalide'}), 401
+       if payload is None:
+           return jsonify({'message': 'Token manquant'}), 401
+       if payload.get('role') != 'bookmaker':
+           return jsonify({'message': 'Accès non autorisé'}), 403
        return f(*args, **kwargs)
    return decorated
 
+def reponse_conditionnelle(version, construire):
+   # ETag dérivé de la version de la ressource : 304 sans requête de chargement
+   # ni sérialisation quand le client a déjà la dernière version
+   etag = hashlib.sha1(repr(version).encode('utf-8')).hexdigest()
+   if request.if_none_match.contains_weak(etag):
+       response = app.response_class(status=304)
+   else:
+       response = construire()
+   response.set_etag(etag)
+   response.headers['Cache-Control'] = 'no-cache'
+   return response
+
 def traiter_match_updates(ch, method, properties, body):
    with app.app_context():
        try:
            data = json.loads(body)
-           match_repository.traiter_match_update(data)
+           if match_repository.traiter_match_update(data):
+               publier_evenement('match_modifie', match_id=data['match_id'])
        except Exception as e:
            print(f"Erreur traitement match_updates : {e}")
 
+def traiter_paris_events(ch, method, properties, body):
+   try:
+       data = json.loads(body)
+       if data.get('type') == 'nouveau_pari':
+           moteur_cotes.enregistrer_pari(data)
+   except Exception as e:
+       print(f"Erreur traitement paris_events : {e}")
+
+def traiter_match_events(ch, method, properties, body):
+   try:
+       evenement = json.loads(body)
+       # Modifications faites par les autres réplicas
+       if evenement.get('type') == 'equipe_modifiee':
+           match_repository.index_equipes.invalider()
+       elif evenement.get('type') == 'competition_modifiee':
+           match_repository.index_competitions.invalider()
+       diffuseur.traiter_evenement(evenement)
+   except Exception as e:
+       print(f"Erreur traitement match_events : {e}")
+
+def consume_match_events():
+   # Chaque réplica reçoit toutes les modifications, y compris celles faites
+   # par les autres réplicas, pour ses abonnés live
+   while True:
+       try:
+           channel, connection, queue_name = get_rabbitmq_exchange('match_events', subscribe=True)
+           channel.basic_consume(
+               queue=queue_name,
+               on_message_callback=traiter_match_events,
+               auto_ack=True
+           )
+           print("Démarrage consommation RabbitMQ match_events")
+           while True:
+               connection.process_data_events(time_limit=1)
+       except Exception as e:
+           print(f"Erreur consommation match_events : {e}")
+
+       print("Reconnexion RabbitMQ match_events dans 5s...")
+       time.sleep(5)
+
+def consume_paris_events():
+   # Queue durable du moteur de cotes liée à l'exchange paris_events : les
+   # consommateurs de pari_updates (service_panier) gardent tous leurs messages
+   while True:
+       try:
+           channel, connection, queue_name = get_rabbitmq_exchange(
+               'paris_events', subscribe=True, queue='paris_events_moteur_cotes'
+           )
+           channel.basic_consume(
+               queue=queue_name,
+               on_message_callback=traiter_paris_events,
+               auto_ack=True
+           )
+           print("Démarrage consommation RabbitMQ paris_events")
+           while True:
+               connection.process_data_events(time_limit=1)
+       except Exception as e:
+           print(f"Erreur consommation paris_events : {e}")
+
+       print("Reconnexion RabbitMQ paris_events dans 5s...")
+       time.sleep(5)
+
 def consume_messages(channel, connection, callback, queue_name):
    if not channel or not connection:
        print(f"Canal/connexion RabbitMQ indisponible pour {queue_name}")
@@ -89,18 +202,97 @@ def consume_messages(channel, connection, callback, queue_name):
    init_rabbitmq()
    consume_messages(channel, connection, callback, queue_name)
 
+def encoder_curseur(match):
+   valeur = json.dumps([match.date_match.isoformat(), match.id])
+   return base64.urlsafe_b64encode(valeur.encode('utf-8')).decode('ascii')
+
+def decoder_curseur(curseur):
+   date_match, match_id = json.loads(base64.urlsafe_b64decode(curseur.encode('ascii')))
+   return datetime.fromisoformat(date_match), int(match_id)
+
+def lire_date(nom):
+   valeur = request.args.get(nom)
+   return datetime.fromisoformat(valeur) if valeur else None
+
+def liste_matches_par_ids(valeur):
+   # Forme compacte (statut, date, score, cotes courantes), sans compétition
+   # ni équipes, en une requête ; les identifiants inconnus sont absents
+   try:
+       ids = {int(i) for i in valeur.split(',') if i.strip()}
+   except ValueError:
+       return jsonify({'message': 'ids doit être une liste d\'entiers séparés par des virgules'}), 400
+   if not ids:
+       return jsonify({'message': 'ids vide'}), 400
+   if len(ids) > MATCHES_IDS_MAX:
+       return jsonify({'message': f'Maximum {MATCHES_IDS_MAX} identifiants'}), 400
+   try:
+       return jsonify(match_repository.get_etats_matches(ids)), 200
+   except Exception as e:
+       return jsonify({'message': str(e)}), 500
+
 @app.route('/matches', methods=['GET'])
 def liste_matches():
+   if 'ids' in request.args:
+       return liste_matches_par_ids(request.args['ids'])
    try:
-       matches = match_repository.get_matches(
+       filtres = (
            request.args.get('competition_id'),
            request.args.get('statut'),
-           request.args.get('equipe_id')
+           request.args.get('equipe_id'),
+           lire_date('from'),
+           lire_date('to')
        )
-       return jsonify([match.to_dict() for match in matches]), 200
+       limite = min(int(request.args.get('limit', MATCHES_PAGE_DEFAUT)), MATCHES_PAGE_MAX)
+       curseur = request.args.get('curseur')
+       apres = decoder_curseur(curseur) if curseur else None
+   except (ValueError, TypeError, binascii.Error):
+       return jsonify({'message': 'Paramètres de pagination ou de date invalides'}), 400
+   if limite <= 0:
+       return jsonify({'message': 'limit doit être positif'}), 400
+
+   def construire():
+       # Une ligne de plus que la page pour savoir s'il reste des matches
+       matches = match_repository.get_matches(*filtres, apres=apres, limite=limite + 1)
+       response = jsonify([match.to_dict() for match in matches[:limite]])
+       if len(matches) > limite:
+           suivant = encoder_curseur(matches[limite - 1])
+           args = request.args.to_dict()
+           args['curseur'] = suivant
+           response.headers['X-Curseur-Suivant'] = suivant
+           response.headers['Link'] = f'<{request.path}?{urlencode(args)}>; rel="next"'
+       return response
+
+   try:
+       return reponse_conditionnelle(match_repository.version_matches(*filtres), construire)
    except Exception as e:
        return jsonify({'message': str(e)}), 500
 
+@app.route('/matches/etats', methods=['GET'])
+def etats_ouverts():
+   # Instantané compact des matches ouverts aux paris (réplique de service_pari)
+   try:
+       return jsonify(match_repository.get_etats_ouverts()), 200
+   except Exception as e:
+       return jsonify({'message': str(e)}), 500
+
+@app.route('/matches/live', methods=['GET'])
+def flux_live():
+   # Server-Sent Events : état compact (statut, score, cotes) des matches
+   # modifiés, filtré par ?match_id= et/ou ?competition_id=
+   try:
+       match_ids = lire_ids(request.args.getlist('match_id'))
+       competition_ids = lire_ids(request.args.getlist('competition_id'))
+   except ValueError:
+       return jsonify({'message': 'match_id et competition_id doivent être des entiers'}), 400
+
+   abonne = diffuseur.abonner(match_ids, competition_ids)
+   if abonne is None:
+       return jsonify({'message': 'Trop de connexions live, réessayez plus tard'}), 503, {'Retry-After': '5'}
+   return Response(diffuseur.flux(abonne), mimetype='text/event-stream', headers={
+       'Cache-Control': 'no-cache',
+       'X-Accel-Buffering': 'no'
+   })
+
 @app.route('/matches', methods=['POST'])
 @require_bookmaker
 def creer_match():
@@ -117,7 +309,7 @@ def creer_match():
        return jsonify({'message': 'Équipes introuvables'}), 400
 
    date_match = datetime.fromisoformat(data['date_match'])
-   if date_match <= datetime.now():
+   if date_match <= datetime.utcnow():
        return jsonify({'message': 'Date du match doit être future'}), 400
 
    if data['cote_domicile'] <= 0 or data['cote_nul'] <= 0 or data['cote_exterieur'] <= 0:
@@ -125,14 +317,62 @@ def creer_match():
 
    try:
        match = match_repository.creer_match(data)
+       publier_evenement('match_cree', match_id=match.id)
        return jsonify({'message': 'Match créé', 'id': match.id}), 201
    except Exception as e:
        return jsonify({'message': str(e)}), 400
 
+def lire_fixtures():
+   # JSON (liste ou {"matches": [...]}) ou CSV (corps text/csv ou fichier
+   # multipart "fichier") ; renvoie [(numéro de ligne, fixture)]
+   fichier = request.files.get('fichier')
+   if fichier is not None:
+       contenu = fichier.read().decode('utf-8-sig')
+       est_csv = fichier.filename.lower().endswith('.csv') or fichier.mimetype == 'text/csv'
+   else:
+       contenu = request.get_data(as_text=True)
+       est_csv = request.mimetype == 'text/csv'
+
+   if est_csv:
+       # Ligne 1 : en-tête (competition,equipe_domicile,equipe_exterieur,date_match,cote_domicile,cote_nul,cote_exterieur)
+       return [(ligne, dict(fixture)) for ligne, fixture in enumerate(csv.DictReader(io.StringIO(contenu)), 2)]
+
+   data = json.loads(contenu)
+   fixtures = data.get('matches') if isinstance(data, dict) else data
+   if not isinstance(fixtures, list) or not all(isinstance(f, dict) for f in fixtures):
+       raise ValueError('Liste de matches attendue')
+   return list(enumerate(fixtures, 1))
+
+@app.route('/matches/import', methods=['POST'])
+@require_bookmaker
+def importer_matches():
+   try:
+       lignes = lire_fixtures()
+   except (ValueError, UnicodeDecodeError, csv.Error) as e:
+       return jsonify({'message': f'Fichier invalide : {e}'}), 400
+   if not lignes:
+       return jsonify({'message': 'Aucun match à importer'}), 400
+   if len(lignes) > IMPORT_MAX_LIGNES:
+       return jsonify({'message': f'Maximum {IMPORT_MAX_LIGNES} matches par import'}), 400
+
+   fixtures, erreurs = match_repository.valider_import(lignes)
+   if erreurs:
+       # Rien n'est importé tant qu'une ligne est invalide
+       return jsonify({'message': 'Import refusé', 'erreurs': erreurs}), 400
+
+   try:
+       ids = match_repository.importer_matches(fixtures)
+   except Exception as e:
+       return jsonify({'message': str(e)}), 400
+   publier_evenement('matches_importes', match_ids=ids)
+   return jsonify({'message': f'{len(ids)} matches importés', 'ids': ids}), 201
+
 @app.route('/matches/<int:match_id>', methods=['GET'])
 def get_match(match_id):
-   match = match_repository.get_match_by_id(match_id)
-   return jsonify(match.to_dict())
+   return reponse_conditionnelle(
+       match_repository.version_match(match_id),
+       lambda: jsonify(match_repository.get_match_by_id(match_id).to_dict())
+   )
 
 @app.route('/matches/<int:match_id>', methods=['DELETE'])
 @require_bookmaker
@@ -140,6 +380,7 @@ def delete_match(match_id):
    success, message = match_repository.delete_match(match_id)
    if not success:
        return jsonify({'message': message}), 400
+   publier_evenement('match_supprime', match_id=match_id)
    return jsonify({'message': 'Match supprimé'}), 200
 
 @app.route('/matches/<int:match_id>/score', methods=['PUT'])
@@ -148,6 +389,7 @@ def update_score(match_id):
    match, error = match_repository.update_score(match_id, request.json)
    if error:
        return jsonify({'message': error}), 400
+   publier_evenement('score_modifie', match_id=match.id)
 
    if match.statut == 'terminé':
        resultat = match_repository.get_resultat_match(match)
@@ -181,16 +423,89 @@ def update_cotes(match_id):
    match, error = match_repository.update_cotes(match_id, data)
    if error:
        return jsonify({'message': error}), 400
+   publier_evenement('cotes_modifiees', match_id=match.id)
 
    return jsonify({
        'message': 'Cotes mises à jour',
        'cotes': [cote.to_dict() for cote in match.cotes]
    }), 200
 
+@app.route('/matches/cotes', methods=['PUT'])
+@require_bookmaker
+def update_cotes_lot():
+   data = request.get_json(silent=True) or {}
+   lignes = data.get('cotes')
+   if not isinstance(lignes, list) or not lignes or not all(isinstance(l, dict) for l in lignes):
+       return jsonify({'message': 'Liste de cotes requise'}), 400
+   if len(lignes) > COTES_LOT_MAX:
+       return jsonify({'message': f'Maximum {COTES_LOT_MAX} matches par lot'}), 400
+
+   try:
+       match_ids, erreurs = match_repository.update_cotes_lot(lignes)
+   except Exception as e:
+       return jsonify({'message': str(e)}), 400
+   if erreurs:
+       return jsonify({'message': 'Mise à jour refusée', 'erreurs': erreurs}), 400
+
+   # Un seul événement pour tout le lot
+   publier_evenement('cotes_modifiees_lot', match_ids=match_ids)
+   return jsonify({'message': f'Cotes mises à jour pour {len(match_ids)} matches', 'match_ids': match_ids}), 200
+
+@app.route('/matches/<int:match_id>/cotes/historique', methods=['GET'])
+def historique_cotes(match_id):
+   if not match_repository.match_existe(match_id):
+       return jsonify({'message': 'Match introuvable'}), 404
+   try:
+       pas = int(request.args.get('pas', HISTORIQUE_PAS_DEFAUT))
+       debut, fin = lire_date('from'), lire_date('to')
+   except ValueError:
+       return jsonify({'message': 'Paramètres de date ou de pas invalides'}), 400
+   if pas <= 0:
+       return jsonify({'message': 'pas doit être positif'}), 400
+
+   # Un point de plus que le maximum : signale une réponse tronquée
+   points = match_repository.get_historique_cotes(match_id, debut, fin, pas, HISTORIQUE_POINTS_MAX + 1)
+   return jsonify({
+       'match_id': match_id,
+       'pas': pas,
+       'points': points[:HISTORIQUE_POINTS_MAX],
+       'tronque': len(points) > HISTORIQUE_POINTS_MAX
+   }), 200
+
+def lister_index(index):
+   # Liste complète déjà sérialisée, ou recherche ?q= par préfixe puis sous-chaîne
+   instantane = index.instantane()
+   q = request.args.get('q', '').strip()
+   if not q:
+       return reponse_conditionnelle(
+           instantane.version,
+           lambda: app.response_class(instantane.corps, mimetype='application/json')
+       )
+   try:
+       limite = min(int(request.args.get('limit', RECHERCHE_LIMITE_DEFAUT)), RECHERCHE_LIMITE_MAX)
+   except ValueError:
+       return jsonify({'message': 'limit doit être un entier'}), 400
+   if limite <= 0:
+       return jsonify({'message': 'limit doit être positif'}), 400
+   return reponse_conditionnelle(
+       (instantane.version, q, limite),
+       lambda: jsonify(instantane.rechercher(q, limite))
+   )
+
+def lire_index(index, entree_id, message):
+   instantane = index.instantane()
+   entree = instantane.par_id.get(entree_id)
+   if entree is None:
+       return jsonify({'message': message}), 404
+   return reponse_conditionnelle(instantane.version, lambda: jsonify(entree))
+
 @app.route('/matches/equipes', methods=['GET'])
 def liste_equipes():
-   equipes = match_repository.get_equipes()
-   return jsonify([equipe.to_dict() for equipe in equipes]), 200
+   return lister_index(match_repository.index_equipes)
+
+@app.route('/matches/equipes/<int:equipe_id>', methods=['GET'])
+def get_equipe(equipe_id):
+   return lire_index(match_repository.index_equipes, equipe_id, 'Équipe introuvable')
 
 @app.route('/matches/equipes', methods=['POST'])
 @require_bookmaker
@@ -201,6 +516,7 @@ def creer_equipe():
    equipe = match_repository.creer_equipe(request.json)
    if not equipe:
        return jsonify({'message': 'Équipe déjà existante'}), 400
+   publier_evenement('equipe_modifiee', equipe_id=equipe.id)
 
    return jsonify({'message': 'Équipe créée', 'id': equipe.id}), 201
 
@@ -210,6 +526,7 @@ def update_equipe(equipe_id):
    equipe, error = match_repository.update_equipe(equipe_id, request.json)
    if error:
        return jsonify({'message': error}), 400
+   publier_evenement('equipe_modifiee', equipe_id=equipe_id)
    return jsonify({'message': 'Équipe mise à jour'}), 200
 
 @app.route('/matches/equipes/<int:equipe_id>', methods=['DELETE'])
@@ -218,12 +535,16 @@ def delete_equipe(equipe_id):
    success, message = match_repository.delete_equipe(equipe_id)
    if not success:
        return jsonify({'message': message}), 400
+   publier_evenement('equipe_modifiee', equipe_id=equipe_id)
    return jsonify({'message': 'Équipe supprimée'}), 200
 
 @app.route('/matches/competitions', methods=['GET'])
 def liste_competitions():
-   competitions = match_repository.get_competitions()
-   return jsonify([competition.to_dict() for competition in competitions]), 200
+   return lister_index(match_repository.index_competitions)
+
+@app.route('/matches/competitions/<int:competition_id>', methods=['GET'])
+def get_competition(competition_id):
+   return lire_index(match_repository.index_competitions, competition_id, 'Compétition introuvable')
 
 @app.route('/matches/competitions', methods=['POST'])
 @require_bookmaker
@@ -234,6 +555,7 @@ def creer_competition():
    competition = match_repository.creer_competition(request.json)
    if not competition:
        return jsonify({'message': 'Compétition déjà existante'}), 400
+   publier_evenement('competition_modifiee', competition_id=competition.id)
 
    return jsonify({'message': 'Compétition créée', 'id': competition.id}), 201
 
@@ -243,6 +565,7 @@ def update_competition(competition_id):
    competition, error = match_repository.update_competition(competition_id, request.json)
    if error:
        return jsonify({'message': error}), 400
+   publier_evenement('competition_modifiee', competition_id=competition_id)
    return jsonify({'message': 'Compétition mise à jour'}), 200
 
 @app.route('/matches/competitions/<int:competition_id>', methods=['DELETE'])
@@ -251,6 +574,7 @@ def delete_competition(competition_id):
    success, message = match_repository.delete_competition(competition_id)
    if not success:
        return jsonify({'message': message}), 400
+   publier_evenement('competition_modifiee', competition_id=competition_id)
    return jsonify({'message': 'Compétition supprimée'}), 200
 
 if __name__ == '__main__':
@@ -258,6 +582,7 @@ if __name__ == '__main__':
        db.create_all()
 
    init_rabbitmq()
+   threading.Thread(target=consume_match_events, daemon=True).start()
    if connection_match_resultats and channel_match_resultats:
        thread_resultats = threading.Thread(
            target=consume_messages,
@@ -274,4 +599,8 @@ if __name__ == '__main__':
        )
        thread_updates.start()
 
+   if MOTEUR_COTES_ACTIF:
+       threading.Thread(target=consume_paris_events, daemon=True).start()
+       moteur_cotes.demarrer()
+
    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
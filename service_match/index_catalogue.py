@@ -0,0 +1,92 @@
+# service_match/index_catalogue.py
+import os
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+from bisect import bisect_left
+
+# Copie en mémoire des équipes et des compétitions : liste sérialisée une
+# fois, recherche, accès par id et par nom sans requête. Rechargée au
+# premier accès après une modification (locale ou reçue par match_events),
+# et au plus tard après INDEX_CATALOGUE_TTL secondes si un événement est manqué
+INDEX_CATALOGUE_TTL = float(os.getenv('INDEX_CATALOGUE_TTL', 300))
+RECHERCHE_LIMITE_DEFAUT = 20
+RECHERCHE_LIMITE_MAX = 100
+
+
+def normaliser(texte):
+    # Recherche insensible à la casse et aux accents
+    decompose = unicodedata.normalize('NFKD', str(texte).casefold())
+    return ''.join(c for c in decompose if not unicodedata.combining(c))
+
+
+class Instantane:
+    def __init__(self, entrees, cles, generation):
+        self.generation = generation
+        self.charge_a = time.monotonic()
+        self.entrees = sorted(entrees, key=lambda entree: entree['id'])
+        self.par_id = {entree['id']: entree for entree in self.entrees}
+        self.par_cle = {cle: {entree[cle]: entree for entree in self.entrees} for cle in cles}
+        # (valeur normalisée, id) triés : les préfixes par recherche dichotomique
+        self.termes = sorted({(normaliser(entree[cle]), entree['id']) for entree in self.entrees for cle in cles})
+        self.corps = json.dumps(self.entrees).encode('utf-8')
+        self.version = hashlib.sha1(self.corps).hexdigest()
+
+    def rechercher(self, q, limite=RECHERCHE_LIMITE_DEFAUT):
+        # Correspondances par préfixe d'abord, puis par sous-chaîne
+        terme = normaliser(q)
+        ids = []
+        index = bisect_left(self.termes, (terme,))
+        while index < len(self.termes) and len(ids) < limite and self.termes[index][0].startswith(terme):
+            if self.termes[index][1] not in ids:
+                ids.append(self.termes[index][1])
+            index += 1
+        for valeur, entree_id in self.termes:
+            if len(ids) >= limite:
+                break
+            if terme in valeur and entree_id not in ids:
+                ids.append(entree_id)
+        return [self.par_id[entree_id] for entree_id in ids]
+
+
+class IndexCatalogue:
+    def __init__(self, charger, cles=('nom',), ttl=INDEX_CATALOGUE_TTL):
+        # charger : () -> liste de dicts (to_dict), appelé dans un contexte d'application
+        self.charger = charger
+        self.cles = cles
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._chargement = threading.Lock()
+        self._generation = 0
+        self._instantane = None
+        self.rechargements = 0
+
+    def invalider(self):
+        with self._lock:
+            self._generation += 1
+
+    def _a_jour(self, instantane):
+        return (instantane is not None and instantane.generation == self._generation
+                and time.monotonic() - instantane.charge_a < self.ttl)
+
+    def instantane(self):
+        instantane = self._instantane
+        if self._a_jour(instantane):
+            return instantane
+        # Un seul rechargement à la fois, les autres lecteurs l'attendent
+        with self._chargement:
+            instantane = self._instantane
+            if not self._a_jour(instantane):
+                generation = self._generation
+                instantane = Instantane(self.charger(), self.cles, generation)
+                self._instantane = instantane
+                self.rechargements += 1
+            return instantane
+
+    def get(self, entree_id):
+        return self.instantane().par_id.get(entree_id)
+
+    def trouver(self, cle, valeur):
+        return self.instantane().par_cle[cle].get(valeur)
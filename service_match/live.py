@@ -0,0 +1,152 @@
+# service_match/live.py
+import os
+import json
+import time
+import threading
+
+# Fenêtre (secondes) pendant laquelle les modifications d'un même match sont
+# fusionnées : un seul état envoyé, le plus récent
+LIVE_INTERVALLE = float(os.getenv('LIVE_INTERVALLE', 0.25))
+# Commentaire SSE envoyé aux connexions inactives (proxys, détection de déconnexion)
+LIVE_HEARTBEAT = float(os.getenv('LIVE_HEARTBEAT', 15))
+LIVE_MAX_ABONNES = int(os.getenv('LIVE_MAX_ABONNES', 1000))
+LIVE_RETRY_MS = 3000
+
+# Événements match_events qui modifient l'état diffusé d'un match
+EVENEMENTS_LIVE = ('score_modifie', 'cotes_modifiees', 'cotes_modifiees_lot', 'match_modifie')
+
+
+def lire_ids(valeurs):
+    # ?match_id=1,2&match_id=3
+    return {int(i) for valeur in valeurs for i in valeur.split(',') if i.strip()}
+
+
+def format_sse(evenement, data, identifiant=None):
+    lignes = [f'event: {evenement}']
+    if identifiant is not None:
+        lignes.append(f'id: {identifiant}')
+    lignes.append(f'data: {data}')
+    return '\n'.join(lignes) + '\n\n'
+
+
+class Abonne:
+    def __init__(self, match_ids, competition_ids):
+        self.match_ids = match_ids
+        self.competition_ids = competition_ids
+        self._lock = threading.Lock()
+        self._reveil = threading.Event()
+        self._en_attente = {}
+
+    def accepte(self, etat):
+        if not self.match_ids and not self.competition_ids:
+            return True
+        return etat['match_id'] in self.match_ids or etat['competition_id'] in self.competition_ids
+
+    def pousser(self, match_id, message):
+        # Un client lent ne garde que le dernier état de chaque match
+        with self._lock:
+            self._en_attente[match_id] = message
+        self._reveil.set()
+
+    def attendre(self, timeout):
+        self._reveil.wait(timeout)
+        with self._lock:
+            messages, self._en_attente = list(self._en_attente.values()), {}
+            self._reveil.clear()
+        return messages
+
+
+class Diffuseur:
+    # Un thread de diffusion par processus : les identifiants modifiés sont
+    # accumulés pendant LIVE_INTERVALLE, chargés en une requête et sérialisés
+    # une seule fois quel que soit le nombre d'abonnés
+    def __init__(self, charger, intervalle=LIVE_INTERVALLE, max_abonnes=LIVE_MAX_ABONNES):
+        self.charger = charger
+        self.intervalle = intervalle
+        self.max_abonnes = max_abonnes
+        self._lock = threading.Lock()
+        self._signal = threading.Event()
+        self._abonnes = set()
+        self._modifies = set()
+        self._thread = None
+        self._sequence = 0
+        self.signalements = 0
+        self.etats_diffuses = 0
+        self.rejets = 0
+
+    def demarrer(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.boucle, daemon=True)
+                self._thread.start()
+
+    def abonner(self, match_ids=(), competition_ids=()):
+        with self._lock:
+            if len(self._abonnes) >= self.max_abonnes:
+                self.rejets += 1
+                return None
+            abonne = Abonne(set(match_ids), set(competition_ids))
+            self._abonnes.add(abonne)
+        self.demarrer()
+        return abonne
+
+    def desabonner(self, abonne):
+        with self._lock:
+            self._abonnes.discard(abonne)
+
+    def signaler(self, match_ids):
+        with self._lock:
+            self._modifies.update(match_ids)
+            self.signalements += len(match_ids)
+        self._signal.set()
+
+    def traiter_evenement(self, evenement):
+        if evenement.get('type') not in EVENEMENTS_LIVE:
+            return
+        match_ids = evenement.get('match_ids') or [evenement.get('match_id')]
+        self.signaler([i for i in match_ids if i is not None])
+
+    def boucle(self):
+        while True:
+            self._signal.wait()
+            # Les modifications qui arrivent pendant la fenêtre sont fusionnées
+            time.sleep(self.intervalle)
+            with self._lock:
+                self._signal.clear()
+                match_ids, self._modifies = self._modifies, set()
+                abonnes = list(self._abonnes)
+            if not match_ids or not abonnes:
+                continue
+            try:
+                self.diffuser(self.charger(match_ids), abonnes)
+            except Exception as e:
+                print(f"Erreur diffusion live : {e}")
+
+    def diffuser(self, etats, abonnes):
+        for etat in etats:
+            self._sequence += 1
+            message = format_sse('match', json.dumps(etat), self._sequence)
+            for abonne in abonnes:
+                if abonne.accepte(etat):
+                    abonne.pousser(etat['match_id'], message)
+        self.etats_diffuses += len(etats)
+
+    def flux(self, abonne, heartbeat=LIVE_HEARTBEAT):
+        try:
+            yield f'retry: {LIVE_RETRY_MS}\n\n'
+            while True:
+                messages = abonne.attendre(heartbeat)
+                yield ''.join(messages) if messages else ': ping\n\n'
+        finally:
+            # Générateur fermé par le serveur à la déconnexion du client
+            self.desabonner(abonne)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'abonnes': len(self._abonnes),
+                'max_abonnes': self.max_abonnes,
+                'rejets': self.rejets,
+                'signalements': self.signalements,
+                'etats_diffuses': self.etats_diffuses
+            }
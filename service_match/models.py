@@ -11,6 +11,7 @@ class Equipe(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nom = db.Column(db.String(100), unique=True, nullable=False)
     date_creation = db.Column(db.DateTime, default=datetime.utcnow)
+    date_modification = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     matchs_domicile = db.relationship(
         'Match',
@@ -41,6 +42,7 @@ class Competition(db.Model):
     slug = db.Column(db.String(100), unique=True, nullable=False)
     actif = db.Column(db.Boolean, default=True)
     date_creation = db.Column(db.DateTime, default=datetime.utcnow)
+    date_modification = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     matches = db.relationship('Match', back_populates='competition', lazy=True)
 
@@ -56,6 +58,13 @@ class Competition(db.Model):
 
 class Match(db.Model):
     __tablename__ = 'matches'
+    __table_args__ = (
+        db.Index('idx_matches_date_match', 'date_match', 'id'),
+        db.Index('idx_matches_statut_date_match', 'statut', 'date_match', 'id'),
+        db.Index('idx_matches_competition_date_match', 'competition_id', 'date_match', 'id'),
+        db.Index('idx_matches_equipe_domicile', 'equipe_domicile_id'),
+        db.Index('idx_matches_equipe_exterieur', 'equipe_exterieur_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     competition_id = db.Column(db.Integer, db.ForeignKey('competitions.id'), nullable=False)
@@ -66,6 +75,7 @@ class Match(db.Model):
     score_domicile = db.Column(db.Integer)
     score_exterieur = db.Column(db.Integer)
     date_creation = db.Column(db.DateTime, default=datetime.utcnow)
+    date_modification = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     competition = db.relationship('Competition', back_populates='matches')
     equipe_domicile = db.relationship(
@@ -97,6 +107,10 @@ class Match(db.Model):
 
 class Cote(db.Model):
     __tablename__ = 'cotes'
+    __table_args__ = (
+        # Une ligne par match : la cote actuelle, l'historique est dans cotes_historique
+        db.Index('idx_cotes_match_id', 'match_id', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     match_id = db.Column(db.Integer, db.ForeignKey('matches.id'), nullable=False)
@@ -116,3 +130,41 @@ class Cote(db.Model):
             'cote_exterieur': self.cote_exterieur,
             'date_modification': self.date_modification.isoformat()
         }
+
+
+class CoteHistorique(db.Model):
+    # Versions successives des cotes, uniquement en insertion
+    __tablename__ = 'cotes_historique'
+    __table_args__ = (
+        db.Index('idx_cotes_historique_match_date', 'match_id', 'date_modification'),
+    )
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    match_id = db.Column(db.Integer, db.ForeignKey('matches.id', ondelete='CASCADE'), nullable=False)
+    cote_domicile = db.Column(db.Float, nullable=False)
+    cote_nul = db.Column(db.Float, nullable=False)
+    cote_exterieur = db.Column(db.Float, nullable=False)
+    date_modification = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class ExpositionCote(db.Model):
+    # Mises et gains à payer cumulés par issue (paris simples), suivis par le
+    # moteur de cotes. cote_reference_* : dernières cotes posées par un
+    # bookmaker, qui bornent les variations ; cote_moteur_* : dernières cotes
+    # écrites par le moteur, pour détecter une modification manuelle
+    __tablename__ = 'expositions_cotes'
+
+    match_id = db.Column(db.Integer, db.ForeignKey('matches.id', ondelete='CASCADE'), primary_key=True)
+    mise_domicile = db.Column(db.Float, nullable=False, default=0)
+    mise_nul = db.Column(db.Float, nullable=False, default=0)
+    mise_exterieur = db.Column(db.Float, nullable=False, default=0)
+    engagement_domicile = db.Column(db.Float, nullable=False, default=0)
+    engagement_nul = db.Column(db.Float, nullable=False, default=0)
+    engagement_exterieur = db.Column(db.Float, nullable=False, default=0)
+    cote_reference_domicile = db.Column(db.Float)
+    cote_reference_nul = db.Column(db.Float)
+    cote_reference_exterieur = db.Column(db.Float)
+    cote_moteur_domicile = db.Column(db.Float)
+    cote_moteur_nul = db.Column(db.Float)
+    cote_moteur_exterieur = db.Column(db.Float)
+    date_modification = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
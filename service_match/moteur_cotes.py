@@ -0,0 +1,145 @@
+# service_match/moteur_cotes.py
+import os
+import time
+import threading
+import numpy as np
+from repository import ISSUES, COLONNES_POSITION
+
+# Moteur de cotes piloté par l'exposition : les paris simples (nouveau_pari
+# sur l'exchange paris_events) sont cumulés par match et par issue ; à chaque
+# tick, les cotes de tous les matches à venir ayant reçu des paris sont
+# recalculées ensemble puis écrites par la mise à jour groupée des cotes.
+# Désactivé par défaut ; un seul processus doit le faire tourner (MOTEUR_COTES_ACTIF=1).
+MOTEUR_COTES_ACTIF = os.getenv('MOTEUR_COTES_ACTIF', '0') == '1'
+MOTEUR_COTES_INTERVALLE = float(os.getenv('MOTEUR_COTES_INTERVALLE', 5))
+# Overround : somme des probabilités implicites = 1 + MARGE
+MOTEUR_COTES_MARGE = float(os.getenv('MOTEUR_COTES_MARGE', 0.05))
+# Poids de l'exposition dans le déplacement des probabilités
+MOTEUR_COTES_SENSIBILITE = float(os.getenv('MOTEUR_COTES_SENSIBILITE', 1.0))
+# Mises fictives qui amortissent l'effet des premiers paris d'un match
+MOTEUR_COTES_LIQUIDITE = float(os.getenv('MOTEUR_COTES_LIQUIDITE', 1000))
+# Écart relatif maximum par rapport aux cotes posées par le bookmaker, et par tick
+MOTEUR_COTES_ECART_MAX = float(os.getenv('MOTEUR_COTES_ECART_MAX', 0.2))
+MOTEUR_COTES_PAS_MAX = float(os.getenv('MOTEUR_COTES_PAS_MAX', 0.05))
+# Variation en dessous de laquelle les cotes ne sont pas réécrites
+MOTEUR_COTES_SEUIL = float(os.getenv('MOTEUR_COTES_SEUIL', 0.01))
+COTE_MIN = 1.01
+TOLERANCE = 0.005
+
+
+def calculer_cotes(reference, mises, engagements, actuelles, marge=MOTEUR_COTES_MARGE,
+                   sensibilite=MOTEUR_COTES_SENSIBILITE, liquidite=MOTEUR_COTES_LIQUIDITE,
+                   ecart_max=MOTEUR_COTES_ECART_MAX, pas_max=MOTEUR_COTES_PAS_MAX):
+    # Tableaux (matches, issues). Probabilités sans marge tirées des cotes de
+    # référence, déplacées vers les issues où la perte nette serait la plus
+    # forte, puis remarginées et bornées
+    probabilites = 1 / reference
+    probabilites /= probabilites.sum(axis=1, keepdims=True)
+
+    total = mises.sum(axis=1, keepdims=True)
+    # Perte nette si l'issue sort (gains à payer - mises encaissées), rapportée au volume
+    exposition = (engagements - total) / (total + liquidite)
+    probabilites = probabilites * np.exp(sensibilite * exposition)
+    probabilites /= probabilites.sum(axis=1, keepdims=True)
+
+    cotes = 1 / (probabilites * (1 + marge))
+    cotes = np.clip(cotes, actuelles * (1 - pas_max), actuelles * (1 + pas_max))
+    cotes = np.clip(cotes, reference * (1 - ecart_max), reference * (1 + ecart_max))
+    return np.maximum(np.round(cotes, 2), COTE_MIN)
+
+
+class MoteurCotes:
+    def __init__(self, app, repository, publier, intervalle=MOTEUR_COTES_INTERVALLE):
+        self.app = app
+        self.repository = repository
+        self.publier = publier
+        self.intervalle = intervalle
+        self._lock = threading.Lock()
+        self._deltas = {}
+        self._thread = None
+        self.paris_recus = 0
+        self.ticks = 0
+        self.cotes_ecrites = 0
+
+    def enregistrer_pari(self, evenement):
+        # nouveau_pari : montant et gain potentiel ajoutés à l'issue pariée
+        if evenement.get('type_pari') not in ISSUES:
+            return
+        issue = ISSUES.index(evenement['type_pari'])
+        with self._lock:
+            delta = self._deltas.get(evenement['match_id'])
+            if delta is None:
+                delta = self._deltas[evenement['match_id']] = np.zeros(2 * len(ISSUES))
+            delta[issue] += float(evenement['montant'])
+            delta[len(ISSUES) + issue] += float(evenement['gain_potentiel'])
+            self.paris_recus += 1
+
+    def demarrer(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.boucle, daemon=True)
+            self._thread.start()
+
+    def boucle(self):
+        while True:
+            time.sleep(self.intervalle)
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Erreur moteur de cotes : {e}")
+
+    def tick(self):
+        with self._lock:
+            deltas, self._deltas = self._deltas, {}
+        self.ticks += 1
+
+        with self.app.app_context():
+            if deltas:
+                try:
+                    self.repository.ajouter_expositions(deltas)
+                except Exception:
+                    # Repris au tick suivant
+                    with self._lock:
+                        for match_id, delta in deltas.items():
+                            self._deltas[match_id] = self._deltas.get(match_id, 0) + delta
+                    raise
+
+            lignes = self.repository.get_expositions_ouvertes()
+            if not lignes:
+                return []
+            match_ids = [ligne[0] for ligne in lignes]
+            # None (cotes pas encore posées par le moteur) devient NaN
+            donnees = np.array([ligne[1:] for ligne in lignes], dtype=float)
+            mises, engagements, reference, moteur, actuelles = (donnees[:, i:i + 3] for i in range(0, 15, 3))
+
+            # Cotes modifiées hors du moteur (bookmaker, import) : nouvelles cotes de référence
+            manuel = np.isnan(moteur).any(axis=1) | (np.abs(actuelles - moteur) > TOLERANCE).any(axis=1)
+            reference = np.where(manuel[:, None] | np.isnan(reference), actuelles, reference)
+
+            cotes = calculer_cotes(reference, mises, engagements, actuelles)
+            ecrire = (np.abs(cotes - actuelles) >= MOTEUR_COTES_SEUIL).any(axis=1)
+            cotes = np.where(ecrire[:, None], cotes, actuelles)
+
+            positions = [
+                {'match_id': match_ids[i], **dict(zip(COLONNES_POSITION, map(float, [*reference[i], *cotes[i]])))}
+                for i in np.flatnonzero(ecrire | manuel)
+            ]
+            nouvelles = [
+                {'match_id': match_ids[i], **{f'cote_{issue}': float(cotes[i, j]) for j, issue in enumerate(ISSUES)}}
+                for i in np.flatnonzero(ecrire)
+            ]
+            ecrites, erreurs = self.repository.update_cotes_moteur(nouvelles, positions)
+            if erreurs:
+                print(f"Moteur de cotes, cotes refusées : {erreurs}")
+
+        if ecrites:
+            self.cotes_ecrites += len(ecrites)
+            self.publier('cotes_modifiees_lot', match_ids=ecrites)
+        return ecrites
+
+    def stats(self):
+        return {
+            'actif': self._thread is not None,
+            'paris_recus': self.paris_recus,
+            'ticks': self.ticks,
+            'cotes_ecrites': self.cotes_ecrites
+        }
@@ -0,0 +1,104 @@
+# service_match/publieur_evenements.py
+import json
+import queue
+import threading
+from utils.rabbitmq import get_rabbitmq_exchange
+
+# Publication des événements du catalogue sur l'exchange match_events par un
+# seul thread propriétaire de la connexion : pika n'est pas thread-safe (threads
+# des requêtes, moteur de cotes), et la connexion traite ses heartbeats entre
+# deux envois au lieu d'être fermée par le broker faute d'activité.
+# Un envoi échoué est retenté une fois après reconnexion.
+ATTENTE_HEARTBEAT = 1
+
+
+class PublieurEvenements:
+    def __init__(self, exchange='match_events', secours=None):
+        self.exchange = exchange
+        # Appelé avec l'événement quand il n'a pas pu être publié
+        self.secours = secours
+        self._file = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.channel = None
+        self.connection = None
+        self.publies = 0
+        self.reconnexions = 0
+        self.echecs = 0
+
+    def demarrer(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.boucle, daemon=True)
+                self._thread.start()
+
+    def publier(self, evenement):
+        if self._thread is None:
+            # Sans RabbitMQ (publieur non démarré)
+            if self.secours:
+                self.secours(evenement)
+            return False
+        self._file.put(evenement)
+        return True
+
+    def connecter(self):
+        try:
+            self.channel, self.connection, _ = get_rabbitmq_exchange(self.exchange)
+        except Exception as e:
+            print(f"Échec de la connexion à l'exchange {self.exchange} : {e}")
+            self.channel = self.connection = None
+
+    def reconnecter(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+        self.reconnexions += 1
+        self.connecter()
+
+    def boucle(self):
+        self.connecter()
+        while True:
+            try:
+                evenement = self._file.get(timeout=ATTENTE_HEARTBEAT)
+            except queue.Empty:
+                self.entretenir()
+                continue
+            self.envoyer(evenement)
+
+    def entretenir(self):
+        # Heartbeats de la connexion inactive
+        if self.connection is None:
+            self.connecter()
+            return
+        try:
+            self.connection.process_data_events(time_limit=0)
+        except Exception as e:
+            print(f"Connexion {self.exchange} perdue : {e}")
+            self.reconnecter()
+
+    def envoyer(self, evenement):
+        for tentative in range(2):
+            if tentative or self.channel is None:
+                self.reconnecter()
+            if self.channel is None:
+                continue
+            try:
+                self.channel.basic_publish(exchange=self.exchange, routing_key='', body=json.dumps(evenement))
+                self.publies += 1
+                return True
+            except Exception as e:
+                print(f"Erreur publication {self.exchange} : {e}")
+        self.echecs += 1
+        if self.secours:
+            self.secours(evenement)
+        return False
+
+    def stats(self):
+        return {
+            'en_file': self._file.qsize(),
+            'publies': self.publies,
+            'reconnexions': self.reconnexions,
+            'echecs': self.echecs
+        }
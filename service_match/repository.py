@@ -1,31 +1,123 @@
-from models import db, Match, Cote, Competition, Equipe
-from sqlalchemy import or_
-from datetime import datetime
+from models import db, Match, Cote, CoteHistorique, Competition, Equipe, ExpositionCote
+from sqlalchemy import or_, and_, func, insert, update, bindparam
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.exc import IntegrityError
+from index_catalogue import IndexCatalogue
+from datetime import datetime, timedelta, timezone
 import json
 
+EPOCH = datetime(1970, 1, 1)
+ISSUES = ('domicile', 'nul', 'exterieur')
+COLONNES_EXPOSITION = tuple(f'mise_{i}' for i in ISSUES) + tuple(f'engagement_{i}' for i in ISSUES)
+COLONNES_POSITION = tuple(f'cote_reference_{i}' for i in ISSUES) + tuple(f'cote_moteur_{i}' for i in ISSUES)
+
+# Relations sérialisées par Match.to_dict : chargées avec les matches plutôt
+# qu'une requête par match et par relation (jointure pour les relations
+# simples, une requête IN pour les cotes)
+CHARGEMENT_MATCH = (
+    joinedload(Match.competition),
+    joinedload(Match.equipe_domicile),
+    joinedload(Match.equipe_exterieur),
+    selectinload(Match.cotes)
+)
+
 class MatchRepository:
-    def get_matches(self, competition_id=None, statut=None, equipe_id=None):
-        query = Match.query
+    def __init__(self):
+        self.index_equipes = IndexCatalogue(lambda: [equipe.to_dict() for equipe in Equipe.query.all()])
+        self.index_competitions = IndexCatalogue(
+            lambda: [competition.to_dict() for competition in Competition.query.all()], cles=('nom', 'slug'))
+
+    def filtrer_matches(self, query, competition_id=None, statut=None, equipe_id=None, debut=None, fin=None):
         if competition_id:
-            query = query.filter_by(competition_id=competition_id)
+            query = query.filter(Match.competition_id == competition_id)
         if statut:
-            query = query.filter_by(statut=statut)
+            query = query.filter(Match.statut == statut)
         if equipe_id:
             query = query.filter(
                 or_(Match.equipe_domicile_id == equipe_id,
                     Match.equipe_exterieur_id == equipe_id)
             )
+        if debut:
+            query = query.filter(Match.date_match >= debut)
+        if fin:
+            query = query.filter(Match.date_match < fin)
+        return query
+
+    def get_matches(self, competition_id=None, statut=None, equipe_id=None, debut=None, fin=None,
+                    apres=None, limite=None):
+        # Pagination par curseur (keyset) sur (date_match, id) : chaque page
+        # est lue par l'index, sans OFFSET
+        query = self.filtrer_matches(Match.query.options(*CHARGEMENT_MATCH), competition_id, statut, equipe_id, debut, fin)
+        if apres:
+            date_match, match_id = apres
+            query = query.filter(or_(
+                Match.date_match > date_match,
+                and_(Match.date_match == date_match, Match.id > match_id)
+            ))
+        query = query.order_by(Match.date_match, Match.id)
+        if limite:
+            query = query.limit(limite)
         return query.all()
 
     def get_match_by_id(self, id: int) -> Match:
-        return Match.query.get_or_404(id)
+        return Match.query.options(*CHARGEMENT_MATCH).filter(Match.id == id).first_or_404()
+
+    def requete_etats(self):
+        # Forme compacte (statut, score, date, cotes courantes) en une requête,
+        # sans compétition ni équipes
+        return db.session.query(
+            Match.id, Match.competition_id, Match.statut, Match.date_match,
+            Match.score_domicile, Match.score_exterieur,
+            Cote.cote_domicile, Cote.cote_nul, Cote.cote_exterieur
+        ).outerjoin(Cote, Cote.match_id == Match.id).order_by(Match.id)
+
+    def get_etats_matches(self, match_ids) -> list:
+        return self.formater_etats(self.requete_etats().filter(Match.id.in_(list(match_ids))))
+
+    def get_etats_ouverts(self) -> list:
+        # Matches sur lesquels on peut encore parier
+        return self.formater_etats(self.requete_etats().filter(
+            Match.statut == 'à_venir',
+            Match.date_match > datetime.utcnow()
+        ))
+
+    def formater_etats(self, lignes) -> list:
+        return [{
+            'match_id': ligne.id,
+            'competition_id': ligne.competition_id,
+            'statut': ligne.statut,
+            'date_match': ligne.date_match.isoformat(),
+            'score_domicile': ligne.score_domicile,
+            'score_exterieur': ligne.score_exterieur,
+            'cote_domicile': ligne.cote_domicile,
+            'cote_nul': ligne.cote_nul,
+            'cote_exterieur': ligne.cote_exterieur
+        } for ligne in lignes]
+
+    def requete_version_matches(self):
+        # Version sans charger les matches : leur nombre (suppressions) et les
+        # dernières modifications des matches, cotes, équipes et compétitions
+        return db.session.query(
+            func.count(func.distinct(Match.id)),
+            func.max(Match.date_modification),
+            func.max(Cote.date_modification),
+            db.session.query(func.max(Equipe.date_modification)).scalar_subquery(),
+            db.session.query(func.max(Competition.date_modification)).scalar_subquery()
+        ).select_from(Match).outerjoin(Cote, Cote.match_id == Match.id)
+
+    def version_matches(self, competition_id=None, statut=None, equipe_id=None, debut=None, fin=None) -> tuple:
+        query = self.filtrer_matches(self.requete_version_matches(), competition_id, statut, equipe_id, debut, fin)
+        return tuple(query.one())
+
+    def version_match(self, match_id: int) -> tuple:
+        return tuple(self.requete_version_matches().filter(Match.id == match_id).one())
 
     def get_equipe_by_id(self, id: int) -> Equipe:
         return Equipe.query.get_or_404(id)
 
-    def verify_equipes_match(self, equipe_domicile_id: int, equipe_exterieur_id: int) -> tuple[Equipe, Equipe]:
-        equipe_domicile = Equipe.query.get(equipe_domicile_id)
-        equipe_exterieur = Equipe.query.get(equipe_exterieur_id)
+    def verify_equipes_match(self, equipe_domicile_id: int, equipe_exterieur_id: int) -> tuple[dict, dict]:
+        equipe_domicile = self.index_equipes.get(equipe_domicile_id)
+        equipe_exterieur = self.index_equipes.get(equipe_exterieur_id)
 
         if not equipe_domicile or not equipe_exterieur:
             return None, None
@@ -47,9 +139,122 @@ class MatchRepository:
 
         nouveau_match.cotes.append(nouvelle_cote)
         db.session.add(nouveau_match)
+        db.session.flush()
+        self.historiser_cote(nouvelle_cote)
         db.session.commit()
         return nouveau_match
 
+    def historiser_cote(self, cote: Cote):
+        # Même transaction que la modification de la cote actuelle
+        db.session.add(CoteHistorique(
+            match_id=cote.match_id,
+            cote_domicile=cote.cote_domicile,
+            cote_nul=cote.cote_nul,
+            cote_exterieur=cote.cote_exterieur,
+            date_modification=cote.date_modification
+        ))
+
+    def valider_import(self, lignes: list) -> tuple[list, list]:
+        # lignes : [(numéro de ligne, fixture)]. Équipes et compétitions résolues
+        # par les index en mémoire ; toutes les lignes sont validées avant la
+        # moindre insertion
+        equipes = {nom: equipe['id'] for nom, equipe in self.index_equipes.instantane().par_cle['nom'].items()}
+        index_competitions = self.index_competitions.instantane().par_cle
+        competitions = {valeur: competition['id'] for cle in ('nom', 'slug')
+                        for valeur, competition in index_competitions[cle].items()}
+
+        maintenant = datetime.utcnow()
+        valides, erreurs = [], []
+        deja_vus = {}
+        for ligne, fixture in lignes:
+            messages = []
+            competition_id = competitions.get(str(fixture.get('competition', '')).strip())
+            if competition_id is None:
+                messages.append(f"Compétition introuvable : {fixture.get('competition')}")
+            domicile = equipes.get(str(fixture.get('equipe_domicile', '')).strip())
+            exterieur = equipes.get(str(fixture.get('equipe_exterieur', '')).strip())
+            if domicile is None:
+                messages.append(f"Équipe introuvable : {fixture.get('equipe_domicile')}")
+            if exterieur is None:
+                messages.append(f"Équipe introuvable : {fixture.get('equipe_exterieur')}")
+            if domicile is not None and domicile == exterieur:
+                messages.append('Les équipes doivent être différentes')
+
+            date_match = None
+            try:
+                date_match = datetime.fromisoformat(str(fixture.get('date_match', '')).strip())
+                if date_match.tzinfo is not None:
+                    # Date avec décalage (2030-01-01T20:00+02:00) : ramenée en UTC naïf
+                    date_match = date_match.astimezone(timezone.utc).replace(tzinfo=None)
+                if date_match <= maintenant:
+                    messages.append('Date du match doit être future')
+            except ValueError:
+                messages.append(f"Date invalide : {fixture.get('date_match')}")
+
+            cotes = {}
+            for cle in ('cote_domicile', 'cote_nul', 'cote_exterieur'):
+                try:
+                    cotes[cle] = float(fixture.get(cle))
+                    if cotes[cle] <= 0:
+                        messages.append(f'{cle} doit être positive')
+                except (TypeError, ValueError):
+                    messages.append(f'{cle} invalide : {fixture.get(cle)}')
+
+            cle = (domicile, exterieur, date_match)
+            if not messages and cle in deja_vus:
+                messages.append(f'Match en double dans l\'import (ligne {deja_vus[cle]})')
+            deja_vus.setdefault(cle, ligne)
+
+            if messages:
+                erreurs.append({'ligne': ligne, 'erreurs': messages})
+            else:
+                valides.append(dict(
+                    competition_id=competition_id,
+                    equipe_domicile_id=domicile,
+                    equipe_exterieur_id=exterieur,
+                    date_match=date_match,
+                    **cotes
+                ))
+        return valides, erreurs
+
+    def importer_matches(self, fixtures: list) -> list:
+        # Insertions groupées (executemany) dans une seule transaction :
+        # matches, cotes actuelles puis historique
+        maintenant = datetime.utcnow()
+        try:
+            # RETURNING sans ordre garanti en insertion groupée : les id sont
+            # rattachés aux fixtures par (domicile, extérieur, date), unique dans l'import
+            lignes = db.session.execute(
+                insert(Match).returning(Match.id, Match.equipe_domicile_id,
+                                        Match.equipe_exterieur_id, Match.date_match),
+                [{
+                    'competition_id': f['competition_id'],
+                    'equipe_domicile_id': f['equipe_domicile_id'],
+                    'equipe_exterieur_id': f['equipe_exterieur_id'],
+                    'date_match': f['date_match'],
+                    'statut': 'à_venir',
+                    'date_creation': maintenant,
+                    'date_modification': maintenant
+                } for f in fixtures]
+            ).all()
+            ids_par_fixture = {tuple(ligne[1:]): ligne[0] for ligne in lignes}
+            ids = [ids_par_fixture[(f['equipe_domicile_id'], f['equipe_exterieur_id'], f['date_match'])]
+                   for f in fixtures]
+            cotes = [{
+                'match_id': match_id,
+                'cote_domicile': f['cote_domicile'],
+                'cote_nul': f['cote_nul'],
+                'cote_exterieur': f['cote_exterieur'],
+                'date_modification': maintenant
+            } for match_id, f in zip(ids, fixtures)]
+            db.session.execute(insert(Cote), cotes)
+            db.session.execute(insert(CoteHistorique), cotes)
+            db.session.commit()
+            return ids
+        except Exception:
+            db.session.rollback()
+            raise
+
     def delete_match(self, match_id: int) -> tuple[bool, str]:
         match = self.get_match_by_id(match_id)
 
@@ -57,6 +262,8 @@ class MatchRepository:
             return False, "Impossible de supprimer un match en cours ou terminé"
 
         try:
+            CoteHistorique.query.filter_by(match_id=match_id).delete()
+            ExpositionCote.query.filter_by(match_id=match_id).delete()
             db.session.delete(match)
             db.session.commit()
             return True, None
@@ -71,7 +278,7 @@ class MatchRepository:
         return Competition.query.get_or_404(id)
 
     def creer_competition(self, data: dict) -> Competition:
-        if Competition.query.filter_by(nom=data['nom']).first():
+        if self.index_competitions.trouver('nom', data['nom']):
             return None
 
         nouvelle_competition = Competition(
@@ -80,15 +287,21 @@ class MatchRepository:
             actif=data.get('actif', True)
         )
         db.session.add(nouvelle_competition)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Index pas encore à jour d'une création faite par un autre réplica
+            db.session.rollback()
+            return None
+        self.index_competitions.invalider()
         return nouvelle_competition
 
     def update_competition(self, competition_id: int, data: dict) -> tuple[Competition, str]:
         competition = self.get_competition_by_id(competition_id)
 
         if 'nom' in data:
-            existing = Competition.query.filter_by(nom=data['nom']).first()
-            if existing and existing.id != competition_id:
+            existing = self.index_competitions.trouver('nom', data['nom'])
+            if existing and existing['id'] != competition_id:
                 return None, "Une compétition avec ce nom existe déjà"
             competition.nom = data['nom']
 
@@ -99,6 +312,7 @@ class MatchRepository:
 
         try:
             db.session.commit()
+            self.index_competitions.invalider()
             return competition, None
         except Exception as e:
             db.session.rollback()
@@ -113,6 +327,7 @@ class MatchRepository:
         try:
             db.session.delete(competition)
             db.session.commit()
+            self.index_competitions.invalider()
             return True, None
         except Exception as e:
             db.session.rollback()
@@ -122,25 +337,31 @@ class MatchRepository:
         return Equipe.query.all()
 
     def creer_equipe(self, data: dict) -> Equipe:
-        if Equipe.query.filter_by(nom=data['nom']).first():
+        if self.index_equipes.trouver('nom', data['nom']):
             return None
 
         nouvelle_equipe = Equipe(nom=data['nom'])
         db.session.add(nouvelle_equipe)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return None
+        self.index_equipes.invalider()
         return nouvelle_equipe
 
     def update_equipe(self, equipe_id: int, data: dict) -> tuple[Equipe, str]:
         equipe = self.get_equipe_by_id(equipe_id)
 
         if 'nom' in data:
-            existing = Equipe.query.filter_by(nom=data['nom']).first()
-            if existing and existing.id != equipe_id:
+            existing = self.index_equipes.trouver('nom', data['nom'])
+            if existing and existing['id'] != equipe_id:
                 return None, "Une équipe avec ce nom existe déjà"
             equipe.nom = data['nom']
 
         try:
             db.session.commit()
+            self.index_equipes.invalider()
             return equipe, None
         except Exception as e:
             db.session.rollback()
@@ -158,6 +379,7 @@ class MatchRepository:
         try:
             db.session.delete(equipe)
             db.session.commit()
+            self.index_equipes.invalider()
             return True, None
         except Exception as e:
             db.session.rollback()
@@ -199,6 +421,7 @@ class MatchRepository:
                 if 'cote_exterieur' in data:
                     cote.cote_exterieur = data['cote_exterieur']
                 cote.date_modification = datetime.utcnow()
+                self.historiser_cote(cote)
 
             db.session.commit()
             return match, None
@@ -206,6 +429,189 @@ class MatchRepository:
             db.session.rollback()
             return None, str(e)
 
+    def match_existe(self, id: int) -> bool:
+        return db.session.query(Match.id).filter(Match.id == id).first() is not None
+
+    def intervalle_sql(self, colonne, pas: int):
+        # Numéro de l'intervalle de `pas` secondes (depuis l'epoch) calculé par la base
+        if db.engine.dialect.name == 'sqlite':
+            secondes = func.cast(func.strftime('%s', colonne), db.Integer)
+        else:
+            secondes = func.cast(func.floor(func.extract('epoch', colonne)), db.BigInteger)
+        return secondes // pas
+
+    def get_historique_cotes(self, match_id: int, debut=None, fin=None, pas: int = 60, limite: int = None) -> list:
+        # Sous-échantillonnage par intervalle de `pas` secondes fait en SQL :
+        # dernière cote connue de chaque intervalle (ROW_NUMBER par intervalle),
+        # au plus `limite` points. Seules les lignes du match dans la plage sont
+        # lues (index match_id, date_modification)
+        intervalle = self.intervalle_sql(CoteHistorique.date_modification, pas)
+        rang = func.row_number().over(
+            partition_by=intervalle,
+            order_by=(CoteHistorique.date_modification.desc(), CoteHistorique.id.desc())
+        )
+        query = db.session.query(
+            intervalle.label('intervalle'), CoteHistorique.cote_domicile,
+            CoteHistorique.cote_nul, CoteHistorique.cote_exterieur, rang.label('rang')
+        ).filter(CoteHistorique.match_id == match_id)
+        if debut:
+            query = query.filter(CoteHistorique.date_modification >= debut)
+        if fin:
+            query = query.filter(CoteHistorique.date_modification < fin)
+        derniers = query.subquery()
+        points = db.session.query(
+            derniers.c.intervalle, derniers.c.cote_domicile, derniers.c.cote_nul, derniers.c.cote_exterieur
+        ).filter(derniers.c.rang == 1).order_by(derniers.c.intervalle)
+        if limite:
+            points = points.limit(limite)
+        lignes = [tuple(ligne) for ligne in points.all()]
+
+        if debut:
+            # Cote en vigueur au début de la plage, si aucune modification
+            # n'a lieu dans son premier intervalle
+            intervalle_debut = int((debut - EPOCH).total_seconds()) // pas
+            if not lignes or lignes[0][0] != intervalle_debut:
+                precedente = db.session.query(
+                    CoteHistorique.cote_domicile, CoteHistorique.cote_nul, CoteHistorique.cote_exterieur
+                ).filter(
+                    CoteHistorique.match_id == match_id,
+                    CoteHistorique.date_modification < debut
+                ).order_by(CoteHistorique.date_modification.desc(), CoteHistorique.id.desc()).first()
+                if precedente:
+                    lignes.insert(0, (intervalle_debut,) + tuple(precedente))
+                    if limite:
+                        lignes = lignes[:limite]
+
+        return [
+            {
+                'date': (EPOCH + timedelta(seconds=int(intervalle) * pas)).isoformat(),
+                'cote_domicile': cote_domicile,
+                'cote_nul': cote_nul,
+                'cote_exterieur': cote_exterieur
+            } for intervalle, cote_domicile, cote_nul, cote_exterieur in lignes
+        ]
+
+    def update_cotes_lot(self, lignes: list) -> tuple[list, list]:
+        # lignes : [{match_id, cote_domicile, cote_nul, cote_exterieur}]. Tout ou
+        # rien : une seule requête de vérification, un UPDATE et un INSERT
+        # d'historique groupés (executemany) dans une transaction
+        erreurs = []
+        par_match = {}
+        index_match = {}
+        for index, ligne in enumerate(lignes):
+            messages = []
+            try:
+                match_id = int(ligne['match_id'])
+                cotes = {cle: float(ligne[cle]) for cle in ('cote_domicile', 'cote_nul', 'cote_exterieur')}
+                if any(valeur <= 0 for valeur in cotes.values()):
+                    messages.append('Les cotes doivent être positives')
+                elif match_id in par_match:
+                    messages.append(f'Match {match_id} en double dans le lot')
+            except (KeyError, TypeError, ValueError):
+                messages.append('match_id, cote_domicile, cote_nul et cote_exterieur requis')
+            if messages:
+                erreurs.append({'index': index, 'match_id': ligne.get('match_id') if isinstance(ligne, dict) else None,
+                                'erreurs': messages})
+            else:
+                par_match[match_id] = cotes
+                index_match[match_id] = index
+
+        existants = {match_id for (match_id,) in db.session.query(Cote.match_id).filter(
+            Cote.match_id.in_(par_match))}
+        for match_id, index in index_match.items():
+            if match_id not in existants:
+                erreurs.append({'index': index, 'match_id': match_id, 'erreurs': ['Aucune cote associée à ce match']})
+        if erreurs:
+            return [], sorted(erreurs, key=lambda e: e['index'])
+
+        maintenant = datetime.utcnow()
+        valeurs = [{'b_match_id': match_id, 'date_modification': maintenant, **cotes}
+                   for match_id, cotes in par_match.items()]
+        try:
+            # UPDATE Core (table) : l'ORM exigerait la clé primaire de chaque cote
+            cotes_table = Cote.__table__
+            db.session.execute(
+                update(cotes_table).where(cotes_table.c.match_id == bindparam('b_match_id')).values(
+                    cote_domicile=bindparam('cote_domicile'),
+                    cote_nul=bindparam('cote_nul'),
+                    cote_exterieur=bindparam('cote_exterieur'),
+                    date_modification=bindparam('date_modification')
+                ),
+                valeurs
+            )
+            db.session.execute(insert(CoteHistorique), [
+                {'match_id': match_id, 'date_modification': maintenant, **cotes}
+                for match_id, cotes in par_match.items()
+            ])
+            db.session.commit()
+            return list(par_match), []
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def ajouter_expositions(self, deltas: dict):
+        # deltas : {match_id: (mises par issue..., gains à payer par issue...)}.
+        # Incréments faits par la base (col = col + delta) : rien n'est perdu
+        # si plusieurs processus enregistrent des paris sur le même match
+        table = ExpositionCote.__table__
+        lignes = db.session.query(Match.id, ExpositionCote.match_id).outerjoin(
+            ExpositionCote, ExpositionCote.match_id == Match.id).filter(Match.id.in_(list(deltas))).all()
+        try:
+            nouveaux = [{'match_id': match_id} for match_id, existant in lignes if existant is None]
+            if nouveaux:
+                db.session.execute(insert(table), nouveaux)
+            if lignes:
+                db.session.execute(
+                    update(table).where(table.c.match_id == bindparam('b_match_id')).values(
+                        date_modification=datetime.utcnow(),
+                        **{colonne: table.c[colonne] + bindparam(f'd_{colonne}') for colonne in COLONNES_EXPOSITION}
+                    ),
+                    [{'b_match_id': match_id,
+                      **{f'd_{colonne}': float(delta) for colonne, delta in zip(COLONNES_EXPOSITION, deltas[match_id])}}
+                     for match_id, _ in lignes]
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def get_expositions_ouvertes(self) -> list:
+        # Matches à venir ayant reçu des paris : expositions, cotes de
+        # référence et du moteur, cotes actuelles, en une requête
+        return db.session.query(
+            ExpositionCote.match_id,
+            *(getattr(ExpositionCote, colonne) for colonne in COLONNES_EXPOSITION + COLONNES_POSITION),
+            Cote.cote_domicile, Cote.cote_nul, Cote.cote_exterieur
+        ).join(Match, Match.id == ExpositionCote.match_id).join(Cote, Cote.match_id == Match.id).filter(
+            Match.statut == 'à_venir',
+            Match.date_match > datetime.utcnow()
+        ).order_by(ExpositionCote.match_id).all()
+
+    def update_cotes_moteur(self, lignes: list, positions: list) -> tuple[list, list]:
+        # Cotes calculées écrites par update_cotes_lot, dans la même transaction
+        # que les cotes de référence / du moteur de expositions_cotes
+        table = ExpositionCote.__table__
+        try:
+            if positions:
+                db.session.execute(
+                    update(table).where(table.c.match_id == bindparam('b_match_id')).values(
+                        **{colonne: bindparam(f'v_{colonne}') for colonne in COLONNES_POSITION}
+                    ),
+                    [{'b_match_id': position['match_id'],
+                      **{f'v_{colonne}': position[colonne] for colonne in COLONNES_POSITION}}
+                     for position in positions]
+                )
+            if not lignes:
+                db.session.commit()
+                return [], []
+            match_ids, erreurs = self.update_cotes_lot(lignes)
+            if erreurs:
+                db.session.rollback()
+            return match_ids, erreurs
+        except Exception:
+            db.session.rollback()
+            raise
+
     def traiter_match_update(self, data: dict) -> bool:
         try:
             match = self.get_match_by_id(data['match_id'])
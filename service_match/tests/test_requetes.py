@@ -0,0 +1,92 @@
+# service_match/tests/test_requetes.py
+# Non-régression du nombre de requêtes SQL de get_matches / get_match_by_id :
+# relations de Match.to_dict chargées avec les matches, pas une requête par match.
+# Lancement : cd service_match && python -m unittest discover -s tests
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta
+from flask import Flask
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from models import db, Match, Cote, Competition, Equipe
+from repository import MatchRepository
+
+NOMBRE_MATCHES = 30
+# Matches (avec compétition et équipes en jointure), puis leurs cotes en une requête IN
+REQUETES_MAX = 2
+
+
+class TestNombreRequetes(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = Flask(__name__)
+        cls.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(cls.app)
+        cls.repository = MatchRepository()
+        with cls.app.app_context():
+            db.create_all()
+            competitions = [Competition(nom=f'Compétition {i}', slug=f'competition-{i}') for i in range(3)]
+            equipes = [Equipe(nom=f'Équipe {i}') for i in range(10)]
+            db.session.add_all(competitions + equipes)
+            db.session.flush()
+            debut = datetime(2030, 1, 1)
+            for i in range(NOMBRE_MATCHES):
+                match = Match(
+                    competition_id=competitions[i % 3].id,
+                    equipe_domicile_id=equipes[i % 10].id,
+                    equipe_exterieur_id=equipes[(i + 1) % 10].id,
+                    date_match=debut + timedelta(hours=i)
+                )
+                db.session.add(match)
+                db.session.flush()
+                db.session.add(Cote(match_id=match.id, cote_domicile=2.0, cote_nul=3.0, cote_exterieur=4.0))
+            db.session.commit()
+
+    def setUp(self):
+        self.contexte = self.app.app_context()
+        self.contexte.push()
+        self.requetes = []
+        event.listen(db.engine, 'before_cursor_execute', self.compter)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self.compter)
+        db.session.remove()
+        self.contexte.pop()
+
+    def compter(self, conn, cursor, statement, parameters, context, executemany):
+        self.requetes.append(statement)
+
+    def serialiser_matches(self, **filtres):
+        self.requetes.clear()
+        matches = [match.to_dict() for match in self.repository.get_matches(**filtres)]
+        return matches, len(self.requetes)
+
+    def test_get_matches_nombre_requetes_constant(self):
+        matches, requetes = self.serialiser_matches()
+        self.assertEqual(len(matches), NOMBRE_MATCHES)
+        self.assertTrue(all(match['cotes'] for match in matches))
+        self.assertLessEqual(requetes, REQUETES_MAX, self.requetes)
+
+        db.session.expunge_all()
+        page, requetes_page = self.serialiser_matches(limite=5)
+        self.assertEqual(len(page), 5)
+        self.assertEqual(requetes_page, requetes)
+
+    def test_get_matches_filtre_nombre_requetes(self):
+        matches, requetes = self.serialiser_matches(competition_id=1)
+        self.assertEqual(len(matches), NOMBRE_MATCHES // 3)
+        self.assertLessEqual(requetes, REQUETES_MAX, self.requetes)
+
+    def test_get_match_by_id_nombre_requetes(self):
+        self.requetes.clear()
+        match = self.repository.get_match_by_id(1).to_dict()
+        self.assertEqual(match['id'], 1)
+        self.assertEqual(len(match['cotes']), 1)
+        self.assertLessEqual(len(self.requetes), REQUETES_MAX, self.requetes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -26,3 +26,39 @@ def get_rabbitmq_channel(queue_name):
         except Exception as e:
             logging.error(f"Erreur inattendue lors de la connexion à RabbitMQ : {e}")
             raise
+
+def get_rabbitmq_exchange(exchange_name, subscribe=False, queue=None):
+    # Exchange fanout : chaque abonné reçoit sa propre copie des événements.
+    # Avec subscribe=True, une queue exclusive est créée et liée à l'exchange,
+    # ou la queue durable `queue` si elle est nommée (partagée entre réplicas,
+    # messages conservés pendant une déconnexion).
+    rabbitmq_url = os.getenv('RABBITMQ_URL')
+    if not rabbitmq_url:
+        raise ValueError("La variable d'environnement 'RABBITMQ_URL' n'est pas définie.")
+
+    parameters = pika.URLParameters(rabbitmq_url)
+    parameters.heartbeat = 60
+    parameters.blocked_connection_timeout = 300
+
+    while True:
+        try:
+            connection = pika.BlockingConnection(parameters)
+            channel = connection.channel()
+            channel.exchange_declare(exchange=exchange_name, exchange_type='fanout', durable=True)
+            queue_name = None
+            if subscribe:
+                if queue:
+                    channel.queue_declare(queue=queue, durable=True)
+                    queue_name = queue
+                else:
+                    result = channel.queue_declare(queue='', exclusive=True)
+                    queue_name = result.method.queue
+                channel.queue_bind(exchange=exchange_name, queue=queue_name)
+            logging.info(f"Connexion à RabbitMQ établie et exchange '{exchange_name}' déclaré.")
+            return channel, connection, queue_name
+        except pika.exceptions.AMQPConnectionError as e:
+            logging.error(f"Erreur de connexion à RabbitMQ : {e}. Nouvelle tentative dans 5 secondes.")
+            time.sleep(5)
+        except Exception as e:
+            logging.error(f"Erreur inattendue lors de la connexion à RabbitMQ : {e}")
+            raise
@@ -1,7 +1,6 @@
 from flask import Flask, request, jsonify
 from models import db
 from repository import TransactionRepository
-import jwt
 from datetime import datetime
 import os
 from dotenv import load_dotenv
@@ -11,6 +10,7 @@ import time
 import requests
 import pika
 from utils.rabbitmq import get_rabbitmq_channel
+from utils.auth import get_claims
 from functools import wraps
 
 load_dotenv()
@@ -18,7 +18,6 @@ load_dotenv()
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI_PAIEMENT')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-JWT_SECRET = os.getenv('JWT_SECRET')
 GATEWAY_URL = 'http://gateway:5000'
 
 db.init_app(app)
@@ -56,14 +55,12 @@ def reconnect():
 def require_auth(f):
    @wraps(f)
    def decorated(*args, **kwargs):
-       token = request.headers.get('Authorization')
-       if not token:
-           return jsonify({'message': 'Token manquant'}), 401
        try:
-           token = token.split('Bearer ')[1]
-           jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+           payload = get_claims()
        except:
            return jsonify({'message': 'Token invalide'}), 401
+       if payload is None:
+           return jsonify({'message': 'Token manquant'}), 401
        return f(*args, **kwargs)
    return decorated
 
@@ -225,6 +222,83 @@ def traiter_remboursement():
        db.session.rollback()
        return jsonify({'message': str(e)}), 400
 
+# Gains en_cours (crédit non transmis) repris toutes les GAINS_REPRISE secondes ;
+# attente avant de relivrer un message dont le traitement a échoué
+GAINS_REPRISE = float(os.getenv('GAINS_REPRISE', 30))
+GAINS_ATTENTE_ERREUR = float(os.getenv('GAINS_ATTENTE_ERREUR', 5))
+
+def publier_gains_en_cours(ch, match_id=None):
+   # Une mise à jour de cagnotte par parieur, appliquée en lot par service_auth ;
+   # les gains ne passent à validé qu'une fois le message confirmé par le broker
+   for id_match, transactions in transaction_repository.get_gains_en_cours(match_id).items():
+       ch.basic_publish(
+           exchange='',
+           routing_key='user_updates',
+           body=json.dumps({
+               'type': 'gains',
+               'match_id': id_match,
+               'gains': [
+                   {'utilisateur_id': t.utilisateur_id, 'montant': float(t.montant)}
+                   for t in transactions
+               ]
+           }),
+           properties=pika.BasicProperties(delivery_mode=2)
+       )
+       transaction_repository.valider_gains([t.id for t in transactions])
+
+def traiter_paiement_updates(ch, method, properties, body):
+   with app.app_context():
+       try:
+           data = json.loads(body)
+       except ValueError as e:
+           print(f"Message paiement_updates invalide : {e}")
+           ch.basic_ack(delivery_tag=method.delivery_tag)
+           return
+       try:
+           if data.get('type') == 'gains_lot':
+               transaction_repository.create_gains(data['match_id'], data['gains'])
+               # Tous les gains en_cours du match, pas seulement ceux écrits à
+               # cette réception : une relivraison retransmet un crédit perdu
+               publier_gains_en_cours(ch, data['match_id'])
+           ch.basic_ack(delivery_tag=method.delivery_tag)
+       except Exception as e:
+           db.session.rollback()
+           print(f"Erreur traitement paiement_updates : {e}")
+           time.sleep(GAINS_ATTENTE_ERREUR)
+           ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+
+def consume_paiement_updates():
+   while True:
+       try:
+           channel, connection = get_rabbitmq_channel('paiement_updates')
+           channel.queue_declare(queue='user_updates', durable=True)
+           # basic_publish lève une exception si le broker refuse le message
+           channel.confirm_delivery()
+           channel.basic_consume(
+               queue='paiement_updates',
+               on_message_callback=traiter_paiement_updates,
+               auto_ack=False
+           )
+           print("Démarrage consommation RabbitMQ paiement_updates")
+           reprise = 0
+           while True:
+               connection.process_data_events(time_limit=1)
+               if time.time() - reprise >= GAINS_REPRISE:
+                   reprise = time.time()
+                   with app.app_context():
+                       try:
+                           publier_gains_en_cours(channel)
+                       except Exception as e:
+                           db.session.rollback()
+                           print(f"Erreur reprise des gains en cours : {e}")
+                           if isinstance(e, pika.exceptions.AMQPError):
+                               raise
+       except Exception as e:
+           print(f"Erreur consommation paiement_updates : {e}")
+
+       print("Reconnexion RabbitMQ paiement_updates dans 5s...")
+       time.sleep(5)
+
 @app.route('/transactions/utilisateur/<int:utilisateur_id>', methods=['GET'])
 @require_auth
 def liste_transactions(utilisateur_id):
@@ -249,5 +323,6 @@ if __name__ == '__main__':
        t_keep_alive.start()
    else:
        reconnect()
+   threading.Thread(target=consume_paiement_updates, daemon=True).start()
 
    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -1,4 +1,5 @@
 from models import db, Transaction
+from sqlalchemy.dialects import postgresql, sqlite
 import uuid
 from datetime import datetime
 
@@ -20,4 +21,49 @@ class TransactionRepository:
         return Transaction.query.filter_by(utilisateur_id=utilisateur_id).all()
 
     def get_transaction_by_id(self, id: int) -> Transaction:
-        return Transaction.query.get(id)
\ No newline at end of file
+        return Transaction.query.get(id)
+
+    def create_gains(self, match_id: int, gains: list):
+        # Une écriture par parieur et par match, en_cours tant que le crédit
+        # n'a pas été transmis à service_auth ; la référence (match, parieur)
+        # rend la réception d'un même lot idempotente, y compris entre deux
+        # consommateurs concurrents
+        if not gains:
+            return
+        dialecte = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+        try:
+            db.session.execute(dialecte.insert(Transaction).on_conflict_do_nothing(index_elements=['reference']), [{
+                'utilisateur_id': gain['utilisateur_id'],
+                'type_transaction': 'gain',
+                'montant': gain['montant'],
+                'reference': f"GAI-{match_id}-{gain['utilisateur_id']}",
+                'statut': 'en_cours'
+            } for gain in gains])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def get_gains_en_cours(self, match_id: int = None) -> dict:
+        # Gains écrits mais pas encore transmis pour crédit, par match :
+        # y compris ceux d'une réception précédente interrompue
+        prefixe = f"GAI-{match_id}-" if match_id is not None else "GAI-"
+        transactions = Transaction.query.filter(
+            Transaction.type_transaction == 'gain',
+            Transaction.statut == 'en_cours',
+            Transaction.reference.startswith(prefixe, autoescape=True)
+        ).order_by(Transaction.id).all()
+        par_match = {}
+        for transaction in transactions:
+            par_match.setdefault(int(transaction.reference.split('-')[1]), []).append(transaction)
+        return par_match
+
+    def valider_gains(self, transaction_ids: list):
+        try:
+            Transaction.query.filter(Transaction.id.in_(transaction_ids)).update(
+                {'statut': 'validé'}, synchronize_session=False
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
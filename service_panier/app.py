@@ -1,7 +1,6 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from models import db
 from repository import PanierRepository
-import jwt
 from datetime import datetime
 import os
 from dotenv import load_dotenv
@@ -10,6 +9,7 @@ import json
 import time
 import pika
 from utils.rabbitmq import get_rabbitmq_channel
+from utils.auth import get_claims
 from functools import wraps
 
 load_dotenv()
@@ -17,7 +17,6 @@ load_dotenv()
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI_PANIER')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-JWT_SECRET = os.getenv('JWT_SECRET')
 
 db.init_app(app)
 panier_repository = PanierRepository()
@@ -43,17 +42,16 @@ def init_rabbitmq():
 def require_parieur(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token:
-            return jsonify({'message': 'Token manquant'}), 401
         try:
-            token = token.split('Bearer ')[1]
-            payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
-            if payload.get('role') != 'parieur':
-                return jsonify({'message': 'Accès non autorisé'}), 403
-            return f(*args, **kwargs)
+            payload = get_claims()
         except:
             return jsonify({'message': 'Token invalide'}), 401
+        if payload is None:
+            return jsonify({'message': 'Token manquant'}), 401
+        if payload.get('role') != 'parieur':
+            return jsonify({'message': 'Accès non autorisé'}), 403
+        g.utilisateur = payload
+        return f(*args, **kwargs)
 
     return decorated
 
@@ -153,8 +151,7 @@ def traiter_pari_updates(ch, method, properties, body):
 @require_parieur
 def creer_panier():
     data = request.json
-    token = request.headers.get('Authorization').split('Bearer ')[1]
-    payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+    payload = g.utilisateur
 
     match_ids = [detail['match_id'] for detail in data['paris']]
     if len(match_ids) != len(set(match_ids)):
@@ -180,8 +177,7 @@ def creer_panier():
 @app.route('/panier/<int:panier_id>/validation', methods=['POST'])
 @require_parieur
 def valider_panier(panier_id):
-    token = request.headers.get('Authorization').split('Bearer ')[1]
-    payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+    payload = g.utilisateur
 
     panier = panier_repository.get_panier_by_id(panier_id)
 
@@ -205,8 +201,7 @@ def valider_panier(panier_id):
 @app.route('/panier/utilisateur/<int:utilisateur_id>', methods=['GET'])
 @require_parieur
 def liste_paniers(utilisateur_id):
-    token = request.headers.get('Authorization').split('Bearer ')[1]
-    payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+    payload = g.utilisateur
 
     if payload['user_id'] != utilisateur_id:
         return jsonify({'message': 'Accès non autorisé'}), 403
@@ -1,7 +1,8 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g
 from models import db
 from repository import PariRepository
-import jwt
+from replique_matches import RepliqueMatches
+from reglement import MoteurReglement
 from datetime import datetime
 import os
 from dotenv import load_dotenv
@@ -10,19 +11,23 @@ import json
 import time
 import requests
 import pika
-from utils.rabbitmq import get_rabbitmq_channel
-from functools import wraps
+from utils.rabbitmq import get_rabbitmq_channel, get_rabbitmq_exchange
+from utils.auth import get_claims
+from functools import wraps, partial
 
 load_dotenv()
 
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI_PARI')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-JWT_SECRET = os.getenv('JWT_SECRET')
 GATEWAY_URL = 'http://gateway:5000'
+TYPES_PARI = ('domicile', 'nul', 'exterieur')
+# Écart accepté entre la cote envoyée par le client et la cote courante
+COTE_TOLERANCE = float(os.getenv('COTE_TOLERANCE', 0.001))
 
 db.init_app(app)
 pari_repository = PariRepository()
+replique_matches = RepliqueMatches()
 
 channel_pari_updates = None
 connection_pari_updates = None
@@ -30,6 +35,8 @@ channel_paiement_updates = None
 connection_paiement_updates = None
 channel_match_resultats = None
 connection_match_resultats = None
+channel_paris_events = None
+connection_paris_events = None
 
 
 def init_rabbitmq():
@@ -43,22 +50,31 @@ def init_rabbitmq():
     except Exception as e:
         connection_pari_updates = connection_paiement_updates = connection_match_resultats = None
         channel_pari_updates = channel_paiement_updates = channel_match_resultats = None
+    init_paris_events()
+
+
+def init_paris_events():
+    global channel_paris_events, connection_paris_events
+    try:
+        channel_paris_events, connection_paris_events, _ = get_rabbitmq_exchange("paris_events")
+    except Exception as e:
+        print(f"Échec de la connexion à l'exchange paris_events : {e}")
+        channel_paris_events = connection_paris_events = None
 
 
 def require_parieur(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token:
-            return jsonify({'message': 'Token manquant'}), 401
         try:
-            token = token.split('Bearer ')[1]
-            payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
-            if payload['role'] != 'parieur':
-                return jsonify({'message': 'Accès non autorisé'}), 403
-            return f(*args, **kwargs)
+            payload = get_claims()
         except:
             return jsonify({'message': 'Token invalide'}), 401
+        if payload is None:
+            return jsonify({'message': 'Token manquant'}), 401
+        if payload.get('role') != 'parieur':
+            return jsonify({'message': 'Accès non autorisé'}), 403
+        g.utilisateur = payload
+        return f(*args, **kwargs)
 
     return decorated
 
@@ -77,6 +93,32 @@ def publish_message(channel, routing_key: str, message: dict):
     return False
 
 
+def publier_evenement_pari(message: dict):
+    # pari_updates reste une queue de travail (service_panier) ; les abonnés
+    # (moteur de cotes de service_match) ont chacun leur queue sur paris_events
+    publish_message(channel_pari_updates, 'pari_updates', message)
+    if not channel_paris_events:
+        return False
+    try:
+        channel_paris_events.basic_publish(
+            exchange='paris_events',
+            routing_key='',
+            body=json.dumps(message)
+        )
+        return True
+    except Exception as e:
+        print(f"Erreur publication paris_events : {e}")
+        init_paris_events()
+        return False
+
+
+def publier_paiement(message: dict):
+    return publish_message(channel_paiement_updates, 'paiement_updates', message)
+
+
+moteur_reglement = MoteurReglement(app, pari_repository, publier_paiement)
+
+
 def keep_alive(connection, interval=30):
     while True:
         try:
@@ -109,24 +151,81 @@ def reconnect(queue_name):
             time.sleep(10)
 
 
+def get_matches(match_ids, headers):
+    # Un seul aller-retour pour tous les matches (forme compacte), indexés par id ;
+    # None si le catalogue est injoignable
+    try:
+        resp_matches = requests.get(
+            f"{GATEWAY_URL}/matches",
+            params={'ids': ','.join(str(match_id) for match_id in match_ids)},
+            headers=headers
+        )
+    except requests.exceptions.RequestException:
+        return None
+    if resp_matches.status_code != 200:
+        return None
+    return {match['match_id']: match for match in resp_matches.json()}
+
+
+def lire_matches(match_ids, headers):
+    # Réplique locale d'abord ; appel réseau seulement pour les matches
+    # absents (non ouverts lors de l'instantané) ou si elle n'est pas prête
+    matches, manquants = replique_matches.get({int(match_id) for match_id in match_ids})
+    if manquants:
+        complement = get_matches(manquants, headers)
+        if complement is None:
+            return None
+        matches.update(complement)
+    return matches
+
+
+def verifier_cote(match, type_pari, cote_soumise):
+    # Le pari est toujours enregistré à la cote courante de la réplique ; la
+    # cote affichée au parieur doit y correspondre (à COTE_TOLERANCE près)
+    if type_pari not in TYPES_PARI:
+        return None, (jsonify({'message': 'Type de pari invalide'}), 400)
+    cote = match.get(f'cote_{type_pari}')
+    if cote is None:
+        return None, (jsonify({'message': f"Cotes du match {match['match_id']} indisponibles"}), 400)
+    try:
+        cote_soumise = float(cote_soumise)
+    except (TypeError, ValueError):
+        return None, (jsonify({'message': 'Cote invalide'}), 400)
+    if abs(cote_soumise - float(cote)) > COTE_TOLERANCE:
+        return None, (jsonify({
+            'message': f"La cote du match {match['match_id']} a changé",
+            'match_id': match['match_id'],
+            'type_pari': type_pari,
+            'cote': float(cote)
+        }), 409)
+    return float(cote), None
+
+
 @app.route('/paris', methods=['POST'])
 @require_parieur
 def placer_pari():
     data = request.json
     token = request.headers.get('Authorization')
-    payload = jwt.decode(token.replace('Bearer ', ''), JWT_SECRET, algorithms=['HS256'])
+    payload = g.utilisateur
 
-    resp_match = requests.get(f"{GATEWAY_URL}/matches/{data['match_id']}", headers=request.headers)
-    if resp_match.status_code != 200:
+    matches = lire_matches([data['match_id']], request.headers)
+    if matches is None:
+        return jsonify({'message': 'Catalogue des matchs indisponible'}), 503
+    match = matches.get(int(data['match_id']))
+    if match is None:
         return jsonify({'message': 'Match introuvable'}), 404
 
-    match = resp_match.json()
     if match['statut'] != 'à_venir':
         return jsonify({'message': 'Paris impossible sur ce match'}), 400
 
+    cote, erreur = verifier_cote(match, data.get('type_pari'), data.get('cote'))
+    if erreur:
+        return erreur
+    data['cote'] = cote
+
     try:
         date_match = datetime.fromisoformat(match['date_match'])
-        if date_match <= datetime.now():
+        if date_match <= datetime.utcnow():
             return jsonify({'message': 'Match déjà passé'}), 400
 
         resp_cagnotte = requests.get(
@@ -157,11 +256,13 @@ def placer_pari():
         if error:
             return jsonify({'message': error}), 400
 
-        publish_message(channel_pari_updates, 'pari_updates', {
+        publier_evenement_pari({
             'type': 'nouveau_pari',
             'pari_id': nouveau_pari.id,
             'utilisateur_id': nouveau_pari.utilisateur_id,
             'match_id': nouveau_pari.match_id,
+            'type_pari': nouveau_pari.type_pari,
+            'cote': float(nouveau_pari.cote),
             'montant': float(nouveau_pari.montant),
             'gain_potentiel': float(nouveau_pari.gain_potentiel)
         })
@@ -177,7 +278,7 @@ def placer_pari():
 def placer_pari_combine():
     data = request.json
     token = request.headers.get('Authorization')
-    payload = jwt.decode(token.replace('Bearer ', ''), JWT_SECRET, algorithms=['HS256'])
+    payload = g.utilisateur
 
     try:
         resp_cagnotte = requests.get(
@@ -193,22 +294,26 @@ def placer_pari_combine():
             return jsonify({'message': 'Cagnotte insuffisante'}), 400
 
         # Vérifier validité des matchs
+        matches = lire_matches([pari['match_id'] for pari in data['paris']], request.headers)
+        if matches is None:
+            return jsonify({'message': 'Catalogue des matchs indisponible'}), 503
         for pari in data['paris']:
-            resp_match = requests.get(
-                f"{GATEWAY_URL}/matches/{pari['match_id']}",
-                headers=request.headers
-            )
-            if resp_match.status_code != 200:
+            match = matches.get(int(pari['match_id']))
+            if match is None:
                 return jsonify({'message': f"Match {pari['match_id']} introuvable"}), 404
 
-            match = resp_match.json()
             if match['statut'] != 'à_venir':
                 return jsonify({'message': f"Match {pari['match_id']} non disponible"}), 400
 
             date_match = datetime.fromisoformat(match['date_match'])
-            if date_match <= datetime.now():
+            if date_match <= datetime.utcnow():
                 return jsonify({'message': f"Match {pari['match_id']} déjà passé"}), 400
 
+            cote, erreur = verifier_cote(match, pari.get('type_pari'), pari.get('cote'))
+            if erreur:
+                return erreur
+            pari['cote'] = cote
+
         retrait_resp = requests.post(
             f"{GATEWAY_URL}/transactions/retrait",
             json={
@@ -225,7 +330,7 @@ def placer_pari_combine():
         if error:
             return jsonify({'message': error}), 400
 
-        publish_message(channel_pari_updates, 'pari_updates', {
+        publier_evenement_pari({
             'type': 'nouveau_pari_groupe',
             'groupe_id': groupe.id,
             'utilisateur_id': groupe.utilisateur_id,
@@ -242,8 +347,7 @@ def placer_pari_combine():
 @app.route('/paris/<int:pari_id>/annulation', methods=['POST'])
 @require_parieur
 def annuler_pari(pari_id):
-    token = request.headers.get('Authorization')
-    payload = jwt.decode(token.replace('Bearer ', ''), JWT_SECRET, algorithms=['HS256'])
+    payload = g.utilisateur
 
     pari = pari_repository.get_pari_by_id(pari_id)
     if pari.utilisateur_id != payload['user_id']:
@@ -277,38 +381,96 @@ def annuler_pari(pari_id):
         return jsonify({'message': str(e)}), 400
 
 
-def traiter_resultat(ch, method, properties, body):
-    with app.app_context():
+@app.route('/metrics', methods=['GET'])
+def exposer_metrics():
+    stats = replique_matches.stats()
+    metriques = [
+        ('pari_replique_prete', 'gauge', 'Instantané des matches chargé', int(stats['prete'])),
+        ('pari_replique_connectee', 'gauge', 'Consommateur match_events connecté', int(stats['connecte'])),
+        ('pari_replique_matches', 'gauge', 'Matches dans la réplique locale', stats['matches']),
+        ('pari_replique_en_attente', 'gauge', 'Matches modifiés pas encore relus', stats['en_attente']),
+        ('pari_replique_age_secondes', 'gauge', 'Secondes depuis la dernière synchronisation complète',
+         stats['age'] if stats['age'] is not None else 'NaN'),
+        ('pari_replique_retard_secondes', 'gauge', 'Délai de réception du dernier événement match_events',
+         stats['retard']),
+        ('pari_replique_evenements_total', 'counter', 'Événements match_events reçus', stats['evenements']),
+        ('pari_replique_resynchronisations_total', 'counter', 'Instantanés chargés',
+         stats['resynchronisations']),
+        ('pari_replique_echecs_total', 'counter', 'Échecs de lecture de service_match', stats['echecs'])
+    ]
+    reglement = moteur_reglement.stats()
+    dernier = reglement['dernier'] or {}
+    metriques += [
+        ('pari_reglement_en_file', 'gauge', 'Matches terminés en attente de règlement', reglement['en_file']),
+        ('pari_reglement_matches_total', 'counter', 'Matches réglés', reglement['reglements']),
+        ('pari_reglement_echecs_total', 'counter', 'Règlements en erreur (repris)', reglement['echecs']),
+        ('pari_reglement_paris_total', 'counter', 'Paris réglés', reglement['paris_regles']),
+        ('pari_reglement_gains_total', 'counter', 'Paris et combinés gagnants', reglement['gains']),
+        ('pari_reglement_paiements_total', 'counter', 'Paiements (un par parieur et par match) publiés',
+         reglement['paiements_publies']),
+        ('pari_reglement_messages_total', 'counter', 'Messages de gains publiés', reglement['messages_publies']),
+        ('pari_reglement_duree_secondes_total', 'counter', 'Temps passé à régler', reglement['duree_totale']),
+        ('pari_reglement_dernier_paris_par_seconde', 'gauge', 'Débit du dernier règlement',
+         dernier.get('paris_par_seconde', 0))
+    ]
+    lignes = []
+    for nom, type_metrique, aide, valeur in metriques:
+        lignes += [f'# HELP {nom} {aide}', f'# TYPE {nom} {type_metrique}', f'{nom} {valeur}']
+    return Response('\n'.join(lignes) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def traiter_match_events(ch, method, properties, body):
+    try:
+        replique_matches.traiter_evenement(json.loads(body))
+    except Exception as e:
+        print(f"Erreur traitement match_events : {e}")
+
+
+def consume_match_events():
+    while True:
         try:
-            data = json.loads(body)
-            paris = pari_repository.get_paris_by_match(data['match_id'])
-
-            for pari in paris:
-                statut = 'gagné' if pari.type_pari == data['resultat'] else 'perdu'
-                pari.statut = statut
-
-                if statut == 'gagné':
-                    publish_message(channel_paiement_updates, 'paiement_updates', {
-                        'type': 'gain_pari',
-                        'utilisateur_id': pari.utilisateur_id,
-                        'montant': float(pari.gain_potentiel)
-                    })
-
-                if pari.groupe_id and pari_repository.update_statut_groupe(pari.groupe):
-                    groupe = pari.groupe
-                    if groupe.statut == 'gagné':
-                        publish_message(channel_paiement_updates, 'paiement_updates', {
-                            'type': 'gain_pari_groupe',
-                            'utilisateur_id': groupe.utilisateur_id,
-                            'montant': float(groupe.gain_potentiel)
-                        })
-
-            db.session.commit()
+            channel, connection, queue_name = get_rabbitmq_exchange('match_events', subscribe=True)
+            channel.basic_consume(
+                queue=queue_name,
+                on_message_callback=traiter_match_events,
+                auto_ack=True
+            )
+            # Des événements ont pu être manqués avant l'abonnement : nouvel instantané
+            replique_matches.connecte = True
+            replique_matches.invalider()
+            print("Démarrage consommation RabbitMQ match_events")
+            while True:
+                connection.process_data_events(time_limit=1)
         except Exception as e:
-            print(f"Erreur traitement résultat: {e}")
+            print(f"Erreur consommation match_events : {e}")
+        replique_matches.connecte = False
+
+        print("Reconnexion RabbitMQ match_events dans 5s...")
+        time.sleep(5)
 
 
-def consume_messages(channel, connection, callback, queue_name):
+def acquitter(ch, delivery_tag):
+    # Appelé depuis le thread de règlement : l'acquittement est fait par le thread de la connexion
+    try:
+        ch.connection.add_callback_threadsafe(partial(ch.basic_ack, delivery_tag))
+    except Exception as e:
+        # Connexion perdue : le message sera relivré, les paris déjà réglés ignorés
+        print(f"Erreur acquittement match_resultats : {e}")
+
+
+def traiter_resultat(ch, method, properties, body):
+    try:
+        data = json.loads(body)
+        match_id, resultat = data['match_id'], data['resultat']
+    except Exception as e:
+        print(f"Erreur traitement résultat: {e}")
+        ch.basic_ack(method.delivery_tag)
+        return
+    # Acquitté une fois le match réglé : un redémarrage avant le fait relivrer
+    moteur_reglement.soumettre(match_id, resultat, acquitter=lambda: acquitter(ch, method.delivery_tag))
+
+
+def consume_messages(channel, connection, callback, queue_name, auto_ack=True):
     if not channel or not connection:
         print(f"Canal/connexion indisponible pour {queue_name}")
         return
@@ -317,7 +479,7 @@ def consume_messages(channel, connection, callback, queue_name):
         channel.basic_consume(
             queue=queue_name,
             on_message_callback=callback,
-            auto_ack=True
+            auto_ack=auto_ack
         )
         while True:
             try:
@@ -337,15 +499,20 @@ def consume_messages(channel, connection, callback, queue_name):
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        pari_repository.initialiser_compteurs_groupes()
 
     init_rabbitmq()
     if connection_match_resultats and channel_match_resultats:
         threading.Thread(
             target=consume_messages,
-            args=(channel_match_resultats, connection_match_resultats, traiter_resultat, 'match_resultats'),
+            args=(channel_match_resultats, connection_match_resultats, traiter_resultat, 'match_resultats', False),
             daemon=True
         ).start()
     else:
         reconnect('match_resultats')
 
+    threading.Thread(target=consume_match_events, daemon=True).start()
+    replique_matches.demarrer()
+    moteur_reglement.demarrer()
+
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -10,6 +10,10 @@ class PariGroupe(db.Model):
    montant = db.Column(db.Float(precision=2), nullable=False)
    gain_potentiel = db.Column(db.Float(precision=2), nullable=False)
    statut = db.Column(db.String(20), default='en_attente')
+   # Tenus à jour au règlement de chaque sélection (PariRepository.regler_groupes)
+   selections_en_attente = db.Column(db.Integer, nullable=False, default=0)
+   selections_gagnees = db.Column(db.Integer, nullable=False, default=0)
+   selections_perdues = db.Column(db.Integer, nullable=False, default=0)
    date_creation = db.Column(db.DateTime, default=datetime.utcnow)
    paris = db.relationship('Pari', backref='groupe', lazy=True)
 
@@ -20,6 +24,9 @@ class PariGroupe(db.Model):
            'montant': float(self.montant),
            'gain_potentiel': float(self.gain_potentiel),
            'statut': self.statut,
+           'selections_en_attente': self.selections_en_attente,
+           'selections_gagnees': self.selections_gagnees,
+           'selections_perdues': self.selections_perdues,
            'date_creation': self.date_creation.isoformat(),
            'paris': [pari.to_dict() for pari in self.paris]
        }
@@ -39,6 +46,11 @@ class Pari(db.Model):
    annule = db.Column(db.Boolean, default=False)
    motif_annulation = db.Column(db.String(200))
 
+   __table_args__ = (
+       db.Index('idx_paris_match_statut', 'match_id', 'statut', 'id'),
+       db.Index('idx_paris_groupe_id', 'groupe_id'),
+   )
+
    def to_dict(self):
        return {
            'id': self.id,
@@ -53,4 +65,30 @@ class Pari(db.Model):
            'groupe_id': self.groupe_id,
            'annule': self.annule,
            'motif_annulation': self.motif_annulation
-       }
\ No newline at end of file
+       }
+
+class PaiementGain(db.Model):
+   # Gains d'un parieur sur un match, cumulés dans la transaction de chaque
+   # lot de règlement puis publiés sur paiement_updates (publie)
+   __tablename__ = 'paiements_gains'
+   id = db.Column(db.Integer, primary_key=True)
+   match_id = db.Column(db.Integer, nullable=False)
+   utilisateur_id = db.Column(db.Integer, nullable=False)
+   montant = db.Column(db.Float(precision=2), nullable=False)
+   pari_ids = db.Column(db.JSON, nullable=False)
+   groupe_ids = db.Column(db.JSON, nullable=False)
+   publie = db.Column(db.Boolean, nullable=False, default=False)
+   date_creation = db.Column(db.DateTime, default=datetime.utcnow)
+
+   __table_args__ = (
+       db.UniqueConstraint('match_id', 'utilisateur_id', name='uq_paiements_gains_match_utilisateur'),
+       db.Index('idx_paiements_gains_publie', 'publie', 'match_id'),
+   )
+
+   def to_message(self):
+       return {
+           'utilisateur_id': self.utilisateur_id,
+           'montant': round(float(self.montant), 2),
+           'pari_ids': self.pari_ids,
+           'groupe_ids': self.groupe_ids
+       }
@@ -0,0 +1,151 @@
+# service_pari/reglement.py
+import os
+import time
+import queue
+import threading
+
+# Règlement des paris d'un match terminé (match_resultats), hors du thread
+# consommateur : les paris en attente sont réglés par lots de REGLEMENT_LOT
+# en un UPDATE chacun (statut et gain renvoyés par la base). Les gains du
+# match sont cumulés par parieur dans paiements_gains, dans la transaction du
+# lot (un seul paiement avec la liste des paris et combinés gagnés), puis
+# publiés sur paiement_updates par messages groupés une fois le match réglé.
+# Le message match_resultats n'est acquitté qu'une fois le match réglé ; en
+# cas d'erreur, nouvel essai après REGLEMENT_ATTENTE_ERREUR secondes. Les
+# paiements non publiés (broker indisponible, redémarrage) sont repris
+# toutes les REGLEMENT_REPRISE secondes
+REGLEMENT_LOT = int(os.getenv('REGLEMENT_LOT', 5000))
+REGLEMENT_ATTENTE_ERREUR = float(os.getenv('REGLEMENT_ATTENTE_ERREUR', 5))
+REGLEMENT_REPRISE = float(os.getenv('REGLEMENT_REPRISE', 30))
+# Paiements (parieurs) par message gains_lot
+REGLEMENT_GAINS_PAR_MESSAGE = int(os.getenv('REGLEMENT_GAINS_PAR_MESSAGE', 1000))
+
+
+class MoteurReglement:
+    def __init__(self, app, repository, publier, taille_lot=REGLEMENT_LOT,
+                 gains_par_message=REGLEMENT_GAINS_PAR_MESSAGE):
+        self.app = app
+        self.repository = repository
+        self.publier = publier
+        self.taille_lot = taille_lot
+        self.gains_par_message = gains_par_message
+        self._file = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.reglements = 0
+        self.echecs = 0
+        self.paris_regles = 0
+        self.groupes_gagnes = 0
+        self.gains = 0
+        self.paiements_publies = 0
+        self.messages_publies = 0
+        self.duree_totale = 0.0
+        self.dernier = None
+
+    def demarrer(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.boucle, daemon=True)
+                self._thread.start()
+
+    def soumettre(self, match_id, resultat, acquitter=None):
+        self._file.put((match_id, resultat, acquitter))
+        self.demarrer()
+
+    def boucle(self):
+        while True:
+            try:
+                match_id, resultat, acquitter = self._file.get(timeout=REGLEMENT_REPRISE)
+            except queue.Empty:
+                try:
+                    self.publier_gains()
+                except Exception as e:
+                    print(f"Erreur publication des gains : {e}")
+                continue
+            try:
+                self.regler(match_id, resultat)
+            except Exception as e:
+                print(f"Erreur règlement match {match_id} : {e}")
+                with self._lock:
+                    self.echecs += 1
+                # Repris (lots déjà réglés ignorés), message toujours non acquitté
+                time.sleep(REGLEMENT_ATTENTE_ERREUR)
+                self._file.put((match_id, resultat, acquitter))
+                continue
+            if acquitter:
+                acquitter()
+
+    def regler(self, match_id, resultat):
+        debut = time.perf_counter()
+        paris_regles = gagnes = 0
+        parieurs = set()
+        with self.app.app_context():
+            while True:
+                paris, groupes = self.repository.regler_lot(match_id, resultat, self.taille_lot)
+                if not paris:
+                    break
+                paris_regles += len(paris)
+                for pari in paris:
+                    if pari.statut == 'gagné' and not pari.groupe_id:
+                        parieurs.add(pari.utilisateur_id)
+                        gagnes += 1
+                parieurs.update(groupe.utilisateur_id for groupe in groupes)
+                gagnes += len(groupes)
+                with self._lock:
+                    self.groupes_gagnes += len(groupes)
+            self.publier_gains(match_id)
+
+        duree = time.perf_counter() - debut
+        with self._lock:
+            self.reglements += 1
+            self.paris_regles += paris_regles
+            self.gains += gagnes
+            self.duree_totale += duree
+            self.dernier = {
+                'match_id': match_id,
+                'paris': paris_regles,
+                'gains': gagnes,
+                'paiements': len(parieurs),
+                'duree': duree,
+                'paris_par_seconde': paris_regles / duree if duree else 0
+            }
+        print(f"Match {match_id} réglé : {paris_regles} paris, {gagnes} gains pour {len(parieurs)} parieurs "
+              f"en {duree:.2f}s ({self.dernier['paris_par_seconde']:.0f} paris/s)")
+        return self.dernier
+
+    def publier_gains(self, match_id=None):
+        # Paiements en attente des matches réglés, marqués publiés seulement
+        # si le broker a accepté le message (sinon repris plus tard)
+        with self.app.app_context():
+            while True:
+                paiements = self.repository.get_paiements_a_publier(match_id, self.gains_par_message)
+                if not paiements:
+                    return
+                par_match = {}
+                for paiement in paiements:
+                    par_match.setdefault(paiement.match_id, []).append(paiement)
+                for id_match, lot in par_match.items():
+                    message = {'type': 'gains_lot', 'match_id': id_match,
+                               'gains': [paiement.to_message() for paiement in lot]}
+                    if not self.publier(message):
+                        print(f"Publication des gains du match {id_match} échouée, reprise plus tard")
+                        return
+                    self.repository.marquer_paiements_publies([paiement.id for paiement in lot])
+                    with self._lock:
+                        self.paiements_publies += len(lot)
+                        self.messages_publies += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'en_file': self._file.qsize(),
+                'reglements': self.reglements,
+                'echecs': self.echecs,
+                'paris_regles': self.paris_regles,
+                'groupes_gagnes': self.groupes_gagnes,
+                'gains': self.gains,
+                'paiements_publies': self.paiements_publies,
+                'messages_publies': self.messages_publies,
+                'duree_totale': self.duree_totale,
+                'dernier': self.dernier
+            }
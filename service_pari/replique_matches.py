@@ -0,0 +1,167 @@
+# service_pari/replique_matches.py
+import os
+import time
+import threading
+import requests
+
+# Copie locale de l'état des matches (statut, date, cotes courantes) : la
+# validation d'un pari ne fait plus d'appel réseau vers le catalogue.
+# Chargée par un instantané des matches ouverts (GET /matches/etats), puis
+# tenue à jour par match_events : les identifiants modifiés sont accumulés
+# pendant REPLIQUE_INTERVALLE et relus ensemble (GET /matches?ids=).
+# Appels directs à service_match : le cache du gateway, invalidé par les
+# mêmes événements, pourrait renvoyer l'état précédent.
+MATCH_SERVICE_URLS = [
+    url.strip().rstrip('/')
+    for url in os.getenv('MATCH_SERVICE_URL', 'http://service_match:5000').split(',') if url.strip()
+]
+REPLIQUE_INTERVALLE = float(os.getenv('REPLIQUE_INTERVALLE', 0.5))
+# Instantané complet périodique, au cas où un événement serait manqué
+REPLIQUE_RESYNC = float(os.getenv('REPLIQUE_RESYNC', 300))
+REPLIQUE_TIMEOUT = (2, 10)
+# Limite de GET /matches?ids= (MATCHES_IDS_MAX de service_match)
+IDS_PAR_REQUETE = 100
+
+EVENEMENTS_MATCH = ('match_cree', 'matches_importes', 'match_modifie', 'score_modifie',
+                    'cotes_modifiees', 'cotes_modifiees_lot', 'match_supprime')
+
+
+class RepliqueMatches:
+    def __init__(self, urls=MATCH_SERVICE_URLS, intervalle=REPLIQUE_INTERVALLE, resync=REPLIQUE_RESYNC):
+        self.urls = urls
+        self.intervalle = intervalle
+        self.resync = resync
+        self.session = requests.Session()
+        self._lock = threading.Lock()
+        self._signal = threading.Event()
+        self._etats = {}
+        self._modifies = set()
+        self._thread = None
+        self._tour = 0
+        self.prete = False
+        # Consommateur match_events connecté : sans lui, la réplique vieillit
+        self.connecte = False
+        # Dernier moment où la réplique était certainement à jour
+        self.synchronise_a = None
+        self.snapshot_a = 0
+        self.retard = 0.0
+        self.evenements = 0
+        self.resynchronisations = 0
+        self.echecs = 0
+
+    def demarrer(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.boucle, daemon=True)
+                self._thread.start()
+
+    def appeler(self, chemin, params=None):
+        # Réplicas de service_match essayés à tour de rôle
+        erreur = None
+        for _ in self.urls:
+            url = self.urls[self._tour % len(self.urls)]
+            self._tour += 1
+            try:
+                response = self.session.get(f'{url}{chemin}', params=params, timeout=REPLIQUE_TIMEOUT)
+                response.raise_for_status()
+                return response.json()
+            except Exception as e:
+                erreur = e
+        raise erreur
+
+    def charger_snapshot(self):
+        debut = time.time()
+        try:
+            etats = self.appeler('/matches/etats')
+        except Exception:
+            self.echecs += 1
+            raise
+        with self._lock:
+            # Les modifications reçues pendant le chargement restent à relire
+            self._etats = {etat['match_id']: etat for etat in etats}
+            self.prete = True
+            self.synchronise_a = debut
+            self.snapshot_a = debut
+            self.resynchronisations += 1
+        return len(etats)
+
+    def invalider(self):
+        # Événements possiblement manqués (reconnexion) : instantané au prochain tour
+        self.snapshot_a = 0
+        self._signal.set()
+
+    def traiter_evenement(self, evenement):
+        if evenement.get('type') not in EVENEMENTS_MATCH:
+            return
+        match_ids = evenement.get('match_ids') or [evenement.get('match_id')]
+        with self._lock:
+            self._modifies.update(i for i in match_ids if i is not None)
+            self.evenements += 1
+            if evenement.get('horodatage'):
+                self.retard = max(time.time() - evenement['horodatage'], 0)
+        self._signal.set()
+
+    def boucle(self):
+        while True:
+            self._signal.wait(self.intervalle)
+            # Les modifications qui arrivent pendant la fenêtre sont fusionnées
+            time.sleep(self.intervalle)
+            self._signal.clear()
+            try:
+                if time.time() - self.snapshot_a >= self.resync:
+                    self.charger_snapshot()
+                self.rafraichir()
+            except Exception as e:
+                print(f"Erreur réplique des matches : {e}")
+
+    def rafraichir(self):
+        with self._lock:
+            match_ids, self._modifies = sorted(self._modifies), set()
+        if not match_ids:
+            if self.prete and self.connecte:
+                self.synchronise_a = time.time()
+            return
+        debut = time.time()
+        try:
+            etats = {}
+            for i in range(0, len(match_ids), IDS_PAR_REQUETE):
+                lot = match_ids[i:i + IDS_PAR_REQUETE]
+                for etat in self.appeler('/matches', {'ids': ','.join(map(str, lot))}):
+                    etats[etat['match_id']] = etat
+        except Exception:
+            # Relus au tour suivant
+            with self._lock:
+                self._modifies.update(match_ids)
+            self.echecs += 1
+            raise
+        with self._lock:
+            for match_id in match_ids:
+                if match_id in etats:
+                    self._etats[match_id] = etats[match_id]
+                else:
+                    # Match supprimé
+                    self._etats.pop(match_id, None)
+            if not self._modifies and self.connecte:
+                self.synchronise_a = debut
+
+    def get(self, match_ids):
+        # (états trouvés par id, ids absents de la réplique)
+        with self._lock:
+            if not self.prete:
+                return {}, list(match_ids)
+            trouves = {i: self._etats[i] for i in match_ids if i in self._etats}
+        return trouves, [i for i in match_ids if i not in trouves]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'prete': self.prete,
+                'connecte': self.connecte,
+                'matches': len(self._etats),
+                'en_attente': len(self._modifies),
+                'age': time.time() - self.synchronise_a if self.synchronise_a else None,
+                'retard': self.retard,
+                'evenements': self.evenements,
+                'resynchronisations': self.resynchronisations,
+                'echecs': self.echecs
+            }
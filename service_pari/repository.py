@@ -1,5 +1,7 @@
-from models import db, PariGroupe, Pari
+from models import db, PariGroupe, Pari, PaiementGain
 from datetime import datetime
+from collections import Counter, defaultdict
+from sqlalchemy import select, update, insert, bindparam, case, func, exists
 
 class PariRepository:
     def create_pari(self, data: dict, token: str) -> tuple[Pari, str]:
@@ -42,6 +44,7 @@ class PariRepository:
                 utilisateur_id=data['utilisateur_id'],
                 montant=montant,
                 gain_potentiel=montant * cote_totale,
+                selections_en_attente=len(paris),
                 paris=paris
             )
 
@@ -73,14 +76,188 @@ class PariRepository:
     def get_paris_by_match(self, match_id: int, statut: str = 'en_attente') -> list[Pari]:
         return Pari.query.filter_by(match_id=match_id, statut=statut).all()
 
-    def update_statut_groupe(self, groupe: PariGroupe) -> bool:
+    def regler_lot(self, match_id: int, resultat: str, taille: int) -> tuple[list, list]:
+        # Un lot de paris en attente du match réglé en un UPDATE (gagnant si
+        # l'issue pariée est le résultat), puis les combinés concernés et les
+        # gains par parieur, dans la même transaction : un lot est réglé
+        # entièrement ou pas du tout
         try:
-            if any(p.statut == 'perdu' for p in groupe.paris):
-                groupe.statut = 'perdu'
-            elif all(p.statut == 'gagné' for p in groupe.paris):
-                groupe.statut = 'gagné'
+            lot = select(Pari.id).where(
+                Pari.match_id == match_id, Pari.statut == 'en_attente'
+            ).order_by(Pari.id).limit(taille)
+            paris = db.session.execute(
+                update(Pari)
+                .where(Pari.id.in_(lot), Pari.statut == 'en_attente')
+                .values(statut=case((Pari.type_pari == resultat, 'gagné'), else_='perdu'))
+                .returning(Pari.id, Pari.utilisateur_id, Pari.statut, Pari.gain_potentiel, Pari.groupe_id)
+                .execution_options(synchronize_session=False)
+            ).all()
+            selections = [pari for pari in paris if pari.groupe_id]
+            groupes = self.regler_groupes(selections) if selections else []
+            self.cumuler_paiements(match_id, paris, groupes)
             db.session.commit()
-            return True
-        except:
+            return paris, groupes
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def regler_groupes(self, selections) -> list:
+        # Compteurs des combinés mis à jour par la base, sans relire les autres
+        # sélections : perdu à la première sélection perdue, gagné quand il
+        # n'en reste plus en attente. Un UPDATE par variation distincte des
+        # compteurs (en pratique une sélection gagnée ou perdue par combiné)
+        variations = defaultdict(Counter)
+        for pari in selections:
+            variations[pari.groupe_id][pari.statut] += 1
+        # Combinés antérieurs aux compteurs (non renseignés) : recalculés depuis
+        # paris, ce lot compris, au lieu d'appliquer la variation
+        non_initialises = self.groupes_non_initialises(list(variations))
+        gagnes = self.recalculer_compteurs(non_initialises) if non_initialises else []
+        par_variation = defaultdict(list)
+        for groupe_id, compte in variations.items():
+            if groupe_id not in non_initialises:
+                par_variation[(compte['gagné'], compte['perdu'])].append(groupe_id)
+
+        for (gagnees, perdues), groupe_ids in par_variation.items():
+            en_attente = PariGroupe.selections_en_attente - (gagnees + perdues)
+            lignes = db.session.execute(
+                update(PariGroupe)
+                .where(PariGroupe.id.in_(groupe_ids))
+                .values(
+                    selections_en_attente=en_attente,
+                    selections_gagnees=PariGroupe.selections_gagnees + gagnees,
+                    selections_perdues=PariGroupe.selections_perdues + perdues,
+                    statut=case(
+                        (PariGroupe.statut != 'en_attente', PariGroupe.statut),
+                        (PariGroupe.selections_perdues + perdues > 0, 'perdu'),
+                        (en_attente == 0, 'gagné'),
+                        else_=PariGroupe.statut
+                    )
+                )
+                .returning(PariGroupe.id, PariGroupe.utilisateur_id, PariGroupe.gain_potentiel, PariGroupe.statut)
+                .execution_options(synchronize_session=False)
+            ).all()
+            # Un combiné gagné n'a plus de sélection à régler : il vient de l'être
+            gagnes += [ligne for ligne in lignes if ligne.statut == 'gagné']
+        return gagnes
+
+    def groupes_non_initialises(self, groupe_ids=None) -> set:
+        total = (func.coalesce(PariGroupe.selections_en_attente, 0)
+                 + func.coalesce(PariGroupe.selections_gagnees, 0)
+                 + func.coalesce(PariGroupe.selections_perdues, 0))
+        requete = select(PariGroupe.id).where(total == 0)
+        if groupe_ids is not None:
+            requete = requete.where(PariGroupe.id.in_(groupe_ids))
+        return set(db.session.execute(requete).scalars())
+
+    def recalculer_compteurs(self, groupe_ids, decider=True) -> list:
+        # Compteurs tirés de l'état des sélections, puis décision comme au
+        # règlement ; renvoie les combinés qui viennent d'être gagnés
+        def compter(statut):
+            return (select(func.count(Pari.id))
+                    .where(Pari.groupe_id == PariGroupe.id, Pari.statut == statut)
+                    .scalar_subquery())
+
+        groupe_ids = list(groupe_ids)
+        db.session.execute(
+            update(PariGroupe)
+            .where(PariGroupe.id.in_(groupe_ids))
+            .values(
+                selections_en_attente=compter('en_attente'),
+                selections_gagnees=compter('gagné'),
+                selections_perdues=compter('perdu')
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if not decider:
+            return []
+        lignes = db.session.execute(
+            update(PariGroupe)
+            .where(PariGroupe.id.in_(groupe_ids), PariGroupe.statut == 'en_attente')
+            .values(statut=case(
+                (PariGroupe.selections_perdues > 0, 'perdu'),
+                (PariGroupe.selections_en_attente == 0, 'gagné'),
+                else_=PariGroupe.statut
+            ))
+            .returning(PariGroupe.id, PariGroupe.utilisateur_id, PariGroupe.gain_potentiel, PariGroupe.statut)
+            .execution_options(synchronize_session=False)
+        ).all()
+        return [ligne for ligne in lignes if ligne.statut == 'gagné']
+
+    def initialiser_compteurs_groupes(self) -> int:
+        # Au démarrage : combinés créés avant les compteurs (voir
+        # db/pari/migration_compteurs_groupes.sql pour les bases existantes).
+        # Sans décision : un combiné gagné ne l'est qu'au règlement, qui publie son gain
+        try:
+            groupe_ids = self.groupes_non_initialises()
+            if groupe_ids:
+                self.recalculer_compteurs(groupe_ids, decider=False)
+                db.session.commit()
+            return len(groupe_ids)
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def cumuler_paiements(self, match_id: int, paris: list, groupes: list):
+        # Un paiement par parieur et par match : les gains du lot sont ajoutés
+        # à ceux des lots précédents (insertion ou mise à jour groupées)
+        paiements = {}
+        gagnants = [(pari.utilisateur_id, pari.gain_potentiel, 'pari_ids', pari.id)
+                    for pari in paris if pari.statut == 'gagné' and not pari.groupe_id]
+        gagnants += [(groupe.utilisateur_id, groupe.gain_potentiel, 'groupe_ids', groupe.id) for groupe in groupes]
+        for utilisateur_id, montant, cle, identifiant in gagnants:
+            paiement = paiements.setdefault(utilisateur_id, {'montant': 0.0, 'pari_ids': [], 'groupe_ids': []})
+            paiement['montant'] += float(montant)
+            paiement[cle].append(identifiant)
+        if not paiements:
+            return
+
+        existants = {
+            ligne.utilisateur_id: ligne for ligne in db.session.execute(
+                select(PaiementGain.id, PaiementGain.utilisateur_id, PaiementGain.montant,
+                       PaiementGain.pari_ids, PaiementGain.groupe_ids)
+                .where(PaiementGain.match_id == match_id, PaiementGain.utilisateur_id.in_(list(paiements)))
+            )
+        }
+        table = PaiementGain.__table__
+        nouveaux = [{
+            'match_id': match_id, 'utilisateur_id': utilisateur_id, 'montant': round(paiement['montant'], 2),
+            'pari_ids': paiement['pari_ids'], 'groupe_ids': paiement['groupe_ids'], 'publie': False
+        } for utilisateur_id, paiement in paiements.items() if utilisateur_id not in existants]
+        if nouveaux:
+            db.session.execute(insert(table), nouveaux)
+        cumuls = [{
+            'b_id': ligne.id,
+            'v_montant': round(float(ligne.montant) + paiements[utilisateur_id]['montant'], 2),
+            'v_pari_ids': ligne.pari_ids + paiements[utilisateur_id]['pari_ids'],
+            'v_groupe_ids': ligne.groupe_ids + paiements[utilisateur_id]['groupe_ids']
+        } for utilisateur_id, ligne in existants.items()]
+        if cumuls:
+            db.session.execute(
+                update(table).where(table.c.id == bindparam('b_id')).values(
+                    montant=bindparam('v_montant'), pari_ids=bindparam('v_pari_ids'),
+                    groupe_ids=bindparam('v_groupe_ids')
+                ),
+                cumuls
+            )
+
+    def get_paiements_a_publier(self, match_id: int = None, limite: int = 1000) -> list[PaiementGain]:
+        # Seulement les matches entièrement réglés : les montants ne bougent plus
+        requete = PaiementGain.query.filter(
+            PaiementGain.publie.is_(False),
+            ~exists().where(Pari.match_id == PaiementGain.match_id, Pari.statut == 'en_attente')
+        )
+        if match_id is not None:
+            requete = requete.filter(PaiementGain.match_id == match_id)
+        return requete.order_by(PaiementGain.id).limit(limite).all()
+
+    def marquer_paiements_publies(self, paiement_ids: list):
+        try:
+            db.session.execute(
+                update(PaiementGain).where(PaiementGain.id.in_(paiement_ids)).values(publie=True)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+        except Exception:
             db.session.rollback()
-            return False
\ No newline at end of file
+            raise
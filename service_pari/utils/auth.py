@@ -0,0 +1,25 @@
+# utils/auth.py
+import os
+import hmac
+import jwt
+from flask import request
+
+
+def get_claims():
+    # Le gateway a déjà vérifié le token : ses en-têtes internes évitent un second décodage
+    internal_secret = os.getenv('INTERNAL_SECRET')
+    secret = request.headers.get('X-Gateway-Secret')
+    if internal_secret and secret and hmac.compare_digest(secret, internal_secret):
+        return {
+            'user_id': int(request.headers['X-User-Id']),
+            'role': request.headers['X-User-Role']
+        }
+
+    token = request.headers.get('Authorization')
+    if not token:
+        return None
+    try:
+        token = token.split('Bearer ')[1]
+    except IndexError:
+        raise jwt.InvalidTokenError("En-tête Authorization invalide")
+    return jwt.decode(token, os.getenv('JWT_SECRET'), algorithms=['HS256'])